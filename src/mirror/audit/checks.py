@@ -49,7 +49,7 @@ class CheckSlug(StrEnum):
 def check_albums_cover(db: SqliteDatabase) -> Iterator[Finding]:
     """Each album needs exactly one +cover photo; scan (list_media) hard-aborts otherwise, which
     silently breaks indexing for every album — so this reads the filesystem, not the database."""
-    for album in MediaVault(PHOTO_DIRECTORY).albums():
+    for album in MediaVault(PHOTO_DIRECTORY).manifest().albums:
         # hidden miscellaneous albums are exempt from the cover requirement
         if is_miscellaneous_dpath(album.dpath):
             continue
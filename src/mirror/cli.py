@@ -3,6 +3,7 @@
 import argparse
 import logging
 import multiprocessing
+import time
 from typing import Any
 
 from mirror.audit import run_audit_command
@@ -13,7 +14,7 @@ from mirror.commons.config import (
     ZAHIR_JSONL_PATH,
     ZAHIR_STDERR_PATH,
 )
-from mirror.commons.constants import MAX_FREE_PERCENT
+from mirror.commons.constants import DEFERRED_TIER, MAX_FREE_PERCENT
 from mirror.list_album import run_list_album_command
 from mirror.workflows.free import run_free_command
 from mirror.workflows.free.storage import detect_camera_dir
@@ -34,12 +35,15 @@ def add_pipeline_flags(parser: argparse.ArgumentParser) -> None:
     parser.add_argument("--force-upload-images", action="store_true")
     parser.add_argument("--force-upload-videos", action="store_true")
     parser.add_argument("--force-roles", nargs="+", default=None, metavar="ROLE")
+    parser.add_argument("--force-rescan", action="store_true")
+    parser.add_argument("--reencode-limit", type=int, default=None, metavar="N")
     parser.add_argument("--publish-d1", action="store_true")
     parser.add_argument("--no-github", dest="no_github", action="store_true")
+    parser.add_argument("--no-backfill", dest="backfill", action="store_false")
 
 
 def add_subcommands(parser: argparse.ArgumentParser) -> None:
-    """Add the copy, audit, and fetch subcommands to the parser."""
+    """Add the copy, audit, fetch, free, and backfill subcommands to the parser."""
 
     subparsers = parser.add_subparsers(dest="command")
 
@@ -93,6 +97,18 @@ def add_subcommands(parser: argparse.ArgumentParser) -> None:
 
     add_free_subcommand(subparsers)
 
+    backfill_parser = subparsers.add_parser(
+        "backfill", help="Upload the deferred renditions, such as lossless full images"
+    )
+    backfill_parser.add_argument(
+        "--minutes",
+        dest="minutes",
+        type=float,
+        default=None,
+        metavar="N",
+        help="Stop encoding new photos after N minutes; default: no limit",
+    )
+
 
 def add_free_subcommand(subparsers: Any) -> None:
     """Add the free subcommand, which clears the oldest media off the camera."""
@@ -154,6 +170,22 @@ def run_fetch_command(args: argparse.Namespace) -> None:
     run_workflow("fetch_workflow", fetch_input, 15, (ZAHIR_JSONL_PATH, ZAHIR_STDERR_PATH))
 
 
+def run_backfill_command(args: argparse.Namespace) -> None:
+    """Upload the deferred renditions, within an optional time budget."""
+
+    if multiprocessing.get_start_method() != "fork":
+        multiprocessing.set_start_method("fork", force=True)
+
+    deadline = time.time() + args.minutes * 60 if args.minutes is not None else None
+    backfill_input = {
+        "upload_images": True,
+        "upload_videos": False,
+        "tiers": [DEFERRED_TIER],
+        "deadline": deadline,
+    }
+    run_workflow("upload_media", backfill_input, 15, (MIRROR_JSONL_PATH, MIRROR_ERROR_PATH))
+
+
 def run_pipeline_command(args: argparse.Namespace) -> None:
     """Run the full mirror pipeline workflow."""
 
@@ -168,8 +200,11 @@ def run_pipeline_command(args: argparse.Namespace) -> None:
         "force_upload_images": args.force_upload_images,
         "force_upload_videos": args.force_upload_videos,
         "force_roles": args.force_roles,
+        "force_rescan": args.force_rescan,
+        "reencode_limit": args.reencode_limit,
         "publish_d1": args.publish_d1,
         "no_github": args.no_github,
+        "backfill": args.backfill,
     }
     log_paths = (MIRROR_JSONL_PATH, MIRROR_ERROR_PATH)
     summary = run_workflow("mirror_workflow", workflow_input, 15, log_paths)
@@ -177,13 +212,21 @@ def run_pipeline_command(args: argparse.Namespace) -> None:
         print(summary)
 
 
+# Subcommands that run a workflow from their parsed arguments
+WORKFLOW_COMMANDS = {
+    "copy": run_copy_command,
+    "fetch": run_fetch_command,
+    "backfill": run_backfill_command,
+}
+
+
 def main():
     """Execute the mirror media pipeline"""
 
     args = build_parser().parse_args()
 
-    if args.command == "copy":
-        run_copy_command(args)
+    if args.command in WORKFLOW_COMMANDS:
+        WORKFLOW_COMMANDS[args.command](args)
         return
 
     if args.command == "audit":
@@ -192,10 +235,6 @@ def main():
     if args.command == "list-album":
         raise SystemExit(run_list_album_command(args.date))
 
-    if args.command == "fetch":
-        run_fetch_command(args)
-        return
-
     if args.command == "free":
         raise SystemExit(
             run_free_command(args.percent, args.no_preserve, args.assume_yes, args.camera)
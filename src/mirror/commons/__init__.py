@@ -38,7 +38,9 @@ from mirror.commons.constants import (
 )
 from mirror.commons.dates import date_range
 from mirror.commons.exceptions import (
+    CdnUnavailableError,
     InvalidVideoDimensionsError,
+    VideoEncodeError,
     VideoReadError,
     VideoResolutionLookupError,
 )
@@ -117,10 +119,12 @@ __all__ = [
     "VIDEO_ENCODINGS",
     "VIDEO_THUMBNAIL_FORMAT",
     "WIKIDATA_TABLE",
+    "CdnUnavailableError",
     "InvalidVideoDimensionsError",
     "KnownRelations",
     "KnownTypes",
     "KnownWikiProperties",
+    "VideoEncodeError",
     "VideoReadError",
     "VideoResolutionLookupError",
     "date_range",
@@ -2,6 +2,7 @@
 
 import os
 
+import psutil
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -61,5 +62,56 @@ CAMERA_DCIM_DEFAULT = os.getenv("CAMERA_DCIM")
 # Staging directory for camera imports before badger clustering
 RAW_MEDIA_DIRECTORY = os.getenv("RAW_MEDIA_DIRECTORY", f"{HOME}/RawMedia")
 
+# Photo encode jobs running at once. Encoding is CPU-bound, so one per physical core
+PHOTO_ENCODE_CONCURRENCY = int(
+    os.getenv("PHOTO_ENCODE_CONCURRENCY", psutil.cpu_count(logical=False) or os.cpu_count() or 1)
+)
+
+# Encoded photo renditions wait here between the encode and upload stages. Queued uploads
+# point into it, so it must outlive a reboot for them to resume without re-encoding
+RENDITION_SPOOL_DIRECTORY = os.getenv("RENDITION_SPOOL_DIRECTORY", f"{HOME}/.cache/mirror/spool")
+
+# Local cache of encoded photo renditions, so re-uploads skip re-encoding. Least recently
+# used renditions are evicted beyond the byte budget once each upload run's photos are
+# encoded, so the cache may exceed it by one run's renditions in between
+RENDITION_CACHE_DIRECTORY = os.getenv(
+    "RENDITION_CACHE_DIRECTORY", f"{HOME}/.cache/mirror/renditions"
+)
+RENDITION_CACHE_MAX_BYTES = int(os.getenv("RENDITION_CACHE_MAX_BYTES", str(20 * 1024**3)))
+
+# Encode the roles in QUALITY_TARGETS at the lowest quality keeping their similarity
+# target, rather than at their fixed quality. Off by default: the search costs several
+# encodes per rendition
+QUALITY_TARGETED_ENCODING = os.getenv("QUALITY_TARGETED_ENCODING", "0") == "1"
+
+# Video uploads are sent in parts of this many bytes, several at once. An interrupted
+# upload resumes from its last completed part. S3 requires parts of at least 5 MiB
+VIDEO_UPLOAD_PART_SIZE = int(os.getenv("VIDEO_UPLOAD_PART_SIZE", str(16 * 1024**2)))
+VIDEO_UPLOAD_PART_CONCURRENCY = int(os.getenv("VIDEO_UPLOAD_PART_CONCURRENCY", "4"))
+
+# Stream video encodes straight into the CDN upload as fragmented MP4, with no encoded
+# file on disk. Memory is bounded to a part per in-flight upload. Streamed uploads cannot
+# resume, and each role decodes the source separately rather than in one ladder
+VIDEO_STREAM_UPLOAD = os.getenv("VIDEO_STREAM_UPLOAD", "0") == "1"
+
+# Video ladder encodes running at once. Each runs a multi-threaded ffmpeg, so this is
+# far below the core count; uploads proceed on their own gate meanwhile
+VIDEO_ENCODE_CONCURRENCY = int(os.getenv("VIDEO_ENCODE_CONCURRENCY", "2"))
+
+# A failed photo upload is retried after UPLOAD_BACKOFF_BASE seconds, doubling with each
+# further failure up to UPLOAD_BACKOFF_MAX. The uploader gives up after
+# UPLOAD_ATTEMPTS_PER_RUN tries and leaves the rendition queued for the next run
+UPLOAD_BACKOFF_BASE = float(os.getenv("UPLOAD_BACKOFF_BASE", "2"))
+UPLOAD_BACKOFF_MAX = float(os.getenv("UPLOAD_BACKOFF_MAX", str(5 * 60)))
+UPLOAD_ATTEMPTS_PER_RUN = int(os.getenv("UPLOAD_ATTEMPTS_PER_RUN", "8"))
+
+# After this many consecutive failed CDN uploads the circuit opens, and uploads wait rather
+# than fail for UPLOAD_CIRCUIT_RESET seconds before one is let through to probe the network
+UPLOAD_CIRCUIT_FAILURES = int(os.getenv("UPLOAD_CIRCUIT_FAILURES", "5"))
+UPLOAD_CIRCUIT_RESET = float(os.getenv("UPLOAD_CIRCUIT_RESET", "30"))
+
+# Seconds a CDN bucket listing is trusted before the bucket is listed again
+CDN_INVENTORY_TTL = int(os.getenv("CDN_INVENTORY_TTL", str(6 * 60 * 60)))
+
 # Where `mirror free` writes the tar.gz archives it takes off the camera
 ARCHIVED_PHOTOS_DIRECTORY = os.getenv("ARCHIVED_PHOTOS_DIRECTORY", f"{HOME}/ArchivedPhotos")
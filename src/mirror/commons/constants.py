@@ -131,9 +131,55 @@ BYTES_PER_UNIT = 1024.0
 # format so the published triple labels stay stable.
 THUMBHASH_ROLES = ("thumbnail_mosaic", "mosaic_banner")
 
+# Scan: photos per EXIF/phash extraction job. Small enough that a few hundred new
+# photos spread across every worker, large enough to amortise one database write.
+FEATURE_EXTRACTION_CHUNK_SIZE = 16
+
+# Photo upload: photos per run re-encoded because a role's IMAGE_ENCODINGS parameters
+# changed. Photos missing a role are always uploaded; stale ones are spread over runs.
+STALE_RENDITION_LIMIT = 200
+
+# Photo upload: concurrent CDN uploads, each carrying one rendition. The uploader starts
+# at PHOTO_CDN_CONCURRENCY and adjusts between the minimum and maximum as throughput and
+# errors allow.
+PHOTO_CDN_CONCURRENCY = 6
+PHOTO_CDN_MIN_CONCURRENCY = 1
+PHOTO_CDN_MAX_CONCURRENCY = 32
+
+# Photo upload: seconds the uploader waits on in-flight uploads before checking the outbox
+# for new renditions.
+PHOTO_OUTBOX_POLL_SECONDS = 0.5
+
+# Video upload: concurrent CDN uploads, each carrying one encoded role in parts.
+VIDEO_CDN_CONCURRENCY = 2
+
+# Photo upload: photos encoded and spooled beyond the encode slots, waiting on an upload
+# slot. Bounds the spool on disk while keeping the uplink fed when encoding stalls; deep
+# enough that the renditions queued can fill PHOTO_CDN_MAX_CONCURRENCY uploads.
+PHOTO_UPLOAD_QUEUE_DEPTH = 8
+
 # ThumbHash requires input images of at most 100x100 pixels
 THUMBHASH_MAX_DIMENSION = 100
 
+# Corner-lightness sampling decodes photos with the shorter side reduced to no less than
+# this. The grey is an average, so detail beyond this size is decoded only to be thrown
+# away. The phash is not reduced: it keys stored metadata, so must match earlier hashes.
+ANALYSIS_DECODE_MIN_DIMENSION = 256
+
+# Quality-targeted encoding: the lowest quality a role with a `target_ssim` is searched
+# down to. Below this, lossy codecs smear detail whatever the similarity score says.
+QUALITY_SEARCH_FLOOR = 40
+
+# The structural similarity to the resized source each role may be quality-targeted to,
+# when QUALITY_TARGETED_ENCODING is on. The role's `quality` becomes a ceiling, and each
+# photo is encoded at the lowest quality whose rendition keeps the similarity. These are
+# kept out of IMAGE_ENCODINGS, so turning targeting on leaves the roles' fingerprints as
+# they were: published renditions stay, and only new encodes are targeted.
+QUALITY_TARGETS = {
+    "thumbnail_lossy": 0.98,
+    "mid_image_lossy": 0.98,
+}
+
 # How should we encode our photos? Currently uses
 # - thumbnail: a lossy thumbnail for fast loading
 # - full_image_lossless: a lossless webp image for high quality
@@ -191,6 +237,57 @@ IMAGE_ENCODINGS = {
     },
 }
 
+# Widths the mid image is published at as a srcset, so a phone fetches a phone-sized image
+# and a wide screen a sharper one. Each rung keeps mid_image_lossy's parameters and its
+# framing, to the nearest pixel, and all are encoded from the same decode; the rung at
+# mid_image_lossy's own width is mid_image_lossy itself.
+RESPONSIVE_WIDTHS = (320, 480, 640, 960, 1444, 2048)
+
+# The photo role holding each responsive width
+RESPONSIVE_ROLES = {
+    width: (
+        "mid_image_lossy"
+        if width == IMAGE_ENCODINGS["mid_image_lossy"]["width"]
+        else f"mid_image_lossy_{width}w"
+    )
+    for width in RESPONSIVE_WIDTHS
+}
+
+MID_IMAGE_ASPECT_RATIO = (
+    IMAGE_ENCODINGS["mid_image_lossy"]["width"] / IMAGE_ENCODINGS["mid_image_lossy"]["height"]
+)
+
+IMAGE_ENCODINGS |= {
+    role: {
+        **IMAGE_ENCODINGS["mid_image_lossy"],
+        "width": width,
+        "height": round(width / MID_IMAGE_ASPECT_RATIO),
+    }
+    for width, role in RESPONSIVE_ROLES.items()
+    if role not in IMAGE_ENCODINGS
+}
+
+# The roles added for the ladder alone, as mid_image_lossy is also shown on its own. A
+# source smaller than one of these rungs is not upscaled to fill it; the rung is skipped,
+# and so left out of the photo's srcset
+RESPONSIVE_RUNG_ROLES = tuple(
+    role for role in RESPONSIVE_ROLES.values() if role != "mid_image_lossy"
+)
+
+# Rendition tiers. Critical roles are the ones pages show, and are uploaded before
+# publishing. Deferred roles are the costly lossless encodes the site rarely serves, and
+# the responsive rungs other than mid_image_lossy, which a srcset lists only once uploaded.
+# They are uploaded after publishing, or by `mirror backfill`, so a new album never waits
+# on them, and adding a rung never holds up publishing the library. Roles not listed in
+# DEFERRED_ROLES are critical.
+CRITICAL_TIER = "critical"
+DEFERRED_TIER = "deferred"
+DEFERRED_ROLES = (
+    "full_image_lossless",
+    "full_image_png",
+    *RESPONSIVE_RUNG_ROLES,
+)
+
 # Source files used as full-width page banners. The `banner` rendition above is
 # only generated for these, so we don't produce a 2560px hero for every photo.
 # How should we encode our videos? Currently uses unscaled + various
@@ -232,6 +329,19 @@ VIDEO_ENCODINGS: list[Any] = [
 
 FULL_SIZED_VIDEO_ROLE = "video_libx264_unscaled"
 
+# Adaptive streaming: the scaled VIDEO_ENCODINGS renditions as CMAF segments, listed by an
+# HLS master playlist. Players fetch only the variant and the seconds they actually play
+VIDEO_HLS_ROLE = "video_hls"
+VIDEO_HLS_VARIANTS = ["video_libx264_1080p", "video_libx264_720p", "video_libx264_480p"]
+VIDEO_HLS_SEGMENT_SECONDS = 6
+VIDEO_HLS_PLAYLIST = "master.m3u8"
+HLS_PLAYLIST_CONTENT_TYPE = "application/vnd.apple.mpegurl"
+HLS_CONTENT_TYPES = {
+    ".m3u8": HLS_PLAYLIST_CONTENT_TYPE,
+    ".m4s": "video/iso.segment",
+    ".mp4": "video/mp4",
+}
+
 VIDEO_THUMBNAIL_FORMAT = ".webp"
 VIDEO_CONTENT_TYPE = "video/mp4"
 URN_PREFIX = "urn:ró:"
@@ -257,6 +367,10 @@ UNPUBLISHED_THINGS_RELATIONS = frozenset({"near"})
 # Subject detection: the GroundingDINO checkpoint used to find subject boxes.
 DETECTION_MODEL_ID = "IDEA-Research/grounding-dino-base"
 
+# Subject detection: photos are decoded with the shorter side reduced to no less than this.
+# The GroundingDINO processor resizes its input to an 800px shortest edge.
+DETECTION_DECODE_MIN_DIMENSION = 800
+
 # Subject detection: minimum GroundingDINO confidence for a box to be stored.
 DETECTION_CONFIDENCE_THRESHOLD = 0.35
 
@@ -23,3 +23,11 @@ class VideoResolutionLookupError(Exception):
 
 class VideoReadError(Exception):
     pass
+
+
+class VideoEncodeError(Exception):
+    """Raised when ffmpeg exits with an error while streaming an encode."""
+
+
+class CdnUnavailableError(Exception):
+    """Raised instead of calling the CDN while repeated failures hold its circuit open."""
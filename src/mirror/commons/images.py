@@ -0,0 +1,38 @@
+"""Reduced-resolution image decoding for the analysis paths."""
+
+import math
+
+from PIL import Image
+
+
+def reduction_factor(size: tuple[int, int], min_dimension: int) -> int:
+    """The largest integer downscale that keeps the shorter side at least min_dimension."""
+    return max(1, min(size) // min_dimension)
+
+
+def open_preview(
+    fpath: str, min_dimension: int, mode: str = "RGB"
+) -> tuple[Image.Image, tuple[int, int]]:
+    """Decode an image with its shorter side reduced towards, but never below, min_dimension.
+
+    JPEGs are decoded straight at 1/2, 1/4 or 1/8 scale by libjpeg (draft), in `mode` where
+    the decoder supports it, so most pixels are never decoded. Other formats are decoded in
+    full, then box-reduced. The image keeps its EXIF orientation tag and is not converted to
+    `mode`. Returns the image and the original (width, height)."""
+    with Image.open(fpath) as img:
+        original_size = img.size
+
+        if img.format == "JPEG":
+            scale = min_dimension / min(original_size)
+            if scale < 1:
+                img.draft(mode, tuple(math.ceil(side * scale) for side in original_size))
+
+            img.load()
+            return img, original_size
+
+        factor = reduction_factor(original_size, min_dimension)
+        if factor == 1:
+            img.load()
+            return img, original_size
+
+        return img.reduce(factor), original_size
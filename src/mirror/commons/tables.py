@@ -44,12 +44,149 @@ create table if not exists exif (
 );
 """
 
+# Stat fields of every file in a Published directory, and of each Published directory
+# itself, as of the last scan. A directory whose mtime and inode still match is not
+# re-listed; a file whose (size, mtime_ns, inode) still matches is not re-read.
+FILE_STATE_TABLE = """
+create table if not exists file_state (
+  fpath     text primary key,
+  size      integer not null,
+  mtime_ns  integer not null,
+  inode     integer not null,
+  kind      text not null
+);
+"""
+
+# ffprobe's description of each video, valid while the file's size and mtime are
+# unchanged. Probing spawns a subprocess, so an unchanged file is probed only once.
+VIDEO_PROBE_TABLE = """
+create table if not exists video_probe (
+  fpath          text primary key,
+  size           integer not null,
+  mtime_ns       integer not null,
+  duration       real,
+  width          integer,
+  height         integer,
+  video_codec    text,
+  audio_codec    text,
+  bitrate        integer,
+  creation_time  text,
+  pixel_format   text
+);
+"""
+
+# In-progress multipart uploads to the CDN, so an interrupted video upload resumes with
+# only its missing parts. The upload is tied to the encoded file's size and mtime, and to
+# the part size it was split with; if any change, it is restarted.
+MULTIPART_UPLOADS_TABLE = """
+create table if not exists multipart_uploads (
+  key        text primary key,
+  upload_id  text not null,
+  fpath      text not null,
+  size       integer not null,
+  mtime_ns   integer not null,
+  part_size  integer not null
+);
+"""
+
+MULTIPART_PARTS_TABLE = """
+create table if not exists multipart_parts (
+  key          text not null,
+  part_number  integer not null,
+  etag         text not null,
+
+  primary key (key, part_number),
+  foreign key (key) references multipart_uploads(key) on delete cascade
+);
+"""
+
+# Photo renditions encoded and waiting on disk for upload. A task outlives the run that
+# queued it, so an interrupted or offline session resumes uploading from the artifact rather
+# than re-encoding. Failed uploads are retried no sooner than next_attempt_at (Unix time)
+UPLOAD_OUTBOX_TABLE = """
+create table if not exists upload_outbox (
+  fpath            text not null,
+  role             text not null,
+  -- sha256 of the source photo the artifact was encoded from
+  source_hash      text not null,
+  artifact_path    text not null,
+  -- the role's IMAGE_ENCODINGS parameters, as JSON
+  params           text not null,
+  attempts         integer not null default 0,
+  last_error       text,
+  next_attempt_at  real not null default 0,
+
+  primary key (fpath, role)
+);
+"""
+
+# Photos planned for upload in each run, and how many have finished encoding. The uploader
+# drains the outbox until every planned photo has queued its renditions
+UPLOAD_RUNS_TABLE = """
+create table if not exists upload_runs (
+  run_id          text primary key,
+  photos          integer not null,
+  photos_encoded  integer not null default 0
+);
+"""
+
+# Objects in the CDN bucket as of the last full listing, so existence checks need no
+# per-object HEAD request. Objects we upload are added as they complete, with no etag
+# until the next listing.
+CDN_OBJECTS_TABLE = """
+create table if not exists cdn_objects (
+  key   text primary key,
+  size  integer not null,
+  etag  text
+);
+"""
+
+# When the bucket was last listed in full; one row at most
+CDN_LISTINGS_TABLE = """
+create table if not exists cdn_listings (
+  id         integer primary key check (id = 1),
+  listed_at  integer not null
+);
+"""
+
 ENCODED_PHOTOS_TABLE = """
 create table if not exists encoded_photos (
   fpath       text not null,
   mimetype    text not null,
   role        text not null,
   url         text not null,
+  -- encoding_fingerprint of the role's IMAGE_ENCODINGS parameters when it was encoded;
+  -- null for roles that are not encoded from IMAGE_ENCODINGS (thumbhashes, video posters)
+  params_hash text,
+
+  primary key (fpath, role)
+);
+"""
+
+# The quality chosen for each quality-targeted photo rendition, and the source content and
+# role parameters it was searched for. Re-encoding the same rendition reuses it, rather than
+# searching again
+RENDITION_QUALITIES_TABLE = """
+create table if not exists rendition_qualities (
+  fpath        text not null,
+  role         text not null,
+  -- sha256 of the source photo the quality was searched on
+  source_hash  text not null,
+  -- encoding_fingerprint of the role's IMAGE_ENCODINGS parameters
+  params_hash  text not null,
+  quality      integer not null,
+
+  primary key (fpath, role)
+);
+"""
+
+# Responsive rungs wider than the photo, which are never upscaled to fill them. Planning
+# counts them as neither wanted nor missing for the photo; its rows are dropped when the
+# source is rewritten, so a larger replacement is encoded at every rung it fills
+UNFILLED_RENDITIONS_TABLE = """
+create table if not exists unfilled_renditions (
+  fpath text not null,
+  role  text not null,
 
   primary key (fpath, role)
 );
@@ -250,6 +387,7 @@ create view if not exists view_video_data as
     coalesce(video_url_1080p.url, null) as video_url_1080p,
     coalesce(video_url_720p.url, null) as video_url_720p,
     coalesce(video_url_480p.url, null) as video_url_480p,
+    coalesce(video_url_hls.url, null) as video_url_hls,
     coalesce(poster_url.url, null) as poster_url
   from videos
   left join view_album_data
@@ -263,6 +401,8 @@ create view if not exists view_video_data as
     on videos.fpath = video_url_720p.fpath and video_url_720p.role = 'video_libx264_720p'
   left join encoded_videos video_url_480p
     on videos.fpath = video_url_480p.fpath and video_url_480p.role = 'video_libx264_480p'
+  left join encoded_videos video_url_hls
+    on videos.fpath = video_url_hls.fpath and video_url_hls.role = 'video_hls'
   left join encoded_photos poster_url
     on videos.fpath = poster_url.fpath and poster_url.role = 'video_thumbnail_webp'
   order by videos.fpath desc;
@@ -1,6 +1,7 @@
 """Various utility functions."""
 
 import hashlib
+import json
 from pathlib import Path
 from typing import Optional
 
@@ -24,6 +25,11 @@ def deterministic_hash_str(data: str) -> str:
     return hashlib.md5(data.encode()).hexdigest()[:10]
 
 
+def encoding_fingerprint(params: dict) -> str:
+    """Short stable hash of a role's encoder parameters; changes when any parameter does."""
+    return deterministic_hash_str(json.dumps(params, sort_keys=True))
+
+
 def deterministic_hash(data: bytes) -> str:
     """Returns a deterministic MD5 hash (10 chars) of bytes.
 
@@ -3,22 +3,18 @@
 from __future__ import annotations
 
 import os
-from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from typing import TYPE_CHECKING, Iterator
 
-import ffmpeg
-
 from mirror.commons.constants import DATE_FORMAT
 from mirror.data.things import animal_types
 from mirror.data.types import SemanticTriple
+from mirror.services.video_probe import VideoProber
 
 if TYPE_CHECKING:
+    from mirror.models.video import VideoProbe
     from mirror.services.database import SqliteDatabase
 
-# concurrent ffprobe subprocesses; each probe is subprocess-bound, not CPU-bound
-PROBE_WORKERS = 12
-
 
 def animal_type_filters(column: str) -> str:
     """SQL disjunction matching any animal-typed subject URN in the given column."""
@@ -59,34 +55,14 @@ def _exif_created_at_to_unix_ms(created_at: str) -> int:
     return int(parsed.timestamp() * 1000)
 
 
-def _probe_creation_time_ms(fpath: str) -> int | None:
-    """Read the container `creation_time` tag as millisecond Unix time, or None."""
-    try:
-        metadata = ffmpeg.probe(fpath)
-    except ffmpeg.Error:
-        return None
-
-    tags = metadata.get("format", {}).get("tags", {})
-    raw = tags.get("creation_time")
-    if not raw:
-        return None
-
-    try:
-        parsed = datetime.fromisoformat(raw)
-    except ValueError:
-        return None
-
-    return int(parsed.timestamp() * 1000)
-
-
-def _video_capture_unix_ms(fpath: str) -> int | None:
+def _video_capture_unix_ms(fpath: str, probe: VideoProbe | None) -> int | None:
     """Best-effort capture time for a video, in millisecond Unix time.
 
     Prefer the container `creation_time` tag — the true recording time — and fall
     back to the file mtime. mtime alone is unreliable: a bulk re-import resets it
     years past the real capture date, so it is only a last resort. Returns None
     when the file is absent and no tag is available."""
-    creation_time = _probe_creation_time_ms(fpath)
+    creation_time = probe.creation_time_ms() if probe else None
     if creation_time is not None:
         return creation_time
 
@@ -118,21 +94,14 @@ def _read_photo_first_seen(db: SqliteDatabase, earliest: dict[str, int]) -> None
         _merge_earliest(earliest, raw_urn, _exif_created_at_to_unix_ms(created_at))
 
 
-def _probe_capture_times(fpaths: list[str]) -> dict[str, int | None]:
-    """Capture time per video path. Each probe spawns ffprobe, so run them concurrently."""
-    if not fpaths:
-        return {}
-    with ThreadPoolExecutor(max_workers=PROBE_WORKERS) as pool:
-        return dict(zip(fpaths, pool.map(_video_capture_unix_ms, fpaths), strict=True))
-
-
 def _read_video_first_seen(db: SqliteDatabase, earliest: dict[str, int]) -> None:
     """Merge earliest capture times for filmed animal subjects."""
     rows = db.conn.execute(animal_video_subject_query()).fetchall()
-    captured = _probe_capture_times(sorted({fpath for fpath, _ in rows}))
+    # only videos added or changed since the last publish are probed
+    probes = VideoProber(db.video_probe_table()).probe_many(sorted({fpath for fpath, _ in rows}))
 
     for fpath, raw_urn in rows:
-        when_ms = captured[fpath]
+        when_ms = _video_capture_unix_ms(fpath, probes[fpath])
         if when_ms is not None:
             _merge_earliest(earliest, raw_urn, when_ms)
 
@@ -7,6 +7,7 @@ from mirror.commons.constants import (
     COVER_MIN_SUBJECT_FILL,
     MISCELLANEOUS_ALBUM_ID,
     PERSON_URN_PREFIX,
+    RESPONSIVE_ROLES,
 )
 from mirror.commons.urn import parse_mirror_urn
 from mirror.commons.utils import deterministic_hash_str, short_cdn_url
@@ -32,14 +33,33 @@ def photo_row_triples(photo) -> Iterator[SemanticTriple]:
     yield SemanticTriple(source, "created_at", created_at_ms)
 
 
+def responsive_srcsets(db: "SqliteDatabase") -> dict[str, str]:
+    """Each photo's uploaded responsive widths as a compact srcset: short CDN URLs with
+    width descriptors, narrowest first."""
+    rungs: dict[str, list[str]] = {}
+    for width, role in sorted(RESPONSIVE_ROLES.items()):
+        for encoding in db.encoded_photos_table().list_by_role(role):
+            if encoding.url.strip():
+                rungs.setdefault(encoding.fpath, []).append(
+                    f"{short_cdn_url(encoding.url)} {width}w"
+                )
+
+    return {fpath: ",".join(entries) for fpath, entries in rungs.items()}
+
+
 class PhotoTriples:
     @staticmethod
     def read(db: "SqliteDatabase") -> Iterator[SemanticTriple]:
+        srcsets = responsive_srcsets(db)
+
         for photo in db.photo_data_table().list():
             if photo.album_id is None:
                 continue
 
             yield from photo_row_triples(photo)
+            if photo.fpath in srcsets:
+                source = f"urn:ró:photo:{deterministic_hash_str(photo.fpath)}"
+                yield SemanticTriple(source, "mid_image_srcset", srcsets[photo.fpath])
 
         for fpath, grey_value in db.photo_icon_table().list():
             source = f"urn:ró:photo:{deterministic_hash_str(fpath)}"
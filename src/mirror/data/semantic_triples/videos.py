@@ -33,6 +33,7 @@ def video_url_triples(video, source: str) -> Iterator[SemanticTriple]:
         "video_url_1080p": short_cdn_url(video.video_url_1080p),
         "video_url_720p": short_cdn_url(video.video_url_720p),
         "video_url_480p": short_cdn_url(video.video_url_480p),
+        "video_url_hls": short_cdn_url(video.video_url_hls),
         "poster_url": short_cdn_url(video.poster_url),
     }
 
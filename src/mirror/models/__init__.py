@@ -2,39 +2,60 @@
 
 from mirror.models.album import Album, AlbumDataModel, AlbumMetadataModel
 from mirror.models.exif import ExifReader, PhotoExifData
+from mirror.models.manifest import ManifestEntry
 from mirror.models.media import IMedia, Media
 from mirror.models.mirror_types import IModel, VideoEncoding, VideoEncodingConfig
 from mirror.models.phash import PhashData, PHashReader
 from mirror.models.photo import (
     EncodedPhotoModel,
     Photo,
+    PhotoAnalysis,
     PhotoContent,
     PhotoMetadataModel,
     PhotoMetadataSummaryModel,
     PhotoModel,
+    RenditionQuality,
 )
-from mirror.models.video import EncodedVideoModel, Video, VideoModel
+from mirror.models.upload import (
+    CdnObject,
+    CdnReconciliation,
+    MultipartUpload,
+    OutboxTask,
+    PartReport,
+    UploadReport,
+)
+from mirror.models.video import EncodedVideoModel, Video, VideoModel, VideoProbe
 
 __all__ = [
     "Album",
     "AlbumDataModel",
     "AlbumMetadataModel",
+    "CdnObject",
+    "CdnReconciliation",
     "EncodedPhotoModel",
     "EncodedVideoModel",
     "ExifReader",
     "IMedia",
     "IModel",
+    "ManifestEntry",
     "Media",
+    "MultipartUpload",
+    "OutboxTask",
     "PHashReader",
+    "PartReport",
     "PhashData",
     "Photo",
+    "PhotoAnalysis",
     "PhotoContent",
     "PhotoExifData",
     "PhotoMetadataModel",
     "PhotoMetadataSummaryModel",
     "PhotoModel",
+    "RenditionQuality",
+    "UploadReport",
     "Video",
     "VideoEncoding",
     "VideoEncodingConfig",
     "VideoModel",
+    "VideoProbe",
 ]
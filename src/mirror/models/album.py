@@ -4,9 +4,10 @@ import json
 import os
 from dataclasses import dataclass
 from functools import lru_cache
-from typing import Any, Iterator, List
+from typing import Any, Iterator, List, Optional
 
 from mirror.commons.config import ALBUM_METADATA_FILE
+from mirror.models.manifest import ManifestEntry, scan_published
 from mirror.models.mirror_types import IModel
 from mirror.models.photo import Photo
 from mirror.models.video import Video
@@ -16,8 +17,9 @@ class Album:
     """A class representing a photo album. This corresponds to a folder with a `Published`
     directory underneath"""
 
-    def __init__(self, dpath: str):
+    def __init__(self, dpath: str, entries: Optional[List[ManifestEntry]] = None):
         self.dpath = dpath
+        self._entries = entries
 
     def published_path(self) -> str:
         """Get the directory of published media"""
@@ -27,32 +29,31 @@ class Album:
         """Is there any published media?"""
         return os.path.isdir(self.published_path())
 
+    def entries(self) -> List[ManifestEntry]:
+        """Files in the published directory, listed from disk at most once"""
+        if self._entries is None:
+            self._entries = scan_published(self.published_path()) if self.published() else []
+
+        return self._entries
+
     def covers(self) -> Iterator:
         """Get the cover photo for this album, if it exists"""
-        if self.published():
-            for fname in os.listdir(self.published_path()):
-                if "+cover" in fname:
-                    fpath = os.path.join(self.published_path(), fname)
-
-                    if Photo.is_a(fpath):
-                        yield Photo(fpath)
-                    else:
-                        raise Exception(f"Cover photo {fpath} is not a photo")
+        for entry in self.entries():
+            if "+cover" in entry.name:
+                if entry.is_photo():
+                    yield Photo(entry.fpath)
+                else:
+                    raise Exception(f"Cover photo {entry.fpath} is not a photo")
 
         return None
 
     def media(self) -> Iterator:
         """Yield all media from the photo-album"""
-        if not self.published():
-            return
-
-        for fname in os.listdir(self.published_path()):
-            fpath = os.path.join(self.published_path(), fname)
-
-            if Photo.is_a(fpath):
-                yield Photo(fpath)
-            elif Video.is_a(fpath):
-                yield Video(fpath)
+        for entry in self.entries():
+            if entry.is_photo():
+                yield Photo(entry.fpath)
+            elif entry.is_video():
+                yield Video(entry.fpath)
 
 
 @dataclass
@@ -0,0 +1,96 @@
+"""Directory listings of published media, read with one scandir pass per album"""
+
+import os
+from dataclasses import dataclass
+from typing import List
+
+from mirror.models.mirror_types import IModel
+from mirror.models.photo import Photo
+from mirror.models.video import Video
+
+PHOTO_KIND = "photo"
+VIDEO_KIND = "video"
+OTHER_KIND = "other"
+DIRECTORY_KIND = "directory"
+
+
+def media_kind(name: str) -> str:
+    """Classify a file by extension, without touching the disk."""
+    if name.endswith(Photo.IMAGE_EXTENSIONS):
+        return PHOTO_KIND
+    if name.endswith(Video.VIDEO_EXTENSIONS):
+        return VIDEO_KIND
+    return OTHER_KIND
+
+
+@dataclass(frozen=True)
+class ManifestEntry(IModel):
+    """One regular file in an album's Published directory, or the directory itself, with
+    its stat fields"""
+
+    fpath: str
+    name: str
+    size: int
+    mtime_ns: int
+    inode: int
+    kind: str
+
+    @classmethod
+    def from_row(cls, row: List) -> "ManifestEntry":
+        (fpath, size, mtime_ns, inode, kind) = row
+
+        return ManifestEntry(
+            fpath=fpath,
+            name=os.path.basename(fpath),
+            size=size,
+            mtime_ns=mtime_ns,
+            inode=inode,
+            kind=kind,
+        )
+
+    def is_photo(self) -> bool:
+        return self.kind == PHOTO_KIND
+
+    def is_video(self) -> bool:
+        return self.kind == VIDEO_KIND
+
+
+def stat_directory(dpath: str) -> ManifestEntry:
+    """Stat a Published directory. Its mtime changes whenever a file is added, removed or
+    renamed inside it."""
+    stat = os.stat(dpath)
+
+    return ManifestEntry(
+        fpath=dpath,
+        name=os.path.basename(dpath),
+        size=stat.st_size,
+        mtime_ns=stat.st_mtime_ns,
+        inode=stat.st_ino,
+        kind=DIRECTORY_KIND,
+    )
+
+
+def scan_published(dpath: str) -> list[ManifestEntry]:
+    """List the regular files in a Published directory.
+
+    scandir reports the file type from the directory read, so only files need a stat."""
+    entries = []
+
+    with os.scandir(dpath) as listing:
+        for dir_entry in listing:
+            if not dir_entry.is_file():
+                continue
+
+            stat = dir_entry.stat()
+            entries.append(
+                ManifestEntry(
+                    fpath=dir_entry.path,
+                    name=dir_entry.name,
+                    size=stat.st_size,
+                    mtime_ns=stat.st_mtime_ns,
+                    inode=stat.st_ino,
+                    kind=media_kind(dir_entry.name),
+                )
+            )
+
+    return entries
@@ -14,7 +14,9 @@ class PhashData(TypedDict):
 class PHashReader:
     @classmethod
     def phash(cls, fpath: str) -> PhashData:
-        """Get a perceptual hash from a photo."""
+        """Get a perceptual hash from a photo. The photo is decoded at full resolution:
+        metadata and detections are keyed by this hash, so a reduced decode, which can
+        round the hash differently, would orphan them."""
 
         img = Image.open(fpath)
 
@@ -6,7 +6,7 @@ import os
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from functools import lru_cache
-from typing import Any, List
+from typing import Any, List, Optional
 
 from mirror.commons.config import PHOTO_METADATA_FILE
 from mirror.commons.constants import SUPPORTED_IMAGE_EXTENSIONS
@@ -14,17 +14,30 @@ from mirror.models.mirror_types import IModel
 
 
 class PhotoContent:
-    """Holds the content of an image"""
+    """Holds the content of an image, and the quality it was encoded at, when known"""
 
     content: bytes
+    quality: Optional[int]
 
-    def __init__(self, content: bytes) -> None:
+    def __init__(self, content: bytes, quality: Optional[int] = None) -> None:
         self.content = content
+        self.quality = quality
 
     def hash(self) -> str:
         return hashlib.md5(self.content).hexdigest()[:10]
 
 
+@dataclass(frozen=True)
+class PhotoAnalysis:
+    """Cheap analytics of a photo, all computed from one reduced-size decode"""
+
+    fpath: str
+    # neutral grey hex contrasting with the photo's top-right corner
+    grey_value: str
+    # unpadded-base64 ThumbHash placeholder
+    thumbhash: str
+
+
 @dataclass
 class EncodedPhotoModel(IModel):
     """Encoded photo database model"""
@@ -33,12 +46,38 @@ class EncodedPhotoModel(IModel):
     mimetype: str
     role: str
     url: str
+    params_hash: Optional[str] = None
 
     @classmethod
     def from_row(cls, row: List) -> "EncodedPhotoModel":
-        (fpath, mimetype, role, url) = row
+        (fpath, mimetype, role, url, params_hash) = row
+
+        return EncodedPhotoModel(
+            fpath=fpath, mimetype=mimetype, role=role, url=url, params_hash=params_hash
+        )
+
+
+@dataclass(frozen=True)
+class RenditionQuality(IModel):
+    """The quality a quality-targeted rendition was encoded at"""
 
-        return EncodedPhotoModel(fpath=fpath, mimetype=mimetype, role=role, url=url)
+    fpath: str
+    role: str
+    source_hash: str
+    params_hash: str
+    quality: int
+
+    @classmethod
+    def from_row(cls, row: List) -> "RenditionQuality":
+        (fpath, role, source_hash, params_hash, quality) = row
+
+        return RenditionQuality(
+            fpath=fpath,
+            role=role,
+            source_hash=source_hash,
+            params_hash=params_hash,
+            quality=quality,
+        )
 
 
 @dataclass
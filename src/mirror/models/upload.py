@@ -0,0 +1,132 @@
+"""CDN uploads: resumable multipart uploads and the bucket inventory"""
+
+import json
+import math
+import os
+from dataclasses import dataclass
+from typing import List, Optional
+
+from mirror.models.mirror_types import IModel
+
+
+@dataclass(frozen=True)
+class MultipartUpload(IModel):
+    """A multipart upload of one local file, as started on the CDN"""
+
+    key: str
+    upload_id: str
+    fpath: str
+    size: int
+    mtime_ns: int
+    part_size: int
+
+    @classmethod
+    def from_row(cls, row: List) -> "MultipartUpload":
+        (key, upload_id, fpath, size, mtime_ns, part_size) = row
+
+        return MultipartUpload(
+            key=key,
+            upload_id=upload_id,
+            fpath=fpath,
+            size=size,
+            mtime_ns=mtime_ns,
+            part_size=part_size,
+        )
+
+    def part_count(self) -> int:
+        return max(1, math.ceil(self.size / self.part_size))
+
+    def resumes(self, size: int, mtime_ns: int, part_size: int) -> bool:
+        """Can this upload continue for the file as it is now, split the same way?"""
+        return (self.size, self.mtime_ns, self.part_size) == (size, mtime_ns, part_size)
+
+
+@dataclass(frozen=True)
+class OutboxTask(IModel):
+    """An encoded photo rendition waiting on disk to be uploaded"""
+
+    fpath: str
+    role: str
+    source_hash: str
+    artifact_path: str
+    params: dict
+    attempts: int = 0
+    last_error: Optional[str] = None
+    next_attempt_at: float = 0
+
+    @classmethod
+    def from_row(cls, row: List) -> "OutboxTask":
+        (fpath, role, source_hash, artifact_path, params, attempts, last_error, next_attempt) = row
+
+        return OutboxTask(
+            fpath=fpath,
+            role=role,
+            source_hash=source_hash,
+            artifact_path=artifact_path,
+            params=json.loads(params),
+            attempts=attempts,
+            last_error=last_error,
+            next_attempt_at=next_attempt,
+        )
+
+    def is_deliverable(self) -> bool:
+        """Is the encoded artifact still on disk to upload?"""
+        return os.path.isfile(self.artifact_path)
+
+    def key(self) -> tuple[str, str]:
+        return (self.fpath, self.role)
+
+
+@dataclass(frozen=True)
+class CdnObject(IModel):
+    """An object in the CDN bucket"""
+
+    key: str
+    size: int
+    etag: Optional[str] = None
+
+    @classmethod
+    def from_row(cls, row: List) -> "CdnObject":
+        (key, size, etag) = row
+
+        return CdnObject(key=key, size=size, etag=etag)
+
+
+@dataclass(frozen=True)
+class CdnReconciliation:
+    """Differences between the CDN bucket and the encoded media rows that link into it"""
+
+    # bucket keys no encoded_photos or encoded_videos row links to
+    orphaned_keys: List[str]
+    # (fpath, role) of rows linking to a key the bucket does not have
+    missing_objects: List[tuple[str, str]]
+
+
+@dataclass(frozen=True)
+class PartReport:
+    """Throughput of one uploaded part"""
+
+    key: str
+    part_number: int
+    size: int
+    seconds: float
+
+    def megabits_per_second(self) -> float:
+        return self.size * 8 / 1_000_000 / max(self.seconds, 1e-6)
+
+
+@dataclass(frozen=True)
+class UploadReport:
+    """The outcome and throughput of one rendition upload"""
+
+    task: OutboxTask
+    size: int
+    seconds: float
+    url: Optional[str] = None
+    # set when the upload failed
+    error: Optional[str] = None
+    # could a retry get past the failure? A missing artifact or a refused request cannot
+    transient: bool = True
+
+    def megabits_per_second(self) -> float:
+        return self.size * 8 / 1_000_000 / max(self.seconds, 1e-6)
@@ -2,11 +2,18 @@
 
 import os
 from dataclasses import dataclass
-from typing import List, Optional
+from datetime import datetime
+from typing import List, Optional, Tuple
 
+from mirror.commons.exceptions import VideoResolutionLookupError
 from mirror.models.mirror_types import IModel
 
 
+def optional_number(value, cast):
+    """ffprobe reports numbers as strings, or omits them"""
+    return cast(value) if value not in {None, "", "N/A"} else None
+
+
 @dataclass
 class EncodedVideoModel(IModel):
     fpath: str
@@ -21,6 +28,101 @@ class EncodedVideoModel(IModel):
         return EncodedVideoModel(fpath=fpath, mimetype=mimetype, role=role, url=url)
 
 
+@dataclass(frozen=True)
+class VideoProbe(IModel):
+    """ffprobe's description of a video file, as of the recorded size and mtime"""
+
+    fpath: str
+    size: int
+    mtime_ns: int
+    duration: Optional[float] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    video_codec: Optional[str] = None
+    audio_codec: Optional[str] = None
+    bitrate: Optional[int] = None
+    creation_time: Optional[str] = None
+    pixel_format: Optional[str] = None
+
+    @classmethod
+    def from_row(cls, row: List) -> "VideoProbe":
+        (
+            fpath,
+            size,
+            mtime_ns,
+            duration,
+            width,
+            height,
+            video_codec,
+            audio_codec,
+            bitrate,
+            creation_time,
+            pixel_format,
+        ) = row
+
+        return VideoProbe(
+            fpath=fpath,
+            size=size,
+            mtime_ns=mtime_ns,
+            duration=duration,
+            width=width,
+            height=height,
+            video_codec=video_codec,
+            audio_codec=audio_codec,
+            bitrate=bitrate,
+            creation_time=creation_time,
+            pixel_format=pixel_format,
+        )
+
+    @classmethod
+    def from_probe(cls, fpath: str, stat: os.stat_result, probe: dict) -> "VideoProbe":
+        """Build from `ffmpeg.probe` output, for the file as it was when stat-ed"""
+        streams = probe.get("streams", [])
+        video = next((stream for stream in streams if stream["codec_type"] == "video"), {})
+        audio = next((stream for stream in streams if stream["codec_type"] == "audio"), {})
+        container = probe.get("format", {})
+
+        return VideoProbe(
+            fpath=fpath,
+            size=stat.st_size,
+            mtime_ns=stat.st_mtime_ns,
+            duration=optional_number(container.get("duration") or video.get("duration"), float),
+            width=optional_number(video.get("width"), int),
+            height=optional_number(video.get("height"), int),
+            video_codec=video.get("codec_name"),
+            audio_codec=audio.get("codec_name"),
+            bitrate=optional_number(container.get("bit_rate"), int),
+            creation_time=container.get("tags", {}).get("creation_time"),
+            pixel_format=video.get("pix_fmt"),
+        )
+
+    def matches(self, stat: os.stat_result) -> bool:
+        """Does this probe still describe the file?"""
+        return (self.size, self.mtime_ns) == (stat.st_size, stat.st_mtime_ns)
+
+    def resolution(self) -> Tuple[int, int]:
+        if not (self.width and self.height):
+            raise VideoResolutionLookupError(f"Failed to determine resolution of {self.fpath}")
+
+        return self.width, self.height
+
+    def encode_cost(self) -> float:
+        """Relative cost of encoding the video: the pixels decoded, duration * width * height"""
+        return (self.duration or 0) * (self.width or 0) * (self.height or 0)
+
+    def creation_time_ms(self) -> Optional[int]:
+        """The container `creation_time` tag as millisecond Unix time, or None"""
+        if not self.creation_time:
+            return None
+
+        try:
+            parsed = datetime.fromisoformat(self.creation_time)
+        except ValueError:
+            return None
+
+        return int(parsed.timestamp() * 1000)
+
+
 @dataclass
 class VideoModel(IModel):
     fpath: str
@@ -31,6 +133,7 @@ class VideoModel(IModel):
     video_url_1080p: str
     video_url_720p: str
     video_url_480p: str
+    video_url_hls: str
     poster_url: str
 
     @classmethod
@@ -44,6 +147,7 @@ class VideoModel(IModel):
             video_url_1080p,
             video_url_720p,
             video_url_480p,
+            video_url_hls,
             poster_url,
         ) = row
 
@@ -56,6 +160,7 @@ class VideoModel(IModel):
             video_url_1080p=video_url_1080p,
             video_url_720p=video_url_720p,
             video_url_480p=video_url_480p,
+            video_url_hls=video_url_hls,
             poster_url=poster_url,
         )
 
@@ -1,6 +1,13 @@
 """Interact with the CDN that hosts photos and videos"""
 
+import contextlib
+import os
+import time
+from collections.abc import Generator, Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
 from functools import cache
+from http import HTTPStatus
+from typing import BinaryIO
 
 import boto3  # type: ignore
 import boto3.session  # type: ignore
@@ -13,10 +20,57 @@ from mirror.commons.config import (
     SPACES_ENDPOINT_URL,
     SPACES_REGION,
     SPACES_SECRET_KEY,
+    UPLOAD_CIRCUIT_FAILURES,
+    UPLOAD_CIRCUIT_RESET,
+    VIDEO_UPLOAD_PART_CONCURRENCY,
+    VIDEO_UPLOAD_PART_SIZE,
 )
-from mirror.commons.constants import VIDEO_CONTENT_TYPE
+from mirror.commons.constants import HLS_CONTENT_TYPES, VIDEO_CONTENT_TYPE, VIDEO_HLS_PLAYLIST
+from mirror.commons.exceptions import CdnUnavailableError
 from mirror.commons.utils import deterministic_hash_str
 from mirror.models.photo import PhotoContent
+from mirror.models.upload import CdnObject, MultipartUpload, PartReport
+from mirror.services.circuit_breaker import CircuitBreaker
+from mirror.services.database.uploads import MultipartUploadsTable
+
+# Headers for every public, immutable video object
+VIDEO_OBJECT_ARGS = {
+    "ContentDisposition": "inline",
+    "CacheControl": "public, max-age=31536000, immutable",
+    "ContentType": VIDEO_CONTENT_TYPE,
+    "ACL": "public-read",
+}
+
+
+# botocore's own default; enough for the video part uploads a client is shared between
+DEFAULT_POOL_CONNECTIONS = 10
+
+# Errors an upload can fail with; `is_transient_error` tells which are worth retrying
+UPLOAD_ERRORS = (
+    CdnUnavailableError,
+    botocore.exceptions.BotoCoreError,
+    botocore.exceptions.ClientError,
+)
+
+
+def is_transient_error(err: BaseException) -> bool:
+    """Could retrying get past the error? True of network failures, of an open circuit,
+    and of the CDN's own server errors and throttling."""
+    if isinstance(err, (CdnUnavailableError, botocore.exceptions.HTTPClientError)):
+        return True
+    if isinstance(err, botocore.exceptions.ClientError):
+        status = err.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+        return status >= HTTPStatus.INTERNAL_SERVER_ERROR or status == HTTPStatus.TOO_MANY_REQUESTS
+
+    return isinstance(err, botocore.exceptions.ConnectionError)
+
+
+def collect_parts(futures: Iterable[Future], etags: dict[int, str]) -> Iterator[PartReport]:
+    """Record the ETag of each sent part, yielding its report."""
+    for future in futures:
+        report, etag = future.result()
+        etags[report.part_number] = etag
+        yield report
 
 
 class CDN:
@@ -24,10 +78,17 @@ class CDN:
 
     storage_session: boto3.session.Session
     storage_client: boto3.client
-
-    def __init__(self, session: boto3.session.Session = None, client: boto3.client = None):
+    circuit: CircuitBreaker
+
+    def __init__(
+        self,
+        session: boto3.session.Session = None,
+        client: boto3.client = None,
+        circuit: CircuitBreaker = None,
+    ):
         self.storage_session = session if session else shared_session()
         self.storage_client = client if client else shared_client()
+        self.circuit = circuit if circuit else upload_circuit()
 
     @classmethod
     def session(cls) -> boto3.Session:
@@ -40,14 +101,18 @@ class CDN:
         )
 
     @classmethod
-    def client(cls, session: boto3.session.Session) -> boto3.client:
-        """Create a boto3 client for S$-compatible CDNs"""
+    def client(
+        cls, session: boto3.session.Session, max_pool_connections: int = DEFAULT_POOL_CONNECTIONS
+    ) -> boto3.client:
+        """Create a boto3 client for S$-compatible CDNs, keeping up to `max_pool_connections`
+        connections open for concurrent requests"""
 
         return session.client(
             "s3",
             config=botocore.config.Config(
                 s3={"addressing_style": "virtual"},
                 tcp_keepalive=True,
+                max_pool_connections=max_pool_connections,
             ),
             region_name=SPACES_REGION,
             endpoint_url=SPACES_ENDPOINT_URL,
@@ -56,9 +121,11 @@ class CDN:
         )
 
     def upload(self, key: str, content: bytes, mime_type: str = "image/webp") -> str:
-        """Upload a file publically to an S3-compatible CDN"""
+        """Upload a file publically to an S3-compatible CDN. Raises CdnUnavailableError,
+        without trying, while recent uploads have failed; see `upload_circuit`"""
 
-        self.storage_client.put_object(
+        self.circuit.call(
+            self.storage_client.put_object,
             Body=content,
             Bucket=SPACES_BUCKET,
             Key=key,
@@ -86,6 +153,14 @@ class CDN:
             else:
                 raise
 
+    def list_objects(self) -> Iterator[CdnObject]:
+        """Every object in the bucket, a page of up to a thousand keys per request"""
+
+        paginator = self.storage_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=SPACES_BUCKET):
+            for obj in page.get("Contents", []):
+                yield CdnObject(key=obj["Key"], size=obj["Size"], etag=obj["ETag"].strip('"'))
+
     def upload_photo(self, encoded_data: PhotoContent, role: str, format: str = "webp") -> str:
         """Upload an image to the CDN bucket. Return a CDN link.
 
@@ -100,28 +175,207 @@ class CDN:
         return self.url(name)
 
     # NOTE: this is an extreme bottleneck, and is more often than not used on a bad WiFi connection
-    # on my half-defective laptop wifi
-    def upload_file_public(self, name: str, encoded_path: str) -> str:
-        """Upload a file to the CDN"""
+    # on my half-defective laptop wifi. Uploads are multipart and resumable for that reason
+    def upload_file_public(
+        self, name: str, encoded_path: str, uploads: MultipartUploadsTable
+    ) -> Generator[PartReport, None, str]:
+        """Upload a file to the CDN in parts, yielding a report as each part completes.
+
+        Completed parts are recorded in `uploads`, so after a dropped connection the next
+        attempt sends only the parts that are missing. Callers check the CDN inventory for
+        the object first. Returns the CDN link."""
 
         if not encoded_path.startswith("/tmp"):
             raise ValueError(f"Refusing to upload unencoded content {name}")
 
-        if not self.has_object(name):
-            self.storage_client.upload_file(
-                Filename=encoded_path,
+        upload = self.resume_or_start_upload(name, encoded_path, uploads)
+        completed = uploads.list_parts(name)
+        pending = [num for num in range(1, upload.part_count() + 1) if num not in completed]
+
+        yield from self.upload_parts(upload, pending, uploads)
+
+        parts = sorted(uploads.list_parts(name).items())
+        self.storage_client.complete_multipart_upload(
+            Bucket=SPACES_BUCKET,
+            Key=name,
+            UploadId=upload.upload_id,
+            MultipartUpload={"Parts": [{"PartNumber": num, "ETag": etag} for num, etag in parts]},
+        )
+        uploads.delete(name)
+
+        return self.url(name)
+
+    def is_upload_live(self, upload: MultipartUpload) -> bool:
+        """Has the CDN kept this multipart upload? Buckets expire abandoned uploads."""
+        try:
+            self.storage_client.list_parts(
+                Bucket=SPACES_BUCKET, Key=upload.key, UploadId=upload.upload_id, MaxParts=1
+            )
+            return True
+        except self.storage_client.exceptions.ClientError as err:
+            if err.response["Error"]["Code"] == "NoSuchUpload":
+                return False
+            raise
+
+    def resume_or_start_upload(
+        self, name: str, encoded_path: str, uploads: MultipartUploadsTable
+    ) -> MultipartUpload:
+        """Continue the recorded upload when the file and part size are unchanged and the
+        CDN still holds it; otherwise abort it and start a new one."""
+        stat = os.stat(encoded_path)
+        existing = uploads.get(name)
+
+        unchanged = existing and existing.resumes(
+            stat.st_size, stat.st_mtime_ns, VIDEO_UPLOAD_PART_SIZE
+        )
+        if unchanged and self.is_upload_live(existing):
+            return existing
+
+        if existing:
+            with contextlib.suppress(self.storage_client.exceptions.ClientError):
+                self.storage_client.abort_multipart_upload(
+                    Bucket=SPACES_BUCKET, Key=name, UploadId=existing.upload_id
+                )
+
+        response = self.storage_client.create_multipart_upload(
+            Bucket=SPACES_BUCKET, Key=name, **VIDEO_OBJECT_ARGS
+        )
+        upload = MultipartUpload(
+            key=name,
+            upload_id=response["UploadId"],
+            fpath=encoded_path,
+            size=stat.st_size,
+            mtime_ns=stat.st_mtime_ns,
+            part_size=VIDEO_UPLOAD_PART_SIZE,
+        )
+        uploads.start(upload)
+
+        return upload
+
+    def upload_parts(
+        self, upload: MultipartUpload, part_numbers: list[int], uploads: MultipartUploadsTable
+    ) -> Generator[PartReport]:
+        """Send parts concurrently, recording each part's ETag as it completes."""
+        with ThreadPoolExecutor(max_workers=VIDEO_UPLOAD_PART_CONCURRENCY) as pool:
+            futures = [pool.submit(self.upload_part, upload, num) for num in part_numbers]
+
+            for future in as_completed(futures):
+                report, etag = future.result()
+                uploads.add_part(upload.key, report.part_number, etag)
+                yield report
+
+    def upload_part(self, upload: MultipartUpload, part_number: int) -> tuple[PartReport, str]:
+        """Read and send one part of the file; return its report and ETag."""
+        with open(upload.fpath, "rb") as source:
+            source.seek((part_number - 1) * upload.part_size)
+            body = source.read(upload.part_size)
+
+        return self.send_part(upload.key, upload.upload_id, part_number, body)
+
+    def send_part(
+        self, key: str, upload_id: str, part_number: int, body: bytes
+    ) -> tuple[PartReport, str]:
+        """Send one part of a multipart upload; return its report and ETag."""
+        started = time.monotonic()
+        response = self.storage_client.upload_part(
+            Bucket=SPACES_BUCKET,
+            Key=key,
+            PartNumber=part_number,
+            UploadId=upload_id,
+            Body=body,
+        )
+        report = PartReport(key, part_number, len(body), time.monotonic() - started)
+
+        return report, response["ETag"]
+
+    def upload_stream_public(self, name: str, stream: BinaryIO) -> Generator[PartReport, None, str]:
+        """Upload a stream of unknown length to the CDN in parts as they fill, yielding a
+        report as each part completes. At most VIDEO_UPLOAD_PART_CONCURRENCY parts are in
+        flight, bounding memory. A failed stream or upload aborts the whole upload, which
+        cannot resume. Returns the CDN link."""
+        upload_id = self.storage_client.create_multipart_upload(
+            Bucket=SPACES_BUCKET, Key=name, **VIDEO_OBJECT_ARGS
+        )["UploadId"]
+
+        try:
+            etags = yield from self.upload_stream_parts(name, upload_id, stream)
+            self.storage_client.complete_multipart_upload(
                 Bucket=SPACES_BUCKET,
                 Key=name,
-                ExtraArgs={
-                    "ContentDisposition": "inline",
-                    "CacheControl": "public, max-age=31536000, immutable",
-                    "ContentType": VIDEO_CONTENT_TYPE,
-                    "ACL": "public-read",
+                UploadId=upload_id,
+                MultipartUpload={
+                    "Parts": [{"PartNumber": num, "ETag": etags[num]} for num in sorted(etags)]
                 },
             )
+        except BaseException:
+            self.storage_client.abort_multipart_upload(
+                Bucket=SPACES_BUCKET, Key=name, UploadId=upload_id
+            )
+            raise
 
         return self.url(name)
 
+    def upload_stream_parts(
+        self, name: str, upload_id: str, stream: BinaryIO
+    ) -> Generator[PartReport, None, dict[int, str]]:
+        """Read the stream a part at a time, sending each while the next fills. Returns the
+        ETag of each part."""
+        etags: dict[int, str] = {}
+        chunks = iter(lambda: stream.read(VIDEO_UPLOAD_PART_SIZE), b"")
+
+        with ThreadPoolExecutor(max_workers=VIDEO_UPLOAD_PART_CONCURRENCY) as pool:
+            in_flight = set()
+            for part_number, body in enumerate(chunks, start=1):
+                if len(in_flight) >= VIDEO_UPLOAD_PART_CONCURRENCY:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    yield from collect_parts(done, etags)
+                in_flight.add(pool.submit(self.send_part, name, upload_id, part_number, body))
+
+            yield from collect_parts(wait(in_flight).done, etags)
+
+        return etags
+
+    def upload_directory_public(self, prefix: str, dpath: str) -> Iterator[str]:
+        """Upload a segmented video directory under one prefix, yielding each key as it is
+        sent. The master playlist goes last: once it is in the bucket, so is everything it
+        lists, so its presence marks a complete upload."""
+        files = sorted(
+            os.path.relpath(os.path.join(root, fname), dpath)
+            for root, _, fnames in os.walk(dpath)
+            for fname in fnames
+        )
+        segments = [fname for fname in files if fname != VIDEO_HLS_PLAYLIST]
+
+        with ThreadPoolExecutor(max_workers=VIDEO_UPLOAD_PART_CONCURRENCY) as pool:
+            futures = [
+                pool.submit(self.upload_segment_file, f"{prefix}/{fname}", f"{dpath}/{fname}")
+                for fname in segments
+            ]
+            for future in as_completed(futures):
+                yield future.result()
+
+        yield self.upload_segment_file(
+            f"{prefix}/{VIDEO_HLS_PLAYLIST}", f"{dpath}/{VIDEO_HLS_PLAYLIST}"
+        )
+
+    def upload_segment_file(self, key: str, fpath: str) -> str:
+        """Upload one playlist or segment file, typed by its extension; return its key."""
+        _, extension = os.path.splitext(fpath)
+        with open(fpath, "rb") as source:
+            self.upload(key, source.read(), mime_type=HLS_CONTENT_TYPES[extension])
+
+        return key
+
+    @classmethod
+    def hls_prefix(cls, fpath: str, variants: list[dict]) -> str:
+        """Return the bucket prefix of the video's adaptive-streaming files. Like video_name,
+        it's a deterministic function of the video and its variants' parameters"""
+
+        encodings = "".join(
+            f"{params['bitrate']}{params['width']}{params['height']}" for params in variants
+        )
+        return deterministic_hash_str(f"{fpath}hls{encodings}")
+
     @classmethod
     def video_name(cls, fpath: str, params: dict, format: str = "mp4") -> str:
         """Return the name of the video in the CDN bucket. It's a deterministic function of
@@ -143,3 +397,11 @@ def shared_client() -> boto3.client:
     """One S3 client per process. Reuse keeps the TLS connection alive between uploads."""
 
     return CDN.client(shared_session())
+
+
+@cache
+def upload_circuit() -> CircuitBreaker:
+    """One circuit per process around CDN uploads, so every upload job sees the network
+    drop once a few have failed, rather than each timing out on its own."""
+
+    return CircuitBreaker(UPLOAD_CIRCUIT_FAILURES, UPLOAD_CIRCUIT_RESET, is_transient_error)
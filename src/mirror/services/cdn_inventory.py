@@ -0,0 +1,73 @@
+"""Cached listing of the CDN bucket, so existence checks need no HEAD request per object"""
+
+import time
+from typing import Optional
+
+from mirror.commons.config import CDN_INVENTORY_TTL
+from mirror.models.upload import CdnObject, CdnReconciliation
+from mirror.services.cdn import CDN
+from mirror.services.database import SqliteDatabase
+from mirror.services.database.uploads import CdnObjectsTable
+
+
+class CdnInventory:
+    """The bucket's objects, listed in full at most once per `ttl` seconds and stored in the
+    database, so every job answers existence checks from the same listing.
+
+    Objects uploaded since the listing are added as they complete. Objects removed from the
+    bucket by hand stay listed until the next listing."""
+
+    cdn: CDN
+    table: CdnObjectsTable
+    ttl: int
+    _keys: Optional[set[str]]
+
+    def __init__(self, cdn: CDN, table: CdnObjectsTable, ttl: int = CDN_INVENTORY_TTL) -> None:
+        self.cdn = cdn
+        self.table = table
+        self.ttl = ttl
+        self._keys = None
+
+    def is_stale(self) -> bool:
+        listed_at = self.table.listed_at()
+        return listed_at is None or time.time() - listed_at > self.ttl
+
+    def refresh(self, force: bool = False) -> bool:
+        """List the bucket if the stored listing has expired; return whether it was listed."""
+        if not force and not self.is_stale():
+            return False
+
+        self.table.replace_all(self.cdn.list_objects(), int(time.time()))
+        self._keys = None
+
+        return True
+
+    def has(self, key: str) -> bool:
+        """Is the object in the bucket, as of the last listing or our own upload?"""
+        self.refresh()
+
+        if self._keys is None:
+            self._keys = self.table.keys()
+
+        return key in self._keys
+
+    def add(self, obj: CdnObject) -> None:
+        """Record an object we uploaded, without waiting for the next listing."""
+        self.table.add(obj)
+
+        if self._keys is not None:
+            self._keys.add(obj.key)
+
+    def reconcile(self, db: SqliteDatabase) -> CdnReconciliation:
+        """Compare the listing with the encoded media rows, from the stored listing alone."""
+        self.refresh()
+
+        # the joins read both encoded tables, so make sure they exist
+        db.encoded_photos_table()
+        db.encoded_videos_table()
+        url_prefix = CDN.url("")
+
+        return CdnReconciliation(
+            orphaned_keys=self.table.list_orphaned(url_prefix),
+            missing_objects=self.table.list_missing(url_prefix),
+        )
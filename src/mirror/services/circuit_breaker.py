@@ -0,0 +1,73 @@
+"""Stop calling a service that keeps failing, and wait for it to come back"""
+
+import threading
+import time
+from collections.abc import Callable
+from typing import Any
+
+from mirror.commons.exceptions import CdnUnavailableError
+
+
+class CircuitBreaker:
+    """Fails calls fast while a service is down, rather than let each one time out.
+
+    Closed, calls pass through. After `threshold` consecutive failures the circuit opens
+    and calls raise CdnUnavailableError without being made. Once `reset_seconds` pass it is
+    half-open: a single trial call is let through, whose success closes the circuit and
+    whose failure opens it again. Only errors `is_failure` accepts are counted; any other
+    error means the service answered."""
+
+    threshold: int
+    reset_seconds: float
+
+    def __init__(
+        self, threshold: int, reset_seconds: float, is_failure: Callable[[BaseException], bool]
+    ) -> None:
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.is_failure = is_failure
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    def retry_after(self) -> float:
+        """Seconds until the circuit next lets a call through; 0 unless it is open"""
+        with self.lock:
+            if self.opened_at is None:
+                return 0.0
+            return max(0.0, self.opened_at + self.reset_seconds - time.monotonic())
+
+    def admit(self) -> None:
+        """Let a call through, or raise if the circuit is open or already on trial"""
+        with self.lock:
+            if self.opened_at is None:
+                return
+            if self.trial_running or time.monotonic() < self.opened_at + self.reset_seconds:
+                raise CdnUnavailableError(
+                    f"circuit open after {self.failures} consecutive failures"
+                )
+            self.trial_running = True
+
+    def record(self, failed: bool) -> None:
+        with self.lock:
+            self.trial_running = False
+            if not failed:
+                self.failures, self.opened_at = 0, None
+                return
+
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+    def call(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Call `fn` through the circuit"""
+        self.admit()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as err:
+            self.record(self.is_failure(err))
+            raise
+
+        self.record(False)
+        return result
@@ -3,6 +3,7 @@
 import sqlite3
 
 from mirror.services.database.albums import AlbumContentsView, AlbumDataView, MediaMetadataTable
+from mirror.services.database.files import FileStateTable
 from mirror.services.database.knowledge import (
     BinomialsWikidataIdTable,
     GeonameTable,
@@ -13,19 +14,29 @@ from mirror.services.database.photos import (
     EncodedPhotosTable,
     ExifTable,
     PhashesTable,
+    PhotoAnalysisTable,
     PhotoDataView,
     PhotoIconTable,
     PhotoMetadataSummaryView,
     PhotoMetadataTable,
     PhotoMetadataView,
     PhotosTable,
+    RenditionQualitiesTable,
     SubjectDetectionsTable,
+    UnfilledRenditionsTable,
+)
+from mirror.services.database.uploads import (
+    CdnObjectsTable,
+    MultipartUploadsTable,
+    UploadOutboxTable,
+    UploadRunsTable,
 )
 from mirror.services.database.videos import (
     EncodedVideosTable,
     VideoDataTable,
     VideoMetadataSummaryView,
     VideoMetadataTable,
+    VideoProbeTable,
     VideosTable,
 )
 from mirror.services.database.views import refresh_dependent_views as rebuild_dependent_views
@@ -74,6 +85,9 @@ class SqliteDatabase:  # noqa: PLR0904
     def photo_icon_table(self):
         return PhotoIconTable(self.conn)
 
+    def photo_analysis_table(self):
+        return PhotoAnalysisTable(self.conn)
+
     def photos_table(self):
         return PhotosTable(self.conn)
 
@@ -89,12 +103,36 @@ class SqliteDatabase:  # noqa: PLR0904
     def videos_table(self):
         return VideosTable(self.conn)
 
+    def video_probe_table(self):
+        return VideoProbeTable(self.conn)
+
     def exif_table(self):
         return ExifTable(self.conn)
 
+    def file_state_table(self):
+        return FileStateTable(self.conn)
+
+    def multipart_uploads_table(self):
+        return MultipartUploadsTable(self.conn)
+
+    def upload_outbox_table(self):
+        return UploadOutboxTable(self.conn)
+
+    def upload_runs_table(self):
+        return UploadRunsTable(self.conn)
+
+    def cdn_objects_table(self):
+        return CdnObjectsTable(self.conn)
+
     def encoded_photos_table(self):
         return EncodedPhotosTable(self.conn)
 
+    def rendition_qualities_table(self):
+        return RenditionQualitiesTable(self.conn)
+
+    def unfilled_renditions_table(self):
+        return UnfilledRenditionsTable(self.conn)
+
     def encoded_videos_table(self):
         return EncodedVideosTable(self.conn)
 
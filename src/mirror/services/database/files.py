@@ -0,0 +1,33 @@
+"""Vault file-state table, used to skip unchanged files between scans."""
+
+import sqlite3
+from typing import Iterable
+
+from mirror.commons.tables import FILE_STATE_TABLE
+from mirror.models.manifest import ManifestEntry
+
+
+class FileStateTable:
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.conn = conn
+        self.conn.execute(FILE_STATE_TABLE)
+
+    def snapshot(self) -> dict[str, ManifestEntry]:
+        """Every recorded file and directory, keyed by path."""
+        query = "select fpath, size, mtime_ns, inode, kind from file_state"
+        return {row[0]: ManifestEntry.from_row(row) for row in self.conn.execute(query)}
+
+    def replace_all(self, entries: Iterable[ManifestEntry]) -> None:
+        """Replace the recorded state with this scan's listing, in one transaction."""
+        rows = [
+            (entry.fpath, entry.size, entry.mtime_ns, entry.inode, entry.kind) for entry in entries
+        ]
+
+        with self.conn as conn:
+            conn.execute("begin immediate;")
+            conn.execute("delete from file_state")
+            conn.executemany(
+                "insert or replace into file_state (fpath, size, mtime_ns, inode, kind)"
+                " values (?, ?, ?, ?, ?)",
+                rows,
+            )
@@ -4,8 +4,9 @@ import json
 import os
 import sqlite3
 import string
-from typing import Iterator, List, Optional
+from typing import Iterable, Iterator, List, Optional
 
+from mirror.commons.constants import IMAGE_ENCODINGS, THUMBHASH_ROLES
 from mirror.commons.tables import (
     ENCODED_PHOTOS_TABLE,
     EXIF_TABLE,
@@ -16,16 +17,21 @@ from mirror.commons.tables import (
     PHOTO_METADATA_TABLE,
     PHOTO_METADATA_VIEW,
     PHOTOS_TABLE,
+    RENDITION_QUALITIES_TABLE,
     SUBJECT_DETECTIONS_TABLE,
+    UNFILLED_RENDITIONS_TABLE,
 )
+from mirror.commons.utils import encoding_fingerprint
 from mirror.models.detection import DetectionScan, box_volume
 from mirror.models.exif import PhotoExifData
 from mirror.models.phash import PhashData
 from mirror.models.photo import (
     EncodedPhotoModel,
+    PhotoAnalysis,
     PhotoMetadataModel,
     PhotoMetadataSummaryModel,
     PhotoModel,
+    RenditionQuality,
 )
 
 
@@ -65,18 +71,18 @@ class PhotosTable:
         self.conn.execute(PHOTOS_TABLE)
 
     def add(self, fpath: str) -> None:
-        dpath = os.path.dirname(fpath)
+        self.add_many([fpath])
+
+    def add_many(self, fpaths: Iterable[str]) -> None:
+        """Index photos in one transaction. Existing rows are left in place: replacing them
+        would cascade-delete their EXIF rows."""
+        rows = [(fpath, os.path.dirname(fpath)) for fpath in fpaths]
+        if not rows:
+            return
 
         with self.conn as conn:
             conn.execute("begin immediate;")
-            conn.execute(
-                """
-            insert or replace into photos (fpath, dpath)
-                values (?, ?)
-            """,
-                (fpath, dpath),
-            )
-            conn.commit()
+            conn.executemany("insert or ignore into photos (fpath, dpath) values (?, ?)", rows)
 
     def delete(self, fpath: str) -> None:
         self.conn.execute("begin immediate;")
@@ -87,6 +93,11 @@ class PhotosTable:
         for row in self.conn.execute("select fpath from photos"):
             yield row[0]
 
+    def list_without_phash(self) -> set[str]:
+        """Photos that an earlier scan indexed but never hashed."""
+        query = "select fpath from photos where fpath not in (select fpath from phashes)"
+        return {row[0] for row in self.conn.execute(query)}
+
 
 class PhotoDataView:
     def __init__(self, conn: sqlite3.Connection) -> None:
@@ -121,15 +132,14 @@ class PhashesTable:
 
         return None
 
-    def add_many(self, phashes: Iterator[PhashData]) -> None:
+    def add_many(self, phashes: Iterable[PhashData]) -> None:
         rows = [(phash["fpath"], phash.get("phash")) for phash in phashes]
         if not rows:
             return
-        self.conn.executemany(
-            "insert or ignore into phashes (fpath, phash) values (?, ?)",
-            rows,
-        )
-        self.conn.commit()
+
+        with self.conn as conn:
+            conn.execute("begin immediate;")
+            conn.executemany("insert or ignore into phashes (fpath, phash) values (?, ?)", rows)
 
     def has(self, fpath: str) -> bool:
         return bool(self.conn.execute("select 1 from phashes where fpath = ?", (fpath,)).fetchone())
@@ -138,6 +148,10 @@ class PhashesTable:
         self.conn.execute("delete from phashes where fpath = ?", (fpath,))
         self.conn.commit()
 
+    def delete_many(self, fpaths: Iterable[str]) -> None:
+        self.conn.executemany("delete from phashes where fpath = ?", [(fpath,) for fpath in fpaths])
+        self.conn.commit()
+
 
 class ExifTable:
     def __init__(self, conn: sqlite3.Connection) -> None:
@@ -148,10 +162,11 @@ class ExifTable:
         return bool(self.conn.execute("select 1 from exif where fpath = ?", (fpath,)).fetchone())
 
     def add(self, exif: PhotoExifData) -> None:
-        self.conn.execute(
-            "insert or ignore into exif"
-            " (fpath, created_at, f_stop, focal_length, model, exposure_time, iso, width, height)"
-            " values (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        self.add_many([exif])
+
+    def add_many(self, exifs: Iterable[PhotoExifData]) -> None:
+        """Store EXIF rows in one transaction, keeping any row already stored"""
+        rows = [
             (
                 exif.fpath,
                 exif.created_at,
@@ -162,13 +177,20 @@ class ExifTable:
                 exif.iso,
                 exif.width,
                 exif.height,
-            ),
-        )
-        self.conn.commit()
+            )
+            for exif in exifs
+        ]
+        if not rows:
+            return
 
-    def add_many(self, exifs: Iterator[PhotoExifData]) -> None:
-        for exif in exifs:
-            self.add(exif)
+        with self.conn as conn:
+            conn.execute("begin immediate;")
+            conn.executemany(
+                "insert or ignore into exif"
+                " (fpath, created_at, f_stop, focal_length, model, exposure_time, iso, width,"
+                " height) values (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
 
     def list(self):
         for row in self.conn.execute("select * from exif"):
@@ -178,11 +200,43 @@ class ExifTable:
         self.conn.execute("delete from exif where fpath = ?", (fpath,))
         self.conn.commit()
 
+    def delete_many(self, fpaths: Iterable[str]) -> None:
+        self.conn.executemany("delete from exif where fpath = ?", [(fpath,) for fpath in fpaths])
+        self.conn.commit()
+
 
 class EncodedPhotosTable:
     def __init__(self, conn: sqlite3.Connection) -> None:
         self.conn = conn
         self.conn.execute(ENCODED_PHOTOS_TABLE)
+        self.migrate_params_hash_column()
+
+    def migrate_params_hash_column(self) -> None:
+        """Add the params_hash column to tables created before it existed.
+
+        Existing renditions are assumed to match the current parameters, so adding the
+        column does not mark every photo stale at once."""
+        columns = [row[1] for row in self.conn.execute("pragma table_info(encoded_photos)")]
+        if "params_hash" in columns:
+            return
+
+        self.conn.execute("alter table encoded_photos add column params_hash text")
+        self.conn.executemany(
+            "update encoded_photos set params_hash = ? where role = ?",
+            [(encoding_fingerprint(params), role) for role, params in IMAGE_ENCODINGS.items()],
+        )
+        self.conn.commit()
+
+    def add_rendition(self, fpath: str, url: str, role: str, params: dict) -> None:
+        """Record an uploaded IMAGE_ENCODINGS rendition with its parameter fingerprint."""
+        with self.conn as conn:
+            conn.execute(
+                """
+                insert or replace into encoded_photos (fpath, mimetype, role, url, params_hash)
+                values (?, ?, ?, ?, ?)
+                """,
+                (fpath, f"image/{params['format']}", role, url, encoding_fingerprint(params)),
+            )
 
     def add(self, fpath: str, url: str, role: str, format: str) -> None:
         mimetype = f"image/{format}"
@@ -205,14 +259,14 @@ class EncodedPhotosTable:
 
     def list_for_file(self, fpath: str) -> Iterator[EncodedPhotoModel]:
         for row in self.conn.execute(
-            "select fpath, mimetype, role, url from encoded_photos where fpath = ?",
+            "select fpath, mimetype, role, url, params_hash from encoded_photos where fpath = ?",
             (fpath,),
         ):
             yield EncodedPhotoModel.from_row(row)
 
     def list_by_role(self, role: str) -> Iterator[EncodedPhotoModel]:
         for row in self.conn.execute(
-            "select fpath, mimetype, role, url from encoded_photos where role = ?",
+            "select fpath, mimetype, role, url, params_hash from encoded_photos where role = ?",
             (role,),
         ):
             yield EncodedPhotoModel.from_row(row)
@@ -221,6 +275,99 @@ class EncodedPhotosTable:
         self.conn.execute("delete from encoded_photos where fpath = ?", (fpath,))
         self.conn.commit()
 
+    def mark_stale(self, fpaths: Iterable[str]) -> None:
+        """Mark the renditions of rewritten sources stale, so they are encoded again, and
+        drop their thumbhashes, so they are recomputed."""
+        rows = [(fpath,) for fpath in fpaths]
+        placeholders = ", ".join("?" * len(THUMBHASH_ROLES))
+
+        with self.conn as conn:
+            conn.executemany(
+                "update encoded_photos set params_hash = null"
+                " where fpath = ? and params_hash is not null",
+                rows,
+            )
+            conn.executemany(
+                f"delete from encoded_photos where fpath = ? and role in ({placeholders})",
+                [(fpath, *THUMBHASH_ROLES) for (fpath,) in rows],
+            )
+
+
+class RenditionQualitiesTable:
+    """Qualities chosen for quality-targeted renditions"""
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.conn = conn
+        self.conn.execute(RENDITION_QUALITIES_TABLE)
+
+    def list_for_file(self, fpath: str) -> Iterator[RenditionQuality]:
+        for row in self.conn.execute(
+            "select fpath, role, source_hash, params_hash, quality"
+            " from rendition_qualities where fpath = ?",
+            (fpath,),
+        ):
+            yield RenditionQuality.from_row(row)
+
+    def add_many(self, qualities: Iterable[RenditionQuality]) -> None:
+        rows = [
+            (item.fpath, item.role, item.source_hash, item.params_hash, item.quality)
+            for item in qualities
+        ]
+        with self.conn as conn:
+            conn.executemany(
+                "insert or replace into rendition_qualities"
+                " (fpath, role, source_hash, params_hash, quality) values (?, ?, ?, ?, ?)",
+                rows,
+            )
+
+
+class UnfilledRenditionsTable:
+    """Responsive rungs each photo is too small to fill"""
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.conn = conn
+        self.conn.execute(UNFILLED_RENDITIONS_TABLE)
+
+    def roles_for(self, fpath: str) -> set[str]:
+        rows = self.conn.execute("select role from unfilled_renditions where fpath = ?", (fpath,))
+        return {role for (role,) in rows}
+
+    def add_many(self, fpath: str, roles: Iterable[str]) -> None:
+        with self.conn as conn:
+            conn.executemany(
+                "insert or ignore into unfilled_renditions (fpath, role) values (?, ?)",
+                [(fpath, role) for role in roles],
+            )
+
+    def delete_many(self, fpaths: Iterable[str]) -> None:
+        self.conn.executemany(
+            "delete from unfilled_renditions where fpath = ?", [(fpath,) for fpath in fpaths]
+        )
+        self.conn.commit()
+
+
+class PhotoAnalysisTable:
+    """Writes a photo's analytics to the tables that hold them"""
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.conn = conn
+        PhotoIconTable(conn)
+        EncodedPhotosTable(conn)
+
+    def add(self, analysis: PhotoAnalysis) -> None:
+        """Store the grey and the thumbhash placeholders in one transaction"""
+        with self.conn as conn:
+            conn.execute("begin immediate;")
+            conn.execute(
+                "insert or replace into photo_icons (fpath, grey_value) values (?, ?)",
+                (analysis.fpath, analysis.grey_value),
+            )
+            conn.executemany(
+                "insert or replace into encoded_photos (fpath, mimetype, role, url)"
+                " values (?, 'image/thumbhash', ?, ?)",
+                [(analysis.fpath, role, analysis.thumbhash) for role in THUMBHASH_ROLES],
+            )
+
 
 class PhotoMetadataView:
     def __init__(self, conn: sqlite3.Connection) -> None:
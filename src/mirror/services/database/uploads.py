@@ -0,0 +1,231 @@
+"""CDN upload state: multipart upload progress, the upload outbox, and the cached bucket
+inventory."""
+
+import json
+import sqlite3
+from typing import Iterable, Iterator, List, Optional
+
+from mirror.commons.tables import (
+    CDN_LISTINGS_TABLE,
+    CDN_OBJECTS_TABLE,
+    MULTIPART_PARTS_TABLE,
+    MULTIPART_UPLOADS_TABLE,
+    UPLOAD_OUTBOX_TABLE,
+    UPLOAD_RUNS_TABLE,
+)
+from mirror.models.upload import CdnObject, MultipartUpload, OutboxTask
+
+# every encoded rendition that links to an object, as (fpath, role, url)
+PUBLISHED_URLS_QUERY = """
+select fpath, role, url from encoded_photos
+union all
+select fpath, role, url from encoded_videos
+"""
+
+
+class MultipartUploadsTable:
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.conn = conn
+        self.conn.execute(MULTIPART_UPLOADS_TABLE)
+        self.conn.execute(MULTIPART_PARTS_TABLE)
+
+    def get(self, key: str) -> Optional[MultipartUpload]:
+        query = (
+            "select key, upload_id, fpath, size, mtime_ns, part_size"
+            " from multipart_uploads where key = ?"
+        )
+        for row in self.conn.execute(query, (key,)):
+            return MultipartUpload.from_row(row)
+        return None
+
+    def start(self, upload: MultipartUpload) -> None:
+        """Record a new upload, replacing any earlier one for the key and its parts."""
+        with self.conn as conn:
+            conn.execute("delete from multipart_uploads where key = ?", (upload.key,))
+            conn.execute(
+                "insert into multipart_uploads"
+                " (key, upload_id, fpath, size, mtime_ns, part_size) values (?, ?, ?, ?, ?, ?)",
+                (
+                    upload.key,
+                    upload.upload_id,
+                    upload.fpath,
+                    upload.size,
+                    upload.mtime_ns,
+                    upload.part_size,
+                ),
+            )
+
+    def add_part(self, key: str, part_number: int, etag: str) -> None:
+        with self.conn as conn:
+            conn.execute(
+                "insert or replace into multipart_parts (key, part_number, etag) values (?, ?, ?)",
+                (key, part_number, etag),
+            )
+
+    def list_parts(self, key: str) -> dict[int, str]:
+        """ETags of the completed parts, by part number."""
+        query = "select part_number, etag from multipart_parts where key = ?"
+        return dict(self.conn.execute(query, (key,)).fetchall())
+
+    def delete(self, key: str) -> None:
+        with self.conn as conn:
+            conn.execute("delete from multipart_parts where key = ?", (key,))
+            conn.execute("delete from multipart_uploads where key = ?", (key,))
+
+
+OUTBOX_QUERY = (
+    "select fpath, role, source_hash, artifact_path, params, attempts, last_error,"
+    " next_attempt_at from upload_outbox"
+)
+
+
+class UploadOutboxTable:
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.conn = conn
+        self.conn.execute(UPLOAD_OUTBOX_TABLE)
+
+    def get(self, fpath: str, role: str) -> Optional[OutboxTask]:
+        for row in self.conn.execute(f"{OUTBOX_QUERY} where fpath = ? and role = ?", (fpath, role)):
+            return OutboxTask.from_row(row)
+        return None
+
+    def list_for_file(self, fpath: str) -> Iterator[OutboxTask]:
+        for row in self.conn.execute(f"{OUTBOX_QUERY} where fpath = ?", (fpath,)):
+            yield OutboxTask.from_row(row)
+
+    def list(self) -> Iterator[OutboxTask]:
+        for row in self.conn.execute(f"{OUTBOX_QUERY} order by next_attempt_at"):
+            yield OutboxTask.from_row(row)
+
+    def enqueue_many(self, tasks: Iterable[OutboxTask]) -> None:
+        """Queue encoded renditions in one transaction, replacing earlier tasks for the same
+        photo and role along with their attempt history."""
+        rows = [
+            (task.fpath, task.role, task.source_hash, task.artifact_path, json.dumps(task.params))
+            for task in tasks
+        ]
+        if not rows:
+            return
+
+        with self.conn as conn:
+            conn.execute("begin immediate;")
+            conn.executemany(
+                "insert or replace into upload_outbox"
+                " (fpath, role, source_hash, artifact_path, params) values (?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def record_failure(self, task: OutboxTask, error: str, next_attempt_at: float) -> OutboxTask:
+        """Count a failed upload attempt; return the task as now recorded."""
+        with self.conn as conn:
+            conn.execute(
+                "update upload_outbox set attempts = attempts + 1, last_error = ?,"
+                " next_attempt_at = ? where fpath = ? and role = ?",
+                (error, next_attempt_at, task.fpath, task.role),
+            )
+
+        return self.get(task.fpath, task.role) or task
+
+    def delete(self, fpath: str, role: str) -> None:
+        with self.conn as conn:
+            conn.execute("delete from upload_outbox where fpath = ? and role = ?", (fpath, role))
+
+
+class UploadRunsTable:
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.conn = conn
+        self.conn.execute(UPLOAD_RUNS_TABLE)
+
+    def start(self, run_id: str, photos: int) -> None:
+        with self.conn as conn:
+            conn.execute("insert into upload_runs (run_id, photos) values (?, ?)", (run_id, photos))
+
+    def photo_encoded(self, run_id: str) -> None:
+        """Count one more planned photo as having queued all its renditions."""
+        with self.conn as conn:
+            conn.execute(
+                "update upload_runs set photos_encoded = photos_encoded + 1 where run_id = ?",
+                (run_id,),
+            )
+
+    def is_encoded(self, run_id: str) -> bool:
+        """Has every photo planned for the run queued its renditions?"""
+        query = "select photos_encoded >= photos from upload_runs where run_id = ?"
+        for (encoded,) in self.conn.execute(query, (run_id,)):
+            return bool(encoded)
+        return True
+
+    def finish(self, run_id: str) -> None:
+        with self.conn as conn:
+            conn.execute("delete from upload_runs where run_id = ?", (run_id,))
+
+
+class CdnObjectsTable:
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.conn = conn
+        self.conn.execute(CDN_OBJECTS_TABLE)
+        self.conn.execute(CDN_LISTINGS_TABLE)
+
+    def listed_at(self) -> Optional[int]:
+        """Unix time of the last full listing, if the bucket has been listed."""
+        for (listed_at,) in self.conn.execute("select listed_at from cdn_listings"):
+            return listed_at
+        return None
+
+    def replace_all(self, objects: Iterable[CdnObject], listed_at: int) -> None:
+        """Replace the inventory with a full listing, in one transaction."""
+        rows = [(obj.key, obj.size, obj.etag) for obj in objects]
+
+        with self.conn as conn:
+            conn.execute("begin immediate;")
+            conn.execute("delete from cdn_objects")
+            conn.executemany("insert into cdn_objects (key, size, etag) values (?, ?, ?)", rows)
+            conn.execute(
+                "insert or replace into cdn_listings (id, listed_at) values (1, ?)", (listed_at,)
+            )
+
+    def add(self, obj: CdnObject) -> None:
+        with self.conn as conn:
+            conn.execute(
+                "insert or replace into cdn_objects (key, size, etag) values (?, ?, ?)",
+                (obj.key, obj.size, obj.etag),
+            )
+
+    def keys(self) -> set[str]:
+        return {key for (key,) in self.conn.execute("select key from cdn_objects")}
+
+    def list(self) -> Iterator[CdnObject]:
+        for row in self.conn.execute("select key, size, etag from cdn_objects"):
+            yield CdnObject.from_row(row)
+
+    def list_orphaned(self, url_prefix: str) -> List[str]:
+        """Bucket keys that no encoded rendition links to. Keys in the directory of a linked
+        playlist are the segments it lists, so are linked too."""
+        query = f"""
+        with published as (
+          select substr(url, length(:prefix) + 1) as key from ({PUBLISHED_URLS_QUERY})
+          where substr(url, 1, length(:prefix)) = :prefix
+        ),
+        directories as (
+          select substr(key, 1, instr(key, '/')) as dpath from published
+          where instr(key, '/') > 0
+        )
+        select key from cdn_objects
+        where key not in (select key from published)
+          and not exists (
+            select 1 from directories
+            where substr(cdn_objects.key, 1, length(dpath)) = dpath
+          )
+        order by key
+        """
+        return [key for (key,) in self.conn.execute(query, {"prefix": url_prefix})]
+
+    def list_missing(self, url_prefix: str) -> List[tuple[str, str]]:
+        """(fpath, role) of encoded renditions linking to a key the bucket does not have."""
+        query = f"""
+        select fpath, role from ({PUBLISHED_URLS_QUERY})
+        where substr(url, 1, length(:prefix)) = :prefix
+          and substr(url, length(:prefix) + 1) not in (select key from cdn_objects)
+        order by fpath, role
+        """
+        return self.conn.execute(query, {"prefix": url_prefix}).fetchall()
@@ -2,17 +2,24 @@
 
 import os
 import sqlite3
-from typing import Iterator, List
+from typing import Iterable, Iterator, List, Optional
 
+from mirror.commons.constants import HLS_PLAYLIST_CONTENT_TYPE
 from mirror.commons.tables import (
     ENCODED_VIDEO_TABLE,
     VIDEO_DATA_VIEW,
     VIDEO_METADATA_SUMMARY,
     VIDEO_METADATA_TABLE,
     VIDEO_METADATA_VIEW,
+    VIDEO_PROBE_TABLE,
     VIDEOS_TABLE,
 )
-from mirror.models.video import EncodedVideoModel, VideoMetadataSummaryModel, VideoModel
+from mirror.models.video import (
+    EncodedVideoModel,
+    VideoMetadataSummaryModel,
+    VideoModel,
+    VideoProbe,
+)
 
 
 class VideoDataTable:
@@ -31,10 +38,17 @@ class VideosTable:
         self.conn.execute(VIDEOS_TABLE)
 
     def add(self, fpath: str) -> None:
-        dpath = os.path.dirname(fpath)
-        query = "insert or ignore into videos (fpath, dpath) values (?, ?)"
-        self.conn.execute(query, (fpath, dpath))
-        self.conn.commit()
+        self.add_many([fpath])
+
+    def add_many(self, fpaths: Iterable[str]) -> None:
+        """Index videos in one transaction"""
+        rows = [(fpath, os.path.dirname(fpath)) for fpath in fpaths]
+        if not rows:
+            return
+
+        with self.conn as conn:
+            conn.execute("begin immediate;")
+            conn.executemany("insert or ignore into videos (fpath, dpath) values (?, ?)", rows)
 
     def delete(self, fpath: str) -> None:
         self.conn.execute("delete from videos where fpath = ?", (fpath,))
@@ -45,14 +59,84 @@ class VideosTable:
             yield row[0]
 
 
+VIDEO_PROBE_QUERY = (
+    "select fpath, size, mtime_ns, duration, width, height, video_codec, audio_codec,"
+    " bitrate, creation_time, pixel_format from video_probe"
+)
+
+
+class VideoProbeTable:
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.conn = conn
+        self.conn.execute(VIDEO_PROBE_TABLE)
+        self.migrate_pixel_format_column()
+
+    def migrate_pixel_format_column(self) -> None:
+        """Add the pixel_format column to tables created before it existed.
+
+        Recorded probes lack the pixel format, which decides whether a video can be remuxed,
+        so they are dropped and each video is probed once more."""
+        columns = [row[1] for row in self.conn.execute("pragma table_info(video_probe)")]
+        if "pixel_format" in columns:
+            return
+
+        self.conn.execute("alter table video_probe add column pixel_format text")
+        self.conn.execute("delete from video_probe")
+        self.conn.commit()
+
+    def get(self, fpath: str) -> Optional[VideoProbe]:
+        for row in self.conn.execute(f"{VIDEO_PROBE_QUERY} where fpath = ?", (fpath,)):
+            return VideoProbe.from_row(row)
+        return None
+
+    def snapshot(self) -> dict[str, VideoProbe]:
+        """Every recorded probe, keyed by path."""
+        return {row[0]: VideoProbe.from_row(row) for row in self.conn.execute(VIDEO_PROBE_QUERY)}
+
+    def add_many(self, probes: Iterable[VideoProbe]) -> None:
+        """Record probes in one transaction, replacing those of earlier file versions."""
+        rows = [
+            (
+                probe.fpath,
+                probe.size,
+                probe.mtime_ns,
+                probe.duration,
+                probe.width,
+                probe.height,
+                probe.video_codec,
+                probe.audio_codec,
+                probe.bitrate,
+                probe.creation_time,
+                probe.pixel_format,
+            )
+            for probe in probes
+        ]
+        if not rows:
+            return
+
+        with self.conn as conn:
+            conn.execute("begin immediate;")
+            conn.executemany(
+                "insert or replace into video_probe (fpath, size, mtime_ns, duration, width,"
+                " height, video_codec, audio_codec, bitrate, creation_time, pixel_format)"
+                " values (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+
 class EncodedVideosTable:
     def __init__(self, conn: sqlite3.Connection) -> None:
         self.conn = conn
         self.conn.execute(ENCODED_VIDEO_TABLE)
 
     def add(self, fpath: str, url: str, role: str, format: str) -> None:
-        mimetype = f"video/{format}"
+        self.add_with_mimetype(fpath, url, role, f"video/{format}")
+
+    def add_playlist(self, fpath: str, url: str, role: str) -> None:
+        """Record the master playlist of an adaptive-streaming role"""
+        self.add_with_mimetype(fpath, url, role, HLS_PLAYLIST_CONTENT_TYPE)
 
+    def add_with_mimetype(self, fpath: str, url: str, role: str, mimetype: str) -> None:
         self.conn.execute(
             "insert or ignore into encoded_videos (fpath, mimetype, role, url) values (?, ?, ?, ?)",
             (fpath, mimetype, role, url),
@@ -4,14 +4,14 @@ import logging
 from functools import lru_cache
 from typing import Any
 
-from PIL import Image
-
 from mirror.commons.constants import (
     DETECTION_CONFIDENCE_THRESHOLD,
+    DETECTION_DECODE_MIN_DIMENSION,
     DETECTION_MODEL_ID,
     DETECTION_PROMPT_OVERRIDES,
     DETECTION_TORCH_THREADS,
 )
+from mirror.commons.images import open_preview
 from mirror.models.detection import DetectionBox, box_volume
 
 
@@ -107,13 +107,16 @@ def detect_boxes(
     Returns (boxes, image pixel area). Boxes are [x1, y1, x2, y2] in the pixels
     of the searched file. An empty list means the image was searched and nothing
     passed the threshold.
+
+    The model sees a reduced-size decode; boxes are scaled back to the file's
+    full resolution.
     """
     import torch  # noqa: PLC0415
 
     processor, model = load_detection_model()
 
-    with Image.open(image_path) as image_fh:
-        image = image_fh.convert("RGB")
+    preview, (width, height) = open_preview(image_path, DETECTION_DECODE_MIN_DIMENSION)
+    image = preview.convert("RGB")
 
     inputs = processor(images=image, text=prompt, return_tensors="pt")
     with torch.no_grad():
@@ -124,7 +127,7 @@ def detect_boxes(
         inputs.input_ids,
         threshold=threshold,
         text_threshold=threshold,
-        target_sizes=[(image.height, image.width)],
+        target_sizes=[(height, width)],
     )
-    boxes = result_to_boxes(results[0], image.width, image.height)
-    return boxes, image.width * image.height
+    boxes = result_to_boxes(results[0], width, height)
+    return boxes, width * height
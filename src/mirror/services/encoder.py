@@ -4,38 +4,50 @@ import base64
 import contextlib
 import io
 import os
-from typing import Dict, Optional, Tuple
+import shutil
+import subprocess
+from typing import Dict, Iterable, Optional, Tuple
 
 import cv2
 import ffmpeg
+import numpy as np
 from PIL import Image, ImageOps
 from thumbhash import rgba_to_thumb_hash
 
 from mirror.commons.constants import (
+    ANALYSIS_DECODE_MIN_DIMENSION,
     CONTRAST_DELTA,
     LIGHTNESS_MIDPOINT,
+    QUALITY_SEARCH_FLOOR,
+    RESPONSIVE_RUNG_ROLES,
     THUMBHASH_MAX_DIMENSION,
     THUMBNAIL_HEIGHT,
     THUMBNAIL_WIDTH,
+    VIDEO_HLS_PLAYLIST,
+    VIDEO_HLS_SEGMENT_SECONDS,
     VIDEO_THUMBNAIL_FORMAT,
 )
 from mirror.commons.exceptions import (
     InvalidVideoDimensionsError,
+    VideoEncodeError,
     VideoReadError,
-    VideoResolutionLookupError,
 )
-from mirror.models.photo import PhotoContent
+from mirror.commons.images import open_preview
+from mirror.models.photo import PhotoAnalysis, PhotoContent
+from mirror.models.video import VideoProbe
+from mirror.services.rendition_cache import RenditionCache, source_digest
 
 
-def sample_corner_lightness(fpath: str) -> float:
-    """Average lightness (0-255, proportional to L*) of the image's top-right corner."""
-    lab = Image.open(fpath).convert("RGB").convert("LAB")
-    lightness_band, _, __ = lab.split()
+def corner_lightness(img) -> float:
+    """Average lightness (0-255, proportional to L*) of the image's top-right corner.
 
-    width, height = lightness_band.size
-    top_right = lightness_band.crop((7 * width // 8, 0, width, height // 8))
+    The corner is cropped before the colour conversion, so only its 1/64th of the image
+    is converted to LAB."""
+    width, height = img.size
+    top_right = img.crop((7 * width // 8, 0, width, max(1, height // 8)))
+    lightness_band, _, __ = top_right.convert("RGB").convert("LAB").split()
 
-    pixels = list(top_right.getdata())
+    pixels = list(lightness_band.get_flattened_data())
     return sum(pixels) / len(pixels)
 
 
@@ -67,6 +79,26 @@ def neutral_grey_hex(target_lightness: int) -> str:
     return f"#{grey:02X}{grey:02X}{grey:02X}"
 
 
+def contrasting_grey(img) -> str:
+    """A neutral grey contrasting with the image's top-right corner."""
+    return neutral_grey_hex(contrasting_lightness(corner_lightness(img)))
+
+
+def thumbhash_of(img) -> str:
+    """The image as an unpadded-base64 ThumbHash, reduced to the hash's maximum size."""
+    oriented = ImageOps.exif_transpose(img)
+    rgb = oriented.convert("RGB")
+    rgb.thumbnail((THUMBHASH_MAX_DIMENSION, THUMBHASH_MAX_DIMENSION))
+
+    rgba = []
+    for red, green, blue in rgb.get_flattened_data():
+        rgba.extend((red, green, blue, 255))
+
+    hash_bytes = bytes(rgba_to_thumb_hash(rgb.width, rgb.height, rgba))
+
+    return base64.b64encode(hash_bytes).decode("ascii").rstrip("=")
+
+
 def scrub_image_metadata(img) -> None:
     """Remove EXIF and embedded metadata blocks in-place."""
     img.getexif().clear()
@@ -75,6 +107,154 @@ def scrub_image_metadata(img) -> None:
     img.info.pop("icc_profile", None)
 
 
+def rendition_geometry(role: str, params: Dict) -> Optional[Tuple[int, int]]:
+    """The (width, height) a role is fitted to, or None for a full-size rendition"""
+    width = params.get("width")
+    height = params.get("height")
+
+    if width and height:
+        return width, height
+    if role == "thumbnail_lossy":
+        raise ValueError("thumbnail_lossy role requires width and height")
+
+    return None
+
+
+def has_framing(size: Tuple[int, int], geometry: Tuple[int, int]) -> bool:
+    """Does an image of this size share the geometry's aspect ratio, to the nearest pixel?
+    Fitting it to the geometry then crops less than a pixel."""
+    (width, height), (target_width, target_height) = size, geometry
+    return abs(width * target_height - height * target_width) < min(width, height)
+
+
+def fit_source(img, fitted: Dict, geometry: Tuple[int, int]):
+    """The smallest rendition already fitted to this aspect ratio and no smaller than the
+    geometry, or the source image when there is none"""
+    candidates = [
+        built
+        for (width, height), built in fitted.items()
+        if has_framing((width, height), geometry) and width >= geometry[0] and height >= geometry[1]
+    ]
+
+    return min(candidates, key=lambda built: built.width, default=img)
+
+
+def fit_geometries(img, geometries: Iterable[Tuple[int, int]]) -> Dict:
+    """Fit the source to each distinct geometry once, largest first.
+
+    A geometry with the aspect ratio of a larger one already built, to the nearest pixel, is
+    resized from that rendition; fitting it needs no crop, so only the cheaper resize is
+    repeated."""
+    fitted: Dict = {}
+
+    for geometry in sorted(set(geometries), key=lambda size: size[0] * size[1], reverse=True):
+        fitted[geometry] = ImageOps.fit(fit_source(img, fitted, geometry), geometry)
+
+    return fitted
+
+
+def save_rendition(img, params: Dict) -> PhotoContent:
+    """Save an image with a role's encoder parameters, without its metadata"""
+    scrub_image_metadata(img)
+
+    with io.BytesIO() as output:
+        # Remove the keys Pillow does not take to avoid side-effects
+        directive_keys = {"width", "height", "target_ssim"}
+        save_params = {key: val for key, val in params.items() if key not in directive_keys}
+
+        img.save(output, **save_params)
+        return PhotoContent(output.getvalue(), params.get("quality"))
+
+
+def local_mean(pixels: np.ndarray) -> np.ndarray:
+    """Gaussian-weighted mean of each pixel's 11x11 neighbourhood, as SSIM defines it"""
+    return cv2.GaussianBlur(pixels, (11, 11), 1.5)
+
+
+def structural_similarity(reference, encoded: PhotoContent) -> float:
+    """Mean SSIM (Wang et al., 2004) between an image's luma and its decoded rendition's"""
+    x = np.asarray(reference.convert("L"), dtype=np.float64)
+    with Image.open(io.BytesIO(encoded.content)) as decoded:
+        y = np.asarray(decoded.convert("L"), dtype=np.float64)
+
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    mu_x, mu_y = local_mean(x), local_mean(y)
+    var_x = local_mean(x * x) - mu_x**2
+    var_y = local_mean(y * y) - mu_y**2
+    covariance = local_mean(x * y) - mu_x * mu_y
+
+    ssim = ((2 * mu_x * mu_y + c1) * (2 * covariance + c2)) / (
+        (mu_x**2 + mu_y**2 + c1) * (var_x + var_y + c2)
+    )
+    return float(ssim.mean())
+
+
+def search_quality(img, params: Dict) -> PhotoContent:
+    """Encode at the lowest quality, from QUALITY_SEARCH_FLOOR up to the role's own, whose
+    rendition keeps the role's target_ssim similarity to the image.
+
+    Similarity rises with quality, so the quality is binary-searched: a handful of encodes
+    rather than one per step. When no quality below the role's reaches the target, the
+    rendition is encoded at the role's quality."""
+    low, high = QUALITY_SEARCH_FLOOR, params["quality"]
+    found = None
+
+    while low < high:
+        quality = (low + high) // 2
+        candidate = save_rendition(img, {**params, "quality": quality})
+        if structural_similarity(img, candidate) >= params["target_ssim"]:
+            high, found = quality, candidate
+        else:
+            low = quality + 1
+
+    return found or save_rendition(img, params)
+
+
+def encode_fitted(img, params: Dict, quality: Optional[int]) -> PhotoContent:
+    """Encode one role from its fitted image. A quality-targeted role is encoded at the
+    quality already chosen for it when given one, and otherwise searched for one."""
+    if "target_ssim" not in params:
+        return save_rendition(img, params)
+    if quality is not None:
+        return save_rendition(img, {**params, "quality": quality})
+
+    return search_quality(img, params)
+
+
+def is_upscaled_rung(role: str, geometry: Optional[Tuple[int, int]], size: Tuple[int, int]) -> bool:
+    """Would the role be a responsive rung upscaled from a smaller source?"""
+    return role in RESPONSIVE_RUNG_ROLES and (geometry[0] > size[0] or geometry[1] > size[1])
+
+
+def encode_renditions(
+    fpath: str, renditions: list[Tuple[str, Dict]], qualities: Optional[Dict[str, int]] = None
+) -> Dict[str, PhotoContent]:
+    """Decode the source once, then encode each role from its shared fitted geometry.
+    Responsive rungs larger than the source are skipped; when nothing else is left, the
+    source is not decoded at all."""
+    geometries = {role: rendition_geometry(role, params) for role, params in renditions}
+    qualities = qualities or {}
+
+    with Image.open(fpath) as img:
+        renditions = [
+            (role, params)
+            for role, params in renditions
+            if not is_upscaled_rung(role, geometries[role], img.size)
+        ]
+        if not renditions:
+            return {}
+
+        img.load()
+        fitted = fit_geometries(
+            img, [geometries[role] for role, _ in renditions if geometries[role]]
+        )
+
+        return {
+            role: encode_fitted(fitted.get(geometries[role], img), params, qualities.get(role))
+            for role, params in renditions
+        }
+
+
 class PhotoEncoder:
     @classmethod
     def compute_contrasting_grey(cls, fpath: str) -> str:
@@ -87,9 +267,8 @@ class PhotoEncoder:
         get a darker grey.
         """
 
-        avg_lightness = sample_corner_lightness(fpath)
-        target_lightness = contrasting_lightness(avg_lightness)
-        return neutral_grey_hex(target_lightness)
+        img, _ = open_preview(fpath, ANALYSIS_DECODE_MIN_DIMENSION)
+        return contrasting_grey(img)
 
     @classmethod
     def encode_thumbhash(cls, fpath: str) -> str:
@@ -101,44 +280,58 @@ class PhotoEncoder:
 
         The image is flattened to opaque RGBA before hashing. The library's
         alpha path is broken (a tuple-assignment bug), and our photos carry
-        no meaningful transparency."""
-
-        with Image.open(fpath) as img:
-            oriented = ImageOps.exif_transpose(img)
-            rgb = oriented.convert("RGB")
-            rgb.thumbnail((THUMBHASH_MAX_DIMENSION, THUMBHASH_MAX_DIMENSION))
+        no meaningful transparency. The hash input is at most 100px, so the
+        photo is decoded at a reduced size."""
 
-            rgba = []
-            for red, green, blue in rgb.get_flattened_data():
-                rgba.extend((red, green, blue, 255))
-
-            hash_bytes = bytes(rgba_to_thumb_hash(rgb.width, rgb.height, rgba))
-
-        return base64.b64encode(hash_bytes).decode("ascii").rstrip("=")
+        img, _ = open_preview(fpath, THUMBHASH_MAX_DIMENSION)
+        return thumbhash_of(img)
 
     @classmethod
-    def encode(cls, fpath: str, role: str, params: Dict) -> PhotoContent:
-        """Encode an image as Webp, optionally resizing, and remove EXIF data"""
-
-        with Image.open(fpath) as img:
-            # Optionally resize if width and height are in params
-            width = params.get("width")
-            height = params.get("height")
-
-            if width and height:
-                img = ImageOps.fit(img, (width, height))
-            elif role == "thumbnail_lossy":
-                raise ValueError("thumbnail_lossy role requires width and height")
+    def analyse(cls, fpath: str) -> PhotoAnalysis:
+        """Compute the photo's grey and thumbhash from a single reduced-size decode.
 
-            scrub_image_metadata(img)
+        The decode is sized for the corner sample, the larger of the two needs; the
+        thumbhash input is reduced from the same buffer."""
+        img, _ = open_preview(fpath, ANALYSIS_DECODE_MIN_DIMENSION)
 
-            with io.BytesIO() as output:
-                # Remove width and height from params to avoid side-effects
-                resize_keys = {"width", "height"}
-                save_params = {key: val for key, val in params.items() if key not in resize_keys}
+        return PhotoAnalysis(
+            fpath=fpath, grey_value=contrasting_grey(img), thumbhash=thumbhash_of(img)
+        )
 
-                img.save(output, **save_params)
-                return PhotoContent(output.getvalue())
+    @classmethod
+    def encode_many(  # noqa: PLR0913
+        cls,
+        fpath: str,
+        renditions: Iterable[Tuple[str, Dict]],
+        cache: Optional[RenditionCache] = None,
+        qualities: Optional[Dict[str, int]] = None,
+        *,
+        digest: Optional[str] = None,
+    ) -> Dict[str, PhotoContent]:
+        """Encode several roles of one image, decoding the source once.
+
+        Each distinct geometry is fitted once and shared by every role that uses it, so
+        e.g. mid_image_lossy and mid_image_png are resized together. With a cache, roles
+        already encoded from identical source bytes and parameters are read from it, and
+        the source is only decoded when some role misses; pass the source's `digest` when
+        it is already known, so the file is not hashed twice. Eviction is left to the
+        caller, once per run. Quality-targeted roles given a quality in `qualities` are encoded
+        at it without a search."""
+        renditions = list(renditions)
+        if cache is None:
+            return encode_renditions(fpath, renditions, qualities)
+
+        digest = digest or source_digest(fpath)
+        keys = {role: cache.key(digest, role, params) for role, params in renditions}
+        encoded = {role: hit for role in keys if (hit := cache.get(keys[role]))}
+
+        missing = [(role, params) for role, params in renditions if role not in encoded]
+        if missing:
+            for role, content in encode_renditions(fpath, missing, qualities).items():
+                cache.put(keys[role], content)
+                encoded[role] = content
+
+        return encoded
 
 
 def is_undersized(actual_width: Optional[int], actual_height: Optional[int], params: Dict) -> bool:
@@ -174,8 +367,166 @@ def video_encode_args(params: Dict, share_audio: bool) -> tuple[Dict, Dict]:
     return input_args, kwargs
 
 
+BITRATE_UNITS = {"k": 1_000, "M": 1_000_000}
+
+
+def parse_bitrate(bitrate: str) -> int:
+    """An ffmpeg bitrate such as 5000k or 30M, in bits per second."""
+    unit = BITRATE_UNITS.get(bitrate[-1])
+    return int(float(bitrate[:-1]) * unit) if unit else int(bitrate)
+
+
+def can_remux(probe: VideoProbe, params: Dict, share_audio: bool) -> bool:
+    """True when the source already meets the rendition's spec, so its streams can be copied
+    into the output rather than re-encoded: H.264 in the browser-safe pixel format, exactly
+    the rendition's size, no more than its bitrate, and with AAC audio if audio is kept."""
+    if (probe.video_codec, probe.pixel_format) != ("h264", "yuv420p") or not probe.bitrate:
+        return False
+
+    width, height = params["width"], params["height"]
+    if width and height and (probe.width, probe.height) != (width, height):
+        return False
+
+    if share_audio and probe.audio_codec not in {None, "aac"}:
+        return False
+
+    return probe.bitrate <= parse_bitrate(params["bitrate"])
+
+
+def video_remux_args(share_audio: bool) -> tuple[Dict, Dict]:
+    """ffmpeg input and output arguments copying a video's streams into a new MP4."""
+    input_args: Dict = {} if share_audio else {"an": None}
+    kwargs = {"c": "copy", "movflags": "+faststart", "format": "mp4", "loglevel": "error"}
+
+    return input_args, kwargs
+
+
+def video_args(probe: VideoProbe, params: Dict, share_audio: bool) -> tuple[Dict, Dict]:
+    """Remux arguments when the source fits the rendition, otherwise encode arguments."""
+    if can_remux(probe, params, share_audio):
+        return video_remux_args(share_audio)
+
+    return video_encode_args(params, share_audio)
+
+
+# Fragmented MP4 writes its index up front and its samples in self-contained fragments,
+# so it never seeks back and can be written to a pipe. +faststart needs a seekable file
+STREAMING_MOVFLAGS = "frag_keyframe+empty_moov+default_base_moof"
+
+
+def video_output_fpath(upload_file_name: str) -> str:
+    """Local path for an encoded video, cleared so a stale encode is never uploaded."""
+    output_fpath = f"/tmp/mirror/{upload_file_name}"
+    os.makedirs(os.path.dirname(output_fpath), exist_ok=True)
+
+    # prevent accidental upload of old file
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(output_fpath)
+
+    return output_fpath
+
+
+def video_output_dpath(prefix: str) -> str:
+    """Local directory for a segmented encode, cleared of any earlier encode."""
+    output_dpath = f"/tmp/mirror/{prefix}"
+    shutil.rmtree(output_dpath, ignore_errors=True)
+    os.makedirs(output_dpath)
+
+    return output_dpath
+
+
+def split_scaled(source, renditions: list[Dict]) -> list:
+    """The source's video split into one stream per rendition, each scaled to its size."""
+    split = source.video.filter_multi_output("split", len(renditions))
+
+    streams = []
+    for idx, params in enumerate(renditions):
+        video = split.stream(idx)
+        if params["width"] and params["height"]:
+            video = video.filter("scale", params["width"], params["height"])
+        streams.append(video)
+
+    return streams
+
+
+def ladder_graph(fpath: str, outputs: Dict[str, Dict], share_audio: bool):
+    """One ffmpeg graph writing every output: the source is decoded once, then its video is
+    split into one stream per output and scaled to that output's size."""
+    input_args, _ = video_encode_args(next(iter(outputs.values())), share_audio)
+    source = ffmpeg.input(fpath, **input_args)
+    videos = split_scaled(source, list(outputs.values()))
+
+    streams = []
+    for video, (output_fpath, params) in zip(videos, outputs.items(), strict=True):
+        _, kwargs = video_encode_args(params, share_audio)
+        kwargs.pop("vf", None)
+
+        # "a?" maps the audio when the source has any, as a single encode would
+        audio = [source["a?"]] if share_audio else []
+        streams.append(ffmpeg.output(video, *audio, output_fpath, **kwargs))
+
+    return ffmpeg.merge_outputs(*streams)
+
+
+def hls_encode_args(variants: list[Dict], audio: bool) -> Dict:
+    """ffmpeg output arguments writing each variant as CMAF segments with its own playlist,
+    plus a master playlist listing them. Keyframes are forced at every segment boundary, so
+    segments align across variants and players can switch between them at any boundary."""
+    kwargs = {
+        "vcodec": "libx264",
+        "preset": "slow",
+        "force_key_frames": f"expr:gte(t,n_forced*{VIDEO_HLS_SEGMENT_SECONDS})",
+        "format": "hls",
+        "hls_time": VIDEO_HLS_SEGMENT_SECONDS,
+        "hls_playlist_type": "vod",
+        "hls_segment_type": "fmp4",
+        "hls_fmp4_init_filename": "init.mp4",
+        "master_pl_name": VIDEO_HLS_PLAYLIST,
+        "var_stream_map": " ".join(
+            f"v:{idx},a:{idx}" if audio else f"v:{idx}" for idx in range(len(variants))
+        ),
+        "loglevel": "error",
+    }
+    if audio:
+        kwargs["acodec"] = "aac"
+
+    for idx, params in enumerate(variants):
+        kwargs[f"b:v:{idx}"] = params["bitrate"]
+
+    return kwargs
+
+
+def hls_graph(fpath: str, variants: list[Dict], output_dpath: str, audio: bool):
+    """One ffmpeg graph encoding every variant from a single decode of the source, written
+    as a directory of segments and playlists: `<variant>/playlist.m3u8` beside the master
+    playlist."""
+    source = ffmpeg.input(fpath, **({} if audio else {"an": None}))
+
+    streams = []
+    for video in split_scaled(source, variants):
+        streams.extend([video, source["a"]] if audio else [video])
+
+    kwargs = hls_encode_args(variants, audio)
+    kwargs["hls_segment_filename"] = f"{output_dpath}/%v/segment_%03d.m4s"
+
+    return ffmpeg.output(*streams, f"{output_dpath}/%v/playlist.m3u8", **kwargs)
+
+
+def stream_graph(probe: VideoProbe, params: Dict, poster_fpath: str, share_audio: bool):
+    """One ffmpeg graph writing the rendition to stdout as fragmented MP4, and teeing the
+    first video frame of the same read to `poster_fpath`, so the thumbnail is taken without
+    opening the source again."""
+    input_args, kwargs = video_args(probe, params, share_audio)
+    kwargs["movflags"] = STREAMING_MOVFLAGS
+
+    source = ffmpeg.input(probe.fpath, **input_args)
+    poster = source.video.output(poster_fpath, vframes=1, loglevel="error")
+
+    return ffmpeg.merge_outputs(source.output("pipe:", **kwargs), poster)
+
+
 def read_first_frame(fpath: str) -> bytes:
-    """First frame of a video, as encoded image bytes."""
+    """First frame of a video, or an image, as encoded image bytes."""
     loaded = cv2.VideoCapture(fpath)
     try:
         ret, frame = loaded.read()
@@ -187,47 +538,122 @@ def read_first_frame(fpath: str) -> bytes:
         loaded.release()
 
 
+def check_fits(probe: VideoProbe, params: Dict) -> None:
+    """Refuse to encode a video to a size larger than itself."""
+    actual_width, actual_height = probe.resolution()
+    if is_undersized(actual_width, actual_height, params):
+        raise InvalidVideoDimensionsError(f"Video {probe.fpath} is too small to encode")
+
+
+class FFmpegStream:
+    """The output of a running ffmpeg, read from its stdout pipe. Reaching the end of the
+    output raises if ffmpeg failed, so a truncated encode is never taken as complete."""
+
+    def __init__(self, process: subprocess.Popen, fpath: str) -> None:
+        self.process = process
+        self.fpath = fpath
+
+    def read(self, size: int) -> bytes:
+        """Up to `size` bytes; fewer only at the end of the output."""
+        chunk = self.process.stdout.read(size)
+        if not chunk and self.process.wait() != 0:
+            raise VideoEncodeError(f"ffmpeg failed encoding {self.fpath}")
+
+        return chunk
+
+    def terminate(self) -> None:
+        """Stop ffmpeg if it is still running, e.g. after the upload failed."""
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.stdout.close()
+        self.process.wait()
+
+
 class VideoEncoder:
     """Encode & interact with video"""
 
     @classmethod
     def encode(
-        cls, fpath: str, upload_file_name: str, params: Dict, share_audio: bool = False
+        cls, probe: VideoProbe, upload_file_name: str, params: Dict, share_audio: bool = False
     ) -> Optional[str]:
-        """Encode the video"""
-
-        actual_width, actual_height = cls.resolution(fpath)
-        if is_undersized(actual_width, actual_height, params):
-            raise InvalidVideoDimensionsError(f"Video {fpath} is too small to encode")
-
-        input_args, kwargs = video_encode_args(params, share_audio)
-
-        output_fpath = f"/tmp/mirror/{upload_file_name}"
-        os.makedirs(os.path.dirname(output_fpath), exist_ok=True)
+        """Encode the probed video, or remux it when it already fits the rendition"""
+        fpath = probe.fpath
+        check_fits(probe, params)
 
-        # prevent accidental upload of old file
-        with contextlib.suppress(FileNotFoundError):
-            os.remove(output_fpath)
+        input_args, kwargs = video_args(probe, params, share_audio)
+        output_fpath = video_output_fpath(upload_file_name)
 
         (ffmpeg.input(fpath, **input_args).output(output_fpath, **kwargs).run())
 
         return output_fpath
 
     @classmethod
-    def resolution(cls, fpath: str) -> Tuple[int, int]:
-        """Encode a video"""
-        "Returns resolution of the video, if it's possible to determine?"
+    def encode_stream(
+        cls, probe: VideoProbe, params: Dict, poster_fpath: str, share_audio: bool = False
+    ) -> FFmpegStream:
+        """Start encoding the probed video to a pipe, as fragmented MP4, writing its first
+        frame to `poster_fpath` in the same run. A video that already fits the rendition is
+        remuxed."""
+        check_fits(probe, params)
 
-        probe = ffmpeg.probe(fpath)
-        video_streams = [stream for stream in probe["streams"] if stream["codec_type"] == "video"]
+        graph = stream_graph(probe, params, poster_fpath, share_audio)
+        process = graph.run_async(pipe_stdout=True)
 
-        if video_streams:
-            width = int(video_streams[0]["width"])
-            height = int(video_streams[0]["height"])
+        return FFmpegStream(process, probe.fpath)
 
-            return width, height
+    @classmethod
+    def encode_ladder(
+        cls, probe: VideoProbe, renditions: Iterable[Tuple[str, Dict]], share_audio: bool = False
+    ) -> Dict[str, str]:
+        """Encode several renditions of the probed video in one ffmpeg run, decoding the
+        source once.
+
+        Renditions larger than the source are skipped, and those the source already fits
+        are remuxed instead. Returns the encoded path of each rendition, by upload file
+        name."""
+        actual_width, actual_height = probe.resolution()
+        fitting = [
+            (name, params)
+            for name, params in renditions
+            if not is_undersized(actual_width, actual_height, params)
+        ]
+
+        encoded = {}
+        for name, params in fitting:
+            if can_remux(probe, params, share_audio):
+                encoded[name] = cls.encode(probe, name, params, share_audio)
+
+        laddered = [(name, params) for name, params in fitting if name not in encoded]
+        if not laddered:
+            return encoded
+
+        ladder_paths = {name: video_output_fpath(name) for name, _ in laddered}
+        outputs = {ladder_paths[name]: params for name, params in laddered}
+        ladder_graph(probe.fpath, outputs, share_audio).run()
+
+        return encoded | ladder_paths
 
-        raise VideoResolutionLookupError(f"Failed to determine resolution of {fpath}")
+    @classmethod
+    def encode_hls(
+        cls, probe: VideoProbe, prefix: str, variants: list[Dict], share_audio: bool = False
+    ) -> Optional[str]:
+        """Encode the probed video's adaptive-streaming variants in one ffmpeg run.
+
+        Variants larger than the source are left out. Returns the directory of segments and
+        playlists, or None when no variant fits the source."""
+        actual_width, actual_height = probe.resolution()
+        fitting = [
+            params for params in variants if not is_undersized(actual_width, actual_height, params)
+        ]
+        if not fitting:
+            return None
+
+        output_dpath = video_output_dpath(prefix)
+        # a variant map naming audio fails on a source without any
+        audio = share_audio and probe.audio_codec is not None
+        hls_graph(probe.fpath, fitting, output_dpath, audio).run()
+
+        return output_dpath
 
     @classmethod
     def encode_thumbnail(
@@ -0,0 +1,89 @@
+"""Local content-addressed cache of encoded photo renditions"""
+
+import contextlib
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+from mirror.models.photo import PhotoContent
+
+
+def source_digest(fpath: str) -> str:
+    """Hash of a source file's content"""
+    with open(fpath, "rb") as source:
+        return hashlib.file_digest(source, "sha256").hexdigest()
+
+
+class RenditionCache:
+    """Encoded renditions on disk, keyed by the source content and the role's parameters.
+
+    Reads refresh a rendition's mtime, so eviction removes the least recently used files
+    first until the cache fits its size budget."""
+
+    dpath: Path
+    max_bytes: int
+
+    def __init__(self, dpath: str, max_bytes: int) -> None:
+        self.dpath = Path(dpath)
+        self.max_bytes = max_bytes
+        self.dpath.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def key(cls, digest: str, role: str, params: Dict) -> str:
+        """Cache key for one role of one source. Changing any encoder parameter misses."""
+        encoded_params = json.dumps(params, sort_keys=True)
+        return hashlib.sha256(f"{digest}:{role}:{encoded_params}".encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[PhotoContent]:
+        fpath = self.dpath / key
+
+        try:
+            content = fpath.read_bytes()
+        except FileNotFoundError:
+            return None
+
+        os.utime(fpath)
+        return PhotoContent(content)
+
+    def put(self, key: str, content: PhotoContent) -> None:
+        """Store a rendition. Written under a temporary name first, so parallel encode jobs
+        never read a partial file."""
+        fpath = self.dpath / key
+        partial_fpath = self.dpath / f"{key}.{os.getpid()}.partial"
+
+        partial_fpath.write_bytes(content.content)
+        os.replace(partial_fpath, fpath)
+
+    def list_entries(self) -> list[tuple[int, int, str]]:
+        """(mtime_ns, size, path) of each complete rendition"""
+        entries = []
+
+        for entry in os.scandir(self.dpath):
+            # renditions still being written belong to another job
+            if entry.name.endswith(".partial"):
+                continue
+
+            with contextlib.suppress(FileNotFoundError):
+                stat = entry.stat()
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+        return entries
+
+    def evict(self) -> int:
+        """Remove least recently used renditions until the cache fits; return the count."""
+        entries = self.list_entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+
+        for _, size, fpath in sorted(entries):
+            if total <= self.max_bytes:
+                break
+
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(fpath)
+                removed += 1
+            total -= size
+
+        return removed
@@ -0,0 +1,124 @@
+"""Upload photo renditions over one connection pool, as many at once as the link bears"""
+
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from mirror.models.photo import PhotoContent
+from mirror.models.upload import OutboxTask, UploadReport
+from mirror.services.cdn import CDN, UPLOAD_ERRORS, is_transient_error, shared_session
+
+
+class AimdController:
+    """Additive-increase, multiplicative-decrease limit on uploads in flight.
+
+    Uploads are judged a window at a time, a window being as many completed uploads as the
+    limit allows at once. A clean window whose throughput held within `tolerance` of the
+    last raises the limit by one. A failed upload, or a window whose throughput fell
+    further, multiplies the limit by `decrease`. So the limit climbs while more uploads add
+    bytes/s, and falls back when the link congests or drops."""
+
+    limit: int
+    minimum: int
+    maximum: int
+
+    def __init__(
+        self, limits: tuple[int, int, int], decrease: float = 0.5, tolerance: float = 0.1
+    ) -> None:
+        self.minimum, self.limit, self.maximum = limits
+        self.decrease = decrease
+        self.tolerance = tolerance
+        self.last_rate: float | None = None
+        self.start_window()
+
+    def start_window(self) -> None:
+        self.window_started = time.monotonic()
+        self.window_bytes = 0
+        self.window_count = 0
+
+    def back_off(self) -> None:
+        self.limit = max(self.minimum, int(self.limit * self.decrease))
+        self.start_window()
+
+    def record(self, size: int, failed: bool) -> None:
+        """Count one completed upload, adjusting the limit at the end of each window."""
+        if failed:
+            self.last_rate = None
+            self.back_off()
+            return
+
+        self.window_bytes += size
+        self.window_count += 1
+        if self.window_count < self.limit:
+            return
+
+        rate = self.window_bytes / max(time.monotonic() - self.window_started, 1e-6)
+        if self.last_rate is not None and rate < self.last_rate * (1 - self.tolerance):
+            self.last_rate = rate
+            self.back_off()
+            return
+
+        self.last_rate = rate
+        self.limit = min(self.maximum, self.limit + 1)
+        self.start_window()
+
+
+def upload_rendition(cdn: CDN, task: OutboxTask) -> UploadReport:
+    """Upload one queued rendition, reporting rather than raising a failure, so the
+    uploader settles every rendition it takes on."""
+    try:
+        content = PhotoContent(Path(task.artifact_path).read_bytes())
+    except OSError as err:
+        return UploadReport(task, 0, 0.0, error=str(err), transient=False)
+
+    started = time.monotonic()
+    try:
+        url = cdn.upload_photo(content, role=task.role, format=task.params["format"])
+    except UPLOAD_ERRORS as err:
+        elapsed = time.monotonic() - started
+        return UploadReport(
+            task, len(content.content), elapsed, error=str(err), transient=is_transient_error(err)
+        )
+
+    return UploadReport(task, len(content.content), time.monotonic() - started, url=url)
+
+
+class PhotoUploader:
+    """Runs rendition uploads on a thread pool, sharing one CDN client whose connection
+    pool holds a connection for every upload the controller may allow."""
+
+    def __init__(self, controller: AimdController, cdn: CDN | None = None) -> None:
+        self.controller = controller
+        self.cdn = cdn or CDN(client=CDN.client(shared_session(), controller.maximum))
+        self.executor = ThreadPoolExecutor(max_workers=controller.maximum)
+        self.in_flight: dict[Future, OutboxTask] = {}
+
+    def room(self) -> int:
+        """How many more uploads the controller allows now"""
+        return max(0, self.controller.limit - len(self.in_flight))
+
+    def is_uploading(self, task: OutboxTask) -> bool:
+        return any(running.key() == task.key() for running in self.in_flight.values())
+
+    def submit(self, task: OutboxTask) -> None:
+        self.in_flight[self.executor.submit(upload_rendition, self.cdn, task)] = task
+
+    def completed(self, timeout: float) -> list[UploadReport]:
+        """Wait up to `timeout` seconds for uploads to finish; return their reports."""
+        if not self.in_flight:
+            time.sleep(timeout)
+            return []
+
+        done, _ = wait(self.in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+        reports = []
+        for future in done:
+            del self.in_flight[future]
+            report = future.result()
+            # only failures of the link itself say anything about how much it bears
+            self.controller.record(report.size, failed=report.transient and bool(report.error))
+            reports.append(report)
+
+        return reports
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=True)
@@ -1,9 +1,78 @@
 """Top-level class for interacting with the nested photo of folders"""
 
 import os
-from typing import Iterator
+from collections import defaultdict
+from dataclasses import dataclass, field, replace
+from typing import Iterator, Optional
 
 from mirror.models.album import Album
+from mirror.models.manifest import DIRECTORY_KIND, ManifestEntry, stat_directory
+
+
+@dataclass
+class VaultManifest:
+    """Every published album and its media, listed once per run and shared by each scan
+    stage."""
+
+    albums: list[Album]
+    directories: list[ManifestEntry] = field(default_factory=list)
+
+    def entries(self) -> Iterator[ManifestEntry]:
+        """Photo and video entries across every album"""
+        for album in self.albums:
+            for entry in album.entries():
+                if entry.is_photo() or entry.is_video():
+                    yield entry
+
+    def fpaths(self) -> set[str]:
+        """Paths of every photo and video in the vault"""
+        return {entry.fpath for entry in self.entries()}
+
+    def changed_fpaths(self, previous: dict[str, ManifestEntry]) -> set[str]:
+        """Media that are new since the previous listing, or whose stat fields differ"""
+        return {entry.fpath for entry in self.entries() if previous.get(entry.fpath) != entry}
+
+    def modified_fpaths(self, previous: dict[str, ManifestEntry]) -> set[str]:
+        """Media present in the previous listing whose stat fields have since changed"""
+        return {
+            entry.fpath
+            for entry in self.entries()
+            if entry.fpath in previous and previous[entry.fpath] != entry
+        }
+
+    def snapshot(self) -> Iterator[ManifestEntry]:
+        """Every directory and file entry, in the shape the file-state table stores"""
+        yield from self.directories
+        for album in self.albums:
+            yield from album.entries()
+
+
+def group_listings(previous: dict[str, ManifestEntry]) -> dict[str, list[ManifestEntry]]:
+    """Previously listed files, grouped by their directory"""
+    listings: dict[str, list[ManifestEntry]] = defaultdict(list)
+
+    for entry in previous.values():
+        if entry.kind != DIRECTORY_KIND:
+            listings[os.path.dirname(entry.fpath)].append(entry)
+
+    return listings
+
+
+def restat_entries(entries: list[ManifestEntry]) -> list[ManifestEntry]:
+    """Previously listed files with their current stat fields. Rewriting a file in place
+    leaves its directory's mtime alone; only the file's own size and mtime show it."""
+    restated = []
+    for entry in entries:
+        try:
+            stat = os.stat(entry.fpath)
+        except FileNotFoundError:
+            continue
+
+        restated.append(
+            replace(entry, size=stat.st_size, mtime_ns=stat.st_mtime_ns, inode=stat.st_ino)
+        )
+
+    return restated
 
 
 class MediaVault:
@@ -30,3 +99,26 @@ class MediaVault:
             album = Album(dpath)
             if album.published():
                 yield album
+
+    def manifest(self, previous: Optional[dict[str, ManifestEntry]] = None) -> VaultManifest:
+        """List every album's published media in a single pass over the vault.
+
+        With a previous listing, an album whose Published directory has the same mtime
+        and inode reuses its old file entries instead of being listed again. Adding,
+        removing or renaming a file changes the directory mtime; rewriting a file in place
+        does not, so each reused entry is stat'ed again to pick up its size and mtime."""
+        previous = previous or {}
+        listings = group_listings(previous)
+
+        albums = []
+        directories = []
+        for album in self.albums():
+            directory = stat_directory(album.published_path())
+            if previous.get(directory.fpath) == directory:
+                album = Album(album.dpath, restat_entries(listings[directory.fpath]))
+
+            album.entries()
+            albums.append(album)
+            directories.append(directory)
+
+        return VaultManifest(albums, directories)
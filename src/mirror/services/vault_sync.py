@@ -2,7 +2,26 @@
 
 from __future__ import annotations
 
+import contextlib
+import os
+
 from mirror.services.database import SqliteDatabase
+from mirror.services.vault import VaultManifest
+
+# tables keyed by a media fpath, children before the photos and videos rows they reference
+MEDIA_INDEX_TABLES = (
+    "upload_outbox",
+    "rendition_qualities",
+    "unfilled_renditions",
+    "exif",
+    "phashes",
+    "photo_icons",
+    "encoded_photos",
+    "photos",
+    "encoded_videos",
+    "video_probe",
+    "videos",
+)
 
 
 class VaultIndexSync:
@@ -11,27 +30,62 @@ class VaultIndexSync:
     def __init__(self, db: SqliteDatabase) -> None:
         self.db = db
 
-    def remove_deleted_photos(self, fpaths: set[str]) -> None:
+        # each table is created on first access; the set-based deletes need all of them
+        for accessor in (
+            db.upload_outbox_table,
+            db.rendition_qualities_table,
+            db.unfilled_renditions_table,
+            db.exif_table,
+            db.phashes_table,
+            db.photo_icon_table,
+            db.encoded_photos_table,
+            db.photos_table,
+            db.encoded_videos_table,
+            db.video_probe_table,
+            db.videos_table,
+        ):
+            accessor()
+
+    def remove_deleted_media(self, manifest: VaultManifest) -> dict[str, int]:
         """
-        Remove rows for photos not in ``fpaths``.
+        Remove rows for photos and videos not in the vault manifest.
 
-        Does not touch videos; deletion handling for videos is coupled elsewhere.
+        The manifest's paths are loaded into a temp table, and each media table is pruned
+        with one set-based delete, all in a single transaction. Renditions still queued for
+        upload have their spooled artifacts deleted too. Returns the number of rows removed
+        from each table.
         """
-        photos_table = self.db.photos_table()
-        exif_table = self.db.exif_table()
-        phashes_table = self.db.phashes_table()
-        icons_table = self.db.photo_icon_table()
-        encoded_photos_table = self.db.encoded_photos_table()
-
-        for fpath in photos_table.list():
-            if fpath in fpaths:
-                continue
-
-            photos_table.delete(fpath)
-            exif_table.delete(fpath)
-            phashes_table.delete(fpath)
-            icons_table.delete(fpath)
-            encoded_photos_table.delete(fpath)
+        rows = [(fpath,) for fpath in manifest.fpaths()]
+        removed: dict[str, int] = {}
+
+        with self.db.conn as conn:
+            conn.execute("begin immediate;")
+            conn.execute("create temp table if not exists vault_fpaths (fpath text primary key)")
+            conn.execute("delete from vault_fpaths")
+            conn.executemany("insert into vault_fpaths (fpath) values (?)", rows)
+            artifacts = [
+                artifact_path
+                for (artifact_path,) in conn.execute(
+                    "select artifact_path from upload_outbox"
+                    " where fpath not in (select fpath from vault_fpaths)"
+                )
+            ]
+
+            # exif and encoded_videos rows would cascade from their parent row; delete them
+            # first so they are counted
+            for table in MEDIA_INDEX_TABLES:
+                cursor = conn.execute(
+                    f"delete from {table} where fpath not in (select fpath from vault_fpaths)"
+                )
+                removed[table] = cursor.rowcount
+
+            conn.execute("delete from vault_fpaths")
+
+        for artifact_path in artifacts:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(artifact_path)
+
+        return removed
 
     def remove_deleted_files(self, fpaths: set[str]) -> None:
         """Remove photo and video rows absent from ``fpaths``, plus orphaned thumbnail rows."""
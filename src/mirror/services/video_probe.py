@@ -0,0 +1,73 @@
+"""ffprobe metadata for videos, cached in the database while each file is unchanged"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Optional
+
+import ffmpeg
+
+from mirror.models.video import VideoProbe
+from mirror.services.database.videos import VideoProbeTable
+
+# concurrent ffprobe subprocesses; each probe is subprocess-bound, not CPU-bound
+PROBE_WORKERS = 12
+
+
+def run_ffprobe(fpath: str) -> VideoProbe:
+    """Probe a video with ffprobe, recording the size and mtime it describes."""
+    stat = os.stat(fpath)
+    return VideoProbe.from_probe(fpath, stat, ffmpeg.probe(fpath))
+
+
+def try_ffprobe(fpath: str) -> Optional[VideoProbe]:
+    """Probe a video, or None when it is missing or ffprobe cannot read it."""
+    try:
+        return run_ffprobe(fpath)
+    except (ffmpeg.Error, OSError):
+        return None
+
+
+def is_current(probe: Optional[VideoProbe], fpath: str) -> bool:
+    """Does the recorded probe still describe the file on disk?"""
+    try:
+        return probe is not None and probe.matches(os.stat(fpath))
+    except OSError:
+        return False
+
+
+class VideoProber:
+    """Probes videos through the video_probe table: only new or changed files run ffprobe."""
+
+    table: VideoProbeTable
+
+    def __init__(self, table: VideoProbeTable) -> None:
+        self.table = table
+
+    def probe(self, fpath: str) -> VideoProbe:
+        """Probe one video; raises as ffprobe does when the file cannot be read."""
+        recorded = self.table.get(fpath)
+        if is_current(recorded, fpath):
+            return recorded
+
+        probe = run_ffprobe(fpath)
+        self.table.add_many([probe])
+
+        return probe
+
+    def probe_many(
+        self, fpaths: Iterable[str], workers: int = PROBE_WORKERS
+    ) -> dict[str, Optional[VideoProbe]]:
+        """Probe each video, running ffprobe concurrently for those not already recorded.
+        Videos that are missing or unreadable map to None."""
+        recorded = self.table.snapshot()
+        probes = {fpath: recorded.get(fpath) for fpath in fpaths}
+        stale = [fpath for fpath, probe in probes.items() if not is_current(probe, fpath)]
+
+        if stale:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                probes.update(zip(stale, pool.map(try_ffprobe, stale), strict=True))
+
+            # written here, not in the pool: the connection belongs to this thread
+            self.table.add_many(probes[fpath] for fpath in stale if probes[fpath])
+
+        return probes
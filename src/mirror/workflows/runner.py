@@ -52,6 +52,7 @@ from mirror.workflows.publish.publish import (
     write_metadata,
 )
 from mirror.workflows.scan.scan import (
+    extract_photo_features,
     geonames_scan,
     media_scan,
     read_albums,
@@ -62,13 +63,17 @@ from mirror.workflows.scan.scan import (
 )
 from mirror.workflows.scan.taxonomy import chain_binomial, lookup_binomial, taxonomy_scan
 from mirror.workflows.upload.upload import (
-    compute_contrasting_grey,
-    compute_image_mosaic,
+    analyse_photo,
+    encode_photo,
+    encode_video_hls,
+    encode_video_ladder,
     upload_media,
     upload_missing_photos,
     upload_missing_videos,
     upload_photo,
+    upload_photo_outbox,
     upload_video,
+    upload_video_hls,
     upload_video_thumbnail,
 )
 from mirror.workflows.website.website import (
@@ -103,6 +108,7 @@ SCOPE = {
     "audit_media": audit_media,
     "scan_media": scan_media,
     "media_scan": media_scan,
+    "extract_photo_features": extract_photo_features,
     "geonames_scan": geonames_scan,
     "wikidata_scan": wikidata_scan,
     "taxonomy_scan": taxonomy_scan,
@@ -111,12 +117,16 @@ SCOPE = {
     "read_albums": read_albums,
     "read_photos": read_photos,
     "read_videos": read_videos,
-    "compute_contrasting_grey": compute_contrasting_grey,
-    "compute_image_mosaic": compute_image_mosaic,
+    "analyse_photo": analyse_photo,
+    "encode_photo": encode_photo,
     "upload_photo": upload_photo,
+    "upload_photo_outbox": upload_photo_outbox,
     "upload_missing_photos": upload_missing_photos,
     "upload_video_thumbnail": upload_video_thumbnail,
+    "encode_video_ladder": encode_video_ladder,
     "upload_video": upload_video,
+    "encode_video_hls": encode_video_hls,
+    "upload_video_hls": upload_video_hls,
     "upload_missing_videos": upload_missing_videos,
     "upload_media": upload_media,
     "publish_env": publish_env,
@@ -1,4 +1,5 @@
 from .scan import (
+    extract_photo_features,
     geonames_scan,
     media_scan,
     read_albums,
@@ -9,6 +10,7 @@ from .scan import (
 )
 
 __all__ = [
+    "extract_photo_features",
     "geonames_scan",
     "media_scan",
     "read_albums",
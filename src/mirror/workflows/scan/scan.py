@@ -17,40 +17,60 @@ from mirror.services.metadata import (
     MarkdownTablePhotoMetadataReader,
     MarkdownTableVideoMetadataReader,
 )
-from mirror.services.vault_sync import VaultIndexSync
 from mirror.workflows.output import workflow_output
+from mirror.workflows.scan.types import FeatureChunkInput
 from mirror.workflows.scan.utils import (
     DEFAULT_ALBUMS_MARKDOWN_PATH,
     DEFAULT_PHOTOS_MARKDOWN_PATH,
     DEFAULT_VIDEOS_MARKDOWN_PATH,
     ScanOpts,
-    index_media_files,
+    describe_removed_media,
+    extract_features,
     list_geonames_from_metadata,
     list_unsaved_binomials,
-    list_unsaved_exifs,
-    list_unsaved_phashes,
     scan_geoname_wikidata,
+    scan_vault,
     write_miscellaneous_permalinks,
 )
 
 
 def media_scan(ctx: JobContext, input: dict) -> Generator[Any, Any, dict]:
-    """Scan media files in the vault and index them in the database"""
+    """Scan media files in the vault and index them in the database.
+
+    The vault is listed once into a manifest that every stage below reads. Albums whose
+    Published directory is unchanged since the last scan reuse the stored file state rather
+    than being listed again; `force_rescan` lists and checks every album. EXIF and phash
+    extraction decode every new image, so it fans out one job per chunk of photos rather
+    than running in this job."""
     dpath = input.get("dpath", PHOTO_DIRECTORY)
+    force_rescan = input.get("force_rescan", False)
 
     with SqliteDatabase(DATABASE_PATH) as db:
         db.refresh_dependent_views()
+        chunks, removed = scan_vault(db, dpath, force_rescan)
 
-        current_fpaths = index_media_files(db, dpath)
-        VaultIndexSync(db).remove_deleted_photos(current_fpaths)
+    if summary := describe_removed_media(removed):
+        yield workflow_output(summary)
 
-        db.exif_table().add_many(list_unsaved_exifs(db, dpath))
-        db.phashes_table().add_many(list_unsaved_phashes(db, dpath))
+    if chunks:
+        yield await_all([ctx.scope.extract_photo_features(chunk) for chunk in chunks])
 
     return {"complete": True}
     yield
 
 
+def extract_photo_features(ctx: JobContext, input: FeatureChunkInput) -> Generator[Any, Any, dict]:
+    """Read EXIF and perceptual hashes for one chunk of photos, then bulk-write both."""
+    exifs, phashes = extract_features(input)
+
+    with SqliteDatabase(DATABASE_PATH) as db:
+        db.exif_table().add_many(exifs)
+        db.phashes_table().add_many(phashes)
+
+    return {"exifs": len(exifs), "phashes": len(phashes)}
+    yield
+
+
 def geonames_scan(ctx: JobContext, input: dict) -> Generator[Any, Any, dict]:
     """Scan geonames from external API and store in database"""
     if not GEONAMES_USERNAME:
@@ -166,7 +186,10 @@ def scan_media(ctx: JobContext, input: ScanOpts) -> Generator[Any, Any, None]:
     """Top-level scan orchestration workflow"""
     dpath = PHOTO_DIRECTORY
 
-    yield ctx.scope.media_scan({"dpath": dpath})
+    yield ctx.scope.media_scan({
+        "dpath": dpath,
+        "force_rescan": input.get("force_rescan", False),
+    })
 
     albums_md = input.get("albums_markdown_path") or DEFAULT_ALBUMS_MARKDOWN_PATH
     photos_md = input.get("photos_markdown_path") or DEFAULT_PHOTOS_MARKDOWN_PATH
@@ -9,6 +9,13 @@ class MediaScanInput(TypedDict, total=False):
     dpath: str
 
 
+class FeatureChunkInput(TypedDict):
+    """One chunk of photos to read EXIF and perceptual hashes from."""
+
+    exif_fpaths: list[str]
+    phash_fpaths: list[str]
+
+
 class MarkdownReadInput(TypedDict, total=False):
     markdown_path: str
 
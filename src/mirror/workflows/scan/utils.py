@@ -4,18 +4,25 @@ from __future__ import annotations
 
 from typing import Iterator, TypedDict
 
-from mirror.commons.constants import MISCELLANEOUS_ALBUM_ID, KnownRelations
+from mirror.commons.constants import (
+    FEATURE_EXTRACTION_CHUNK_SIZE,
+    MISCELLANEOUS_ALBUM_ID,
+    KnownRelations,
+)
 from mirror.commons.utils import is_miscellaneous_dpath
 from mirror.data.binomials import list_photo_binomials
 from mirror.data.geoname import GeonameMetadataReader
 from mirror.data.types import SemanticTriple
 from mirror.models.exif import ExifReader, PhotoExifData
+from mirror.models.manifest import ManifestEntry
 from mirror.models.media import IMedia
 from mirror.models.phash import PhashData, PHashReader
 from mirror.models.photo import Photo
 from mirror.models.video import Video
 from mirror.services.database import SqliteDatabase
-from mirror.services.vault import MediaVault
+from mirror.services.vault import MediaVault, VaultManifest
+from mirror.services.vault_sync import VaultIndexSync
+from mirror.workflows.scan.types import FeatureChunkInput
 
 DEFAULT_ALBUMS_MARKDOWN_PATH = "albums.md"
 DEFAULT_PHOTOS_MARKDOWN_PATH = "photos.md"
@@ -29,10 +36,10 @@ class ScanOpts(TypedDict, total=False):
     force_rescan: bool
 
 
-def list_media(dpath: str) -> Iterator[IMedia]:
-    """Return all media from the vault directories"""
+def list_media(manifest: VaultManifest) -> Iterator[IMedia]:
+    """Return all media from the vault manifest, checking each album has one cover"""
 
-    for album in MediaVault(dpath).albums():
+    for album in manifest.albums:
         # hidden miscellaneous albums have no album page, so need no cover
         if is_miscellaneous_dpath(album.dpath):
             yield from album.media()
@@ -50,50 +57,129 @@ def list_media(dpath: str) -> Iterator[IMedia]:
         yield from album.media()
 
 
-def list_unsaved_exifs(db: SqliteDatabase, dpath: str) -> Iterator[PhotoExifData]:
-    """Return exif data for all photos not in the database"""
+def list_photos_missing_features(
+    db: SqliteDatabase, manifest: VaultManifest, candidates: set[str]
+) -> tuple[list[str], list[str]]:
+    """Return the candidate photos with no stored EXIF row, and those with no stored phash."""
 
     exif_table = db.exif_table()
+    phash_table = db.phashes_table()
+
+    exif_fpaths: list[str] = []
+    phash_fpaths: list[str] = []
 
-    for media in list_media(dpath):
-        if not Photo.is_a(media.fpath):
+    for media in list_media(manifest):
+        if not isinstance(media, Photo) or media.fpath not in candidates:
             continue
 
         if not exif_table.has(media.fpath):
-            data = ExifReader.exif(media.fpath)  # type: ignore
-            if data is not None:
-                yield data
+            exif_fpaths.append(media.fpath)
 
+        if not phash_table.has(media.fpath):
+            phash_fpaths.append(media.fpath)
 
-def list_unsaved_phashes(db: SqliteDatabase, dpath: str) -> Iterator[PhashData]:
-    """Return phashes for all photos not already stored in the database"""
+    return exif_fpaths, phash_fpaths
 
-    phash_table = db.phashes_table()
 
-    for album in MediaVault(dpath).albums():
-        for media in album.media():
-            if not Photo.is_a(media.fpath):
-                continue
+def plan_feature_work(
+    db: SqliteDatabase,
+    manifest: VaultManifest,
+    previous: dict[str, ManifestEntry],
+    force_rescan: bool = False,
+) -> list[FeatureChunkInput]:
+    """Chunk the EXIF and phash work this scan needs.
+
+    Only photos that are new or changed since the previous file state are checked, plus
+    any indexed photo without a phash; the phash is written last, so its absence marks an
+    extraction that never finished. Features of files rewritten in place are dropped first
+    so they are read again, and their renditions marked stale so they are re-encoded at every
+    size they now fill."""
+    modified = manifest.modified_fpaths(previous)
+    db.exif_table().delete_many(modified)
+    db.phashes_table().delete_many(modified)
+    db.encoded_photos_table().mark_stale(modified)
+    db.unfilled_renditions_table().delete_many(modified)
+
+    if force_rescan:
+        candidates = manifest.fpaths()
+    else:
+        candidates = manifest.changed_fpaths(previous) | db.photos_table().list_without_phash()
+
+    exif_fpaths, phash_fpaths = list_photos_missing_features(db, manifest, candidates)
+    return chunk_feature_work(exif_fpaths, phash_fpaths)
+
+
+def chunk_feature_work(
+    exif_fpaths: list[str], phash_fpaths: list[str], size: int = FEATURE_EXTRACTION_CHUNK_SIZE
+) -> list[FeatureChunkInput]:
+    """Split pending EXIF and phash work into chunks, keeping both reads of a photo together."""
+    exif_pending = set(exif_fpaths)
+    phash_pending = set(phash_fpaths)
+    pending = sorted(exif_pending | phash_pending)
+
+    chunks: list[FeatureChunkInput] = []
+    for start in range(0, len(pending), size):
+        chunk = pending[start : start + size]
+        chunks.append({
+            "exif_fpaths": [fpath for fpath in chunk if fpath in exif_pending],
+            "phash_fpaths": [fpath for fpath in chunk if fpath in phash_pending],
+        })
+
+    return chunks
+
 
-            if not phash_table.has(media.fpath):
-                yield PHashReader.phash(media.fpath)
+def extract_features(chunk: FeatureChunkInput) -> tuple[list[PhotoExifData], list[PhashData]]:
+    """Read EXIF and perceptual hashes for one chunk. Photos without EXIF yield no row."""
+    exifs = [exif for fpath in chunk["exif_fpaths"] if (exif := ExifReader.exif(fpath))]
+    phashes = [PHashReader.phash(fpath) for fpath in chunk["phash_fpaths"]]
 
+    return exifs, phashes
 
-def index_media_files(db: SqliteDatabase, dpath: str) -> set[str]:
-    """Index photos and videos under dpath; return the fpaths seen."""
-    photos_table = db.photos_table()
-    videos_table = db.videos_table()
 
-    current_fpaths = set()
-    for entry in list_media(dpath):
+def index_media_files(db: SqliteDatabase, manifest: VaultManifest) -> set[str]:
+    """Index photos and videos in the manifest, one bulk write per table; return the fpaths
+    seen."""
+    photo_fpaths: list[str] = []
+    video_fpaths: list[str] = []
+
+    for entry in list_media(manifest):
         if isinstance(entry, Photo):
-            photos_table.add(entry.fpath)
-            current_fpaths.add(entry.fpath)
+            photo_fpaths.append(entry.fpath)
         elif isinstance(entry, Video):
-            videos_table.add(entry.fpath)
-            current_fpaths.add(entry.fpath)
+            video_fpaths.append(entry.fpath)
+
+    db.photos_table().add_many(photo_fpaths)
+    db.videos_table().add_many(video_fpaths)
+
+    return set(photo_fpaths) | set(video_fpaths)
+
+
+def scan_vault(
+    db: SqliteDatabase, dpath: str, force_rescan: bool
+) -> tuple[list[FeatureChunkInput], dict[str, int]]:
+    """List the vault against the stored file state, index and prune media, and record the
+    new file state. Returns the feature-extraction chunks still to run, and the rows removed
+    per table for media no longer in the vault."""
+    file_state = db.file_state_table()
+    previous = file_state.snapshot()
+    manifest = MediaVault(dpath).manifest(None if force_rescan else previous)
+
+    index_media_files(db, manifest)
+    removed = VaultIndexSync(db).remove_deleted_media(manifest)
+
+    chunks = plan_feature_work(db, manifest, previous, force_rescan)
+    file_state.replace_all(manifest.snapshot())
+
+    return chunks, removed
+
+
+def describe_removed_media(removed: dict[str, int]) -> str | None:
+    """Summarise the rows removed for deleted media, or None when nothing was removed."""
+    counts = [f"{count} {table}" for table, count in removed.items() if count]
+    if not counts:
+        return None
 
-    return current_fpaths
+    return f"removed deleted media: {', '.join(counts)}"
 
 
 def scan_geoname_wikidata(db: SqliteDatabase, wikidata_client) -> None:
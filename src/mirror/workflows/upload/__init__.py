@@ -1,21 +1,29 @@
 from .upload import (
-    compute_contrasting_grey,
-    compute_image_mosaic,
+    analyse_photo,
+    encode_photo,
+    encode_video_hls,
+    encode_video_ladder,
     upload_media,
     upload_missing_photos,
     upload_missing_videos,
     upload_photo,
+    upload_photo_outbox,
     upload_video,
+    upload_video_hls,
     upload_video_thumbnail,
 )
 
 __all__ = [
-    "compute_contrasting_grey",
-    "compute_image_mosaic",
+    "analyse_photo",
+    "encode_photo",
+    "encode_video_hls",
+    "encode_video_ladder",
     "upload_media",
     "upload_missing_photos",
     "upload_missing_videos",
     "upload_photo",
+    "upload_photo_outbox",
     "upload_video",
+    "upload_video_hls",
     "upload_video_thumbnail",
 ]
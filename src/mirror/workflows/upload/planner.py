@@ -0,0 +1,204 @@
+"""Plan upload work for the whole library in a few grouped queries.
+
+Each photo's rendition status is pivoted out of encoded_photos in one pass, rather than
+queried photo by photo, so planning stays fast however large the library grows."""
+
+from __future__ import annotations
+
+import json
+from collections import Counter
+from typing import Iterable, Iterator
+
+from mirror.commons.config import DATABASE_PATH
+from mirror.commons.constants import (
+    STALE_RENDITION_LIMIT,
+    THUMBHASH_ROLES,
+    VIDEO_ENCODINGS,
+    VIDEO_HLS_ROLE,
+)
+from mirror.commons.utils import encoding_fingerprint
+from mirror.services.database import SqliteDatabase
+from mirror.workflows.upload.selective import SELECTIVE_ROLE_FILTERS, selected_fpaths
+from mirror.workflows.upload.utils import UploadOpts, tier_encodings
+
+# One row per photo: has it a contrasting grey, how many current (non-hex) mosaics, how
+# many of the roles generated for every photo it is too small to fill, and how many of the
+# rest it has uploaded, and uploaded with the role's current parameters. :roles maps each
+# such role, and each mosaic role, to its current parameter fingerprint and whether it is a
+# mosaic role
+PHOTO_WORK_QUERY = """
+with roles(role, params_hash, is_mosaic) as materialized (
+  select key, json_extract(value, '$[0]'), json_extract(value, '$[1]') from json_each(:roles)
+),
+pivot as (
+  select
+    encoded_photos.fpath,
+    sum(roles.is_mosaic and substr(encoded_photos.url, 1, 1) != '#') as mosaics,
+    sum(roles.params_hash is not null and trim(encoded_photos.url) != '') as published,
+    sum(
+      roles.params_hash is not null
+      and trim(encoded_photos.url) != ''
+      and encoded_photos.params_hash = roles.params_hash
+    ) as current
+  from encoded_photos
+  join roles on encoded_photos.role = roles.role
+  group by encoded_photos.fpath
+),
+unfilled as (
+  select unfilled_renditions.fpath, count(*) as unfilled
+  from unfilled_renditions
+  join roles on unfilled_renditions.role = roles.role and roles.params_hash is not null
+  group by unfilled_renditions.fpath
+)
+select
+  photos.fpath,
+  photo_icons.fpath is not null as has_grey,
+  coalesce(pivot.mosaics, 0) as mosaics,
+  coalesce(unfilled.unfilled, 0) as unfilled,
+  coalesce(pivot.published, 0) as published,
+  coalesce(pivot.current, 0) as current
+from photos
+left join photo_icons on photo_icons.fpath = photos.fpath
+left join pivot on pivot.fpath = photos.fpath
+left join unfilled on unfilled.fpath = photos.fpath
+order by photos.rowid
+"""
+
+# Uploaded renditions of the selective roles, which only a few photos have
+SELECTIVE_RENDITIONS_QUERY = """
+select fpath, role, params_hash from encoded_photos
+where role in (select value from json_each(:roles)) and trim(url) != ''
+"""
+
+# Videos missing any of their roles
+VIDEO_WORK_QUERY = """
+select videos.fpath from videos
+left join encoded_videos
+  on encoded_videos.fpath = videos.fpath
+  and encoded_videos.role in (select value from json_each(:roles))
+  and trim(encoded_videos.url) != ''
+group by videos.fpath
+having count(distinct encoded_videos.role) < :role_count
+order by videos.rowid
+"""
+
+
+def common_role_params(tiers: Iterable[str] | None = None) -> dict:
+    """PHOTO_WORK_QUERY parameters: the roles in `tiers` generated for every photo, and the
+    mosaic roles, as JSON."""
+    roles = {
+        role: [encoding_fingerprint(params), False]
+        for role, params in tier_encodings(tiers).items()
+        if role not in SELECTIVE_ROLE_FILTERS
+    }
+    roles |= {role: [None, True] for role in THUMBHASH_ROLES}
+
+    return {"roles": json.dumps(roles)}
+
+
+def selective_role_counts(
+    db: SqliteDatabase, tiers: Iterable[str] | None = None
+) -> tuple[Counter, Counter, Counter]:
+    """Per photo, how many selective roles in `tiers` it is generated for, has uploaded,
+    and has uploaded with the role's current parameters. Each role's selection is evaluated
+    once for the whole library."""
+    selective = {
+        role: encoding_fingerprint(params)
+        for role, params in tier_encodings(tiers).items()
+        if role in SELECTIVE_ROLE_FILTERS
+    }
+    selections = selected_fpaths(db.photos_table().list())
+    selected = {
+        (fpath, role)
+        for role, fpaths in selections.items()
+        if role in selective
+        for fpath in fpaths
+    }
+
+    wanted, published, current = Counter(fpath for fpath, _ in selected), Counter(), Counter()
+    rows = db.conn.execute(SELECTIVE_RENDITIONS_QUERY, {"roles": json.dumps(list(selective))})
+    for fpath, role, params_hash in rows:
+        if (fpath, role) in selected:
+            published[fpath] += 1
+            current[fpath] += params_hash == selective[role]
+
+    return wanted, published, current
+
+
+def photo_work_rows(
+    db: SqliteDatabase, upload_images: bool, tiers: Iterable[str] | None = None
+) -> Iterator[tuple]:
+    """Each photo's fpath, whether it has a grey, its current mosaic count, and how many
+    roles in `tiers` it wants, has uploaded, and has current. Selective roles are only
+    counted when photos are uploaded; otherwise the role counts go unused. Rungs the photo
+    is too small to fill are not wanted."""
+    db.photo_icon_table()
+    db.encoded_photos_table()
+    db.unfilled_renditions_table()
+
+    no_counts = (Counter(), Counter(), Counter())
+    counts = selective_role_counts(db, tiers) if upload_images else no_counts
+    selective_wanted, selective_published, selective_current = counts
+    common_roles = sum(role not in SELECTIVE_ROLE_FILTERS for role in tier_encodings(tiers))
+
+    for fpath, has_grey, mosaics, unfilled, published, current in db.conn.execute(
+        PHOTO_WORK_QUERY, common_role_params(tiers)
+    ):
+        yield (
+            fpath,
+            has_grey,
+            mosaics,
+            common_roles - unfilled + selective_wanted[fpath],
+            published + selective_published[fpath],
+            current + selective_current[fpath],
+        )
+
+
+def plan_photo_work(
+    db: SqliteDatabase, input: UploadOpts, stale_limit: int = STALE_RENDITION_LIMIT
+) -> tuple[list, list, list]:
+    """fpaths needing grey, mosaic, and photo-upload work, for the roles in the input's
+    tiers.
+
+    Photos with a role never uploaded are uploaded, then at most `stale_limit` photos whose
+    only pending roles were encoded with since-changed parameters. Re-encoding after a
+    parameter change is spread over several runs, so it never holds up a publish."""
+    photo_force = input.get("force_upload_images", False) or bool(input.get("force_roles"))
+    grey_fpaths, mosaic_fpaths, missing_fpaths, stale_fpaths = [], [], [], []
+
+    rows = photo_work_rows(db, bool(input.get("upload_images")), input.get("tiers"))
+    for fpath, has_grey, mosaics, wanted, published, current in rows:
+        if not has_grey or input.get("force_recompute_grey", False):
+            grey_fpaths.append(fpath)
+        if mosaics < len(THUMBHASH_ROLES) or input.get("force_recompute_mosaic", False):
+            mosaic_fpaths.append(fpath)
+
+        if photo_force or published < wanted:
+            missing_fpaths.append(fpath)
+        elif current < published:
+            stale_fpaths.append(fpath)
+
+    photo_fpaths = missing_fpaths + stale_fpaths[:stale_limit]
+    return grey_fpaths, mosaic_fpaths, photo_fpaths if input.get("upload_images") else []
+
+
+def plan_video_work(db: SqliteDatabase) -> list[str]:
+    """Videos with a role not yet uploaded."""
+    db.encoded_videos_table()
+    roles = [role for role, _ in VIDEO_ENCODINGS] + [VIDEO_HLS_ROLE]
+
+    rows = db.conn.execute(VIDEO_WORK_QUERY, {"roles": json.dumps(roles), "role_count": len(roles)})
+    return [fpath for (fpath,) in rows]
+
+
+def plan_upload_work(input: UploadOpts) -> tuple[list, list, list, list]:
+    """fpaths needing grey, mosaic, photo-upload, and video-upload work."""
+    stale_limit = input.get("reencode_limit")
+    if stale_limit is None:
+        stale_limit = STALE_RENDITION_LIMIT
+
+    with SqliteDatabase(DATABASE_PATH) as db:
+        grey_fpaths, mosaic_fpaths, photo_fpaths = plan_photo_work(db, input, stale_limit)
+        video_fpaths = plan_video_work(db) if input.get("upload_videos") else []
+
+    return grey_fpaths, mosaic_fpaths, photo_fpaths, video_fpaths
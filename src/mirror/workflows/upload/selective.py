@@ -6,6 +6,7 @@ big rendition for all 1400+ photos.
 """
 
 from functools import cache
+from typing import Iterable
 
 from mirror.commons.config import DATABASE_PATH
 from mirror.data.covers import cover_fpaths, person_photo_fpaths
@@ -60,3 +61,14 @@ def is_role_skipped(role: str, fpath: str) -> bool:
     """Whether this selective role should be skipped for this source file."""
     selector = SELECTIVE_ROLE_FILTERS.get(role)
     return selector is not None and not selector(fpath)
+
+
+def selected_fpaths(fpaths: Iterable[str]) -> dict[str, list[str]]:
+    """For each selective role, the files among `fpaths` it is generated for.
+
+    Each role's selection is gathered once for the whole batch, rather than per photo."""
+    fpaths = list(fpaths)
+    return {
+        role: [fpath for fpath in fpaths if selector(fpath)]
+        for role, selector in SELECTIVE_ROLE_FILTERS.items()
+    }
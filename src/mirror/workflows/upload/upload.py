@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from collections import Counter
 from collections.abc import Generator
 from typing import Any
 
@@ -8,134 +9,258 @@ from zahir import (
     await_all,
     concurrency_dependency,
     resource_dependency,
+    semaphore_dependency,
     sqlite_dependency,
 )
 
-from mirror.commons.config import DATABASE_PATH
+from mirror.commons.config import (
+    DATABASE_PATH,
+    PHOTO_ENCODE_CONCURRENCY,
+    VIDEO_ENCODE_CONCURRENCY,
+    VIDEO_STREAM_UPLOAD,
+)
 from mirror.commons.constants import (
     FULL_SIZED_VIDEO_ROLE,
-    THUMBHASH_ROLES,
+    PHOTO_CDN_CONCURRENCY,
+    PHOTO_CDN_MAX_CONCURRENCY,
+    PHOTO_CDN_MIN_CONCURRENCY,
+    PHOTO_OUTBOX_POLL_SECONDS,
+    PHOTO_UPLOAD_QUEUE_DEPTH,
+    VIDEO_CDN_CONCURRENCY,
     VIDEO_ENCODINGS,
+    VIDEO_HLS_ROLE,
 )
 from mirror.commons.exceptions import InvalidVideoDimensionsError
 from mirror.services.cdn import CDN
+from mirror.services.cdn_inventory import CdnInventory
 from mirror.services.database import SqliteDatabase
-from mirror.services.encoder import PhotoEncoder
+from mirror.services.encoder import PhotoEncoder, VideoEncoder
+from mirror.services.uploader import AimdController, PhotoUploader
+from mirror.services.video_probe import VideoProber
+from mirror.workflows.output import workflow_output
+from mirror.workflows.upload.planner import plan_upload_work
 from mirror.workflows.upload.utils import (
     PhotoJobInput,
     UploadOpts,
-    list_upload_work,
+    VideoJobInput,
+    describe_cdn_reconciliation,
+    encode_into_outbox,
+    hls_encoding,
+    is_outbox_drained,
+    is_past_deadline,
+    is_silent,
+    longest_first,
+    pending_renditions,
+    photo_upload_semaphore,
     publish_video_encoding,
+    publish_video_hls,
     publish_video_thumbnail,
-    roles_needing_upload,
+    queued_uploads,
+    reconcile_cdn,
+    rendition_cache,
+    settle_upload,
+    start_upload_run,
+    start_uploads,
+    videos_to_encode,
 )
 
 
-def compute_contrasting_grey(ctx: JobContext, input: PhotoJobInput) -> Generator[Any, Any, None]:
+def analyse_photo(ctx: JobContext, input: PhotoJobInput) -> Generator[Any, Any, None]:
+    """Compute a photo's contrasting grey and thumbhash from one decode, and store both in
+    one transaction."""
     fpath = input["fpath"]
+    analysis = PhotoEncoder.analyse(fpath)
 
     with SqliteDatabase(DATABASE_PATH) as db:
-        icons = db.photo_icon_table()
-        grey_value = PhotoEncoder.compute_contrasting_grey(fpath)
-        icons.add(fpath, grey_value)
+        db.photo_analysis_table().add(analysis)
 
     return None
     yield
 
 
-def compute_image_mosaic(ctx: JobContext, input: PhotoJobInput) -> Generator[Any, Any, None]:
-    fpath = input["fpath"]
+_VIDEO_CDN_LIMIT = "global_video_cdn_limit"
+_VIDEO_ENCODE_LIMIT = "global_video_encode_limit"
+_PHOTO_ENCODE_LIMIT = "global_photo_encode_limit"
+_PHOTO_PIPELINE_LIMIT = "global_photo_pipeline_limit"
 
-    with SqliteDatabase(DATABASE_PATH) as db:
-        encoded_photos_table = db.encoded_photos_table()
-        placeholder = PhotoEncoder.encode_thumbhash(fpath)
-        for role in THUMBHASH_ROLES:
-            encoded_photos_table.add(fpath, placeholder, role, "thumbhash")
 
-    return None
-    yield
+def encode_photo(ctx: JobContext, input: dict) -> Generator[Any, Any, list]:
+    """Encode every pending role of one photo from a single decode, spool the results, and
+    queue each in the upload outbox for the run's uploader.
 
+    Runs under its own CPU gate, one slot per physical core, so encoding never occupies
+    an upload slot. Renditions already in the local cache are not re-encoded, and
+    quality-targeted roles reuse the quality chosen for them before. Once the run's
+    deadline has passed, photos still waiting on the gate are left unencoded."""
+    yield from concurrency_dependency(_PHOTO_ENCODE_LIMIT, limit=PHOTO_ENCODE_CONCURRENCY)
 
-_PHOTO_CDN_LIMIT = "global_photo_cdn_limit"
-_VIDEO_CDN_LIMIT = "global_video_cdn_limit"
+    if is_past_deadline(input.get("deadline")):
+        return []
 
+    renditions = [(role, params) for role, params in input["renditions"]]
+    tasks = encode_into_outbox(input["fpath"], renditions)
 
-def upload_photo(ctx: JobContext, input: dict) -> Generator[Any, Any, dict]:
-    fpath = input["fpath"]
-    role = input["role"]
-    params = input["params"]
+    return [task.role for task in tasks]
 
-    # Encode before taking a CDN slot, so CPU work does not occupy the upload gate
-    encoded_data = PhotoEncoder.encode(fpath, role, params)
 
-    yield from concurrency_dependency(_PHOTO_CDN_LIMIT, limit=6)
+def upload_photo_outbox(ctx: JobContext, input: dict) -> Generator[Any, Any, None]:
+    """The run's one photo uploader. Uploads renditions of the run's tiers as they are
+    queued in the outbox, over a single connection pool, until every planned photo is
+    encoded and nothing is left that it may try this run.
 
-    cdn = CDN()
-    uploaded_url = cdn.upload_photo(
-        encoded_data=encoded_data,
-        role=role,
-        format=params["format"],
-    )
+    How many uploads run at once is adjusted to the throughput and errors observed, so a
+    fast link is filled and a congested one backed off. Each upload's latency and
+    throughput go to the event log."""
+    run_id, tiers = input["run_id"], input.get("tiers")
+    controller = AimdController((
+        PHOTO_CDN_MIN_CONCURRENCY,
+        PHOTO_CDN_CONCURRENCY,
+        PHOTO_CDN_MAX_CONCURRENCY,
+    ))
+    uploader, tries = PhotoUploader(controller), Counter()
 
     with SqliteDatabase(DATABASE_PATH) as db:
-        db.encoded_photos_table().add(fpath, uploaded_url, role, params["format"])
+        inventory = CdnInventory(uploader.cdn, db.cdn_objects_table())
+        while True:
+            queued = queued_uploads(db, tiers)
+            if is_outbox_drained(
+                db.upload_runs_table().is_encoded(run_id), queued, uploader, tries
+            ):
+                break
 
-    yield from sqlite_dependency(
-        DATABASE_PATH,
-        "select case when exists("
-        "select 1 from encoded_photos where fpath = ? and role = ? and url = ?"
-        ") then 'satisfied' else 'impossible' end as status",
-        (fpath, role, uploaded_url),
-    )
+            yield from start_uploads(queued, uploader, tries)
+            for report in uploader.completed(timeout=PHOTO_OUTBOX_POLL_SECONDS):
+                yield from settle_upload(db, inventory, report, tries)
 
-    return {"fpath": fpath, "role": role, "url": uploaded_url}
+        db.upload_runs_table().finish(run_id)
 
+    uploader.close()
 
-def upload_missing_photos(ctx: JobContext, input: PhotoJobInput) -> Generator[Any, Any, None]:
-    fpath = input["fpath"]
-    force = input.get("force", False)
-    force_roles = set(input.get("force_roles") or [])
 
+def upload_photo(ctx: JobContext, input: dict) -> Generator[Any, Any, None]:
+    """Proxy job that completes when the uploader is done with one rendition: it is
+    uploaded, or left queued for the next run."""
+    yield from semaphore_dependency(photo_upload_semaphore(input["fpath"], input["role"]))
+    return None
+    yield
+
+
+def queue_missing_photo(ctx: JobContext, input: PhotoJobInput) -> Generator[Any, Any, list]:
+    """Plan a photo's pending roles and encode those not already queued in the outbox.
+    Returns every role the uploader is to upload for it."""
     with SqliteDatabase(DATABASE_PATH) as db:
-        encodings = list(db.encoded_photos_table().list_for_file(fpath))
+        queued, to_encode = pending_renditions(db, input)
+    if not queued and not to_encode:
+        return []
+
+    yield from concurrency_dependency(
+        _PHOTO_PIPELINE_LIMIT, limit=PHOTO_ENCODE_CONCURRENCY + PHOTO_UPLOAD_QUEUE_DEPTH
+    )
+    if not to_encode:
+        return list(queued)
+
+    encoded = yield ctx.scope.encode_photo({
+        "fpath": input["fpath"],
+        "run_id": input["run_id"],
+        "renditions": to_encode,
+        "deadline": input.get("deadline"),
+    })
+    return [*queued, *encoded]
 
-    published_roles = {enc.role for enc in encodings if enc.url and enc.url.strip()}
 
-    upload_roles = roles_needing_upload(fpath, published_roles, force, force_roles)
+def upload_missing_photos(ctx: JobContext, input: PhotoJobInput) -> Generator[Any, Any, None]:
+    """Encode a photo's pending roles into the outbox, then wait on the uploader for them.
+
+    Roles encoded by an earlier, interrupted run are uploaded from the outbox without
+    re-encoding. The pipeline gate bounds how many photos are between encoding and upload,
+    so the spool stays small while encoded photos queue ahead of the uplink."""
+    fpath, roles = input["fpath"], []
 
-    effects = []
-    for role, params in upload_roles:
-        job_input = {"fpath": fpath, "role": role, "params": params}
-        effects.append(ctx.scope.upload_photo(job_input))
+    try:
+        roles = yield from queue_missing_photo(ctx, input)
+    finally:
+        # counted however planning or encoding ends, or the uploader waits on it forever
+        with SqliteDatabase(DATABASE_PATH) as db:
+            db.upload_runs_table().photo_encoded(input["run_id"])
 
-    if effects:
-        yield await_all(effects)
+    if roles:
+        yield await_all([ctx.scope.upload_photo({"fpath": fpath, "role": role}) for role in roles])
 
 
 def upload_video_thumbnail(ctx: JobContext, input: dict) -> Generator[Any, Any, dict]:
     fpath = input["fpath"]
-    encoded_path = input["encoded_path"]
+    frame_fpath = input["frame_fpath"]
 
     cdn = CDN()
     with SqliteDatabase(DATABASE_PATH) as db:
-        publish_video_thumbnail(cdn, db, fpath, encoded_path)
+        publish_video_thumbnail(cdn, db, fpath, frame_fpath)
 
     return {"fpath": fpath}
     yield
 
 
-def upload_video(ctx: JobContext, input: dict) -> Generator[Any, Any, dict]:
+def encode_video_ladder(ctx: JobContext, input: dict) -> Generator[Any, Any, dict]:
+    """Encode a video's missing roles in one ffmpeg run that decodes the source once.
+
+    Roles already on the CDN, or left encoded by an interrupted upload, are not encoded;
+    nor are roles larger than the source, which upload_video then reports as undersized."""
     fpath = input["fpath"]
-    role = input["role"]
-    params = input["params"]
+    renditions = [(role, params) for role, params in input["renditions"]]
 
-    yield from concurrency_dependency(_VIDEO_CDN_LIMIT, limit=2)
+    yield from concurrency_dependency(_VIDEO_ENCODE_LIMIT, limit=VIDEO_ENCODE_CONCURRENCY)
     yield from resource_dependency("memory", max_percent=65)
 
+    with SqliteDatabase(DATABASE_PATH) as db:
+        pending = videos_to_encode(CDN(), db, fpath, renditions)
+        probe = VideoProber(db.video_probe_table()).probe(fpath) if pending else None
+
+    if not probe:
+        return {}
+
+    encoded = VideoEncoder.encode_ladder(probe, pending, share_audio=is_silent(fpath))
+    return {
+        role: encoded[name]
+        for role, params in renditions
+        if (name := CDN.video_name(fpath, params, "mp4")) in encoded
+    }
+
+
+def encode_video_hls(ctx: JobContext, input: dict) -> Generator[Any, Any, dict]:
+    """Encode a video's adaptive-streaming variants as CMAF segments and HLS playlists, in
+    one ffmpeg run that decodes the source once."""
+    fpath = input["fpath"]
+
+    yield from concurrency_dependency(_VIDEO_ENCODE_LIMIT, limit=VIDEO_ENCODE_CONCURRENCY)
+    yield from resource_dependency("memory", max_percent=65)
+
+    with SqliteDatabase(DATABASE_PATH) as db:
+        return {"dpath": hls_encoding(db, fpath)}
+
+
+def upload_video_hls(ctx: JobContext, input: dict) -> Generator[Any, Any, dict]:
+    """Encode, then upload a video's segments and playlists under one prefix, and record its
+    master playlist. The encode runs on the encode gate, the upload on the CDN gate."""
+    fpath = input["fpath"]
+
+    encoded = yield ctx.scope.encode_video_hls({"fpath": fpath})
+    yield from concurrency_dependency(_VIDEO_CDN_LIMIT, limit=VIDEO_CDN_CONCURRENCY)
+
+    with SqliteDatabase(DATABASE_PATH) as db:
+        publish_video_hls(CDN(), db, fpath, encoded["dpath"])
+
+    return {"fpath": fpath, "role": VIDEO_HLS_ROLE}
+
+
+def upload_video(ctx: JobContext, input: VideoJobInput) -> Generator[Any, Any, dict]:
+    fpath = input["fpath"]
+    role = input["role"]
+
+    yield from concurrency_dependency(_VIDEO_CDN_LIMIT, limit=VIDEO_CDN_CONCURRENCY)
+
     cdn = CDN()
     with SqliteDatabase(DATABASE_PATH) as db:
         try:
-            encoded_path = publish_video_encoding(cdn, db, fpath, (role, params))
+            frame_fpath = yield from publish_video_encoding(cdn, db, input)
         except InvalidVideoDimensionsError:
             return {"fpath": fpath, "role": role}
 
@@ -148,8 +273,8 @@ def upload_video(ctx: JobContext, input: dict) -> Generator[Any, Any, dict]:
         (fpath, role),
     )
 
-    if role == FULL_SIZED_VIDEO_ROLE and encoded_path:
-        yield ctx.scope.upload_video_thumbnail({"fpath": fpath, "encoded_path": encoded_path})
+    if role == FULL_SIZED_VIDEO_ROLE and frame_fpath:
+        yield ctx.scope.upload_video_thumbnail({"fpath": fpath, "frame_fpath": frame_fpath})
 
     return {"fpath": fpath, "role": role}
 
@@ -161,11 +286,26 @@ def upload_missing_videos(ctx: JobContext, input: PhotoJobInput) -> Generator[An
         encodings = list(db.encoded_videos_table().list_for_file(fpath))
 
     published_roles = {enc.role for enc in encodings}
+    missing = [(role, params) for role, params in VIDEO_ENCODINGS if role not in published_roles]
+    encoded = {}
+    # streamed roles are encoded as they upload, so there is no ladder to run first
+    if missing and not VIDEO_STREAM_UPLOAD:
+        encoded = yield ctx.scope.encode_video_ladder({"fpath": fpath, "renditions": missing})
+
+    uploads = [
+        ctx.scope.upload_video({
+            "fpath": fpath,
+            "role": role,
+            "params": params,
+            "encoded_path": encoded.get(role),
+        })
+        for role, params in missing
+    ]
+    if VIDEO_HLS_ROLE not in published_roles:
+        uploads.append(ctx.scope.upload_video_hls({"fpath": fpath}))
 
-    for role, params in VIDEO_ENCODINGS:
-        if role in published_roles:
-            continue
-        yield ctx.scope.upload_video({"fpath": fpath, "role": role, "params": params})
+    # roles upload in parallel on the CDN gate, leaving the encode gate to the next video
+    yield await_all(uploads)
 
     yield from sqlite_dependency(
         DATABASE_PATH,
@@ -182,41 +322,60 @@ def upload_missing_videos(ctx: JobContext, input: PhotoJobInput) -> Generator[An
 
 
 def media_upload_effects(ctx: JobContext, input: UploadOpts, work: tuple) -> Generator[list]:
-    """Effect batches for the grey, mosaic, and photo-upload work lists."""
+    """Effect batches for the analysis and photo-upload work lists. A photo needing either
+    its grey or its mosaic is analysed once, computing both."""
     grey_fpaths, mosaic_fpaths, photo_fpaths = work
-    force_grey = input.get("force_recompute_grey", False)
-    force_mosaic = input.get("force_recompute_mosaic", False)
     force_images = input.get("force_upload_images", False)
     force_roles = input.get("force_roles") or []
 
     yield [
-        ctx.scope.compute_contrasting_grey({"fpath": fpath, "force": force_grey})
-        for fpath in grey_fpaths
-    ]
-    yield [
-        ctx.scope.compute_image_mosaic({"fpath": fpath, "force": force_mosaic})
-        for fpath in mosaic_fpaths
+        ctx.scope.analyse_photo({"fpath": fpath})
+        for fpath in dict.fromkeys([*grey_fpaths, *mosaic_fpaths])
     ]
+    if not photo_fpaths:
+        return
+
+    # the uploader runs alongside the photos it uploads for, and finishes after them
+    run_id, tiers = start_upload_run(len(photo_fpaths)), input.get("tiers")
     yield [
-        ctx.scope.upload_missing_photos({
-            "fpath": fpath,
-            "force": force_images,
-            "force_roles": force_roles,
-        })
-        for fpath in photo_fpaths
+        ctx.scope.upload_photo_outbox({"run_id": run_id, "tiers": tiers}),
+        *[
+            ctx.scope.upload_missing_photos({
+                "fpath": fpath,
+                "run_id": run_id,
+                "force": force_images,
+                "force_roles": force_roles,
+                "tiers": tiers,
+                "deadline": input.get("deadline"),
+            })
+            for fpath in photo_fpaths
+        ],
     ]
 
 
 def upload_media(ctx: JobContext, input: UploadOpts) -> Generator[Any, Any, None]:
-    grey_fpaths, mosaic_fpaths, photo_fpaths, video_fpaths = list_upload_work(input)
+    grey_fpaths, mosaic_fpaths, photo_fpaths, video_fpaths = plan_upload_work(input)
+
+    if video_fpaths:
+        # one listing, stored for the upload jobs' existence checks
+        with SqliteDatabase(DATABASE_PATH) as db:
+            yield workflow_output(describe_cdn_reconciliation(reconcile_cdn(db)))
+            video_fpaths = longest_first(db, video_fpaths)
 
     batched_work = (grey_fpaths, mosaic_fpaths, photo_fpaths)
     for effects in media_upload_effects(ctx, input, batched_work):
         if effects:
             yield await_all(effects)
 
-    for fpath in video_fpaths:
-        yield ctx.scope.upload_missing_videos({
-            "fpath": fpath,
-            "force": input.get("force_upload_videos", False),
-        })
+    # every photo of the run is encoded by now, so the cache is trimmed once, not per miss
+    rendition_cache().evict()
+
+    # all videos are submitted at once, costliest first, so encodes on the encode gate
+    # overlap with earlier videos' uploads on the CDN gate
+    force_videos = input.get("force_upload_videos", False)
+    video_jobs = [
+        ctx.scope.upload_missing_videos({"fpath": fpath, "force": force_videos})
+        for fpath in video_fpaths
+    ]
+    if video_jobs:
+        yield await_all(video_jobs)
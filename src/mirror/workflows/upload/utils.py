@@ -1,19 +1,81 @@
 from __future__ import annotations
 
-from typing import Generator, Iterator, TypedDict
-
-from mirror.commons.config import DATABASE_PATH
-from mirror.commons.constants import IMAGE_ENCODINGS, THUMBHASH_ROLES, VIDEO_ENCODINGS
-from mirror.services.cdn import CDN
+import itertools
+import os
+import random
+import shutil
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Any, Generator, Iterable, Iterator, TypedDict
+
+from tertius import EEmit
+from zahir.core.commons.constants import DependencyState
+from zahir.core.effects import ESetState
+from zahir.core.telemetry.events import tagged_point
+
+from mirror.commons.config import (
+    DATABASE_PATH,
+    QUALITY_TARGETED_ENCODING,
+    RENDITION_CACHE_DIRECTORY,
+    RENDITION_CACHE_MAX_BYTES,
+    RENDITION_SPOOL_DIRECTORY,
+    UPLOAD_ATTEMPTS_PER_RUN,
+    UPLOAD_BACKOFF_BASE,
+    UPLOAD_BACKOFF_MAX,
+    VIDEO_STREAM_UPLOAD,
+    VIDEO_UPLOAD_PART_SIZE,
+)
+from mirror.commons.constants import (
+    CRITICAL_TIER,
+    DEFERRED_ROLES,
+    DEFERRED_TIER,
+    IMAGE_ENCODINGS,
+    QUALITY_TARGETS,
+    VIDEO_ENCODINGS,
+    VIDEO_HLS_PLAYLIST,
+    VIDEO_HLS_ROLE,
+    VIDEO_HLS_VARIANTS,
+)
+from mirror.commons.utils import deterministic_hash_str, encoding_fingerprint
+from mirror.models.photo import EncodedPhotoModel, PhotoContent, RenditionQuality
+from mirror.models.upload import (
+    CdnObject,
+    CdnReconciliation,
+    OutboxTask,
+    PartReport,
+    UploadReport,
+)
+from mirror.models.video import VideoProbe
+from mirror.services.cdn import CDN, upload_circuit
+from mirror.services.cdn_inventory import CdnInventory
 from mirror.services.database import SqliteDatabase
-from mirror.services.encoder import VideoEncoder
+from mirror.services.encoder import PhotoEncoder, VideoEncoder, video_output_fpath
+from mirror.services.rendition_cache import RenditionCache, source_digest
+from mirror.services.uploader import PhotoUploader
+from mirror.services.video_probe import VideoProber
 from mirror.workflows.upload.selective import is_role_skipped
 
+VIDEO_UPLOAD_PART_TAG = "video_upload_part"
+PHOTO_UPLOAD_TAG = "photo_upload"
+
+# Semaphore name prefix signalling the uploader is done with one rendition
+PHOTO_UPLOAD_SEMAPHORE = "photo_upload"
+
 
 class PhotoJobInput(TypedDict):
     fpath: str
 
 
+class VideoJobInput(TypedDict, total=False):
+    fpath: str
+    role: str
+    params: dict
+    # already encoded by encode_video_ladder, when it produced this role
+    encoded_path: str | None
+
+
 class UploadOpts(TypedDict, total=False):
     force_recompute_grey: bool
     force_recompute_mosaic: bool
@@ -22,6 +84,32 @@ class UploadOpts(TypedDict, total=False):
     force_roles: list[str] | None
     upload_images: bool | None
     upload_videos: bool | None
+    # Photos per run re-encoded because their role parameters changed
+    reencode_limit: int | None
+    # Rendition tiers to upload; every tier when unset
+    tiers: list[str] | None
+    # Time after which no more photos are encoded; none when unset
+    deadline: float | None
+
+
+def rendition_tier(role: str) -> str:
+    """The tier a photo role is uploaded in: deferred or critical."""
+    return DEFERRED_TIER if role in DEFERRED_ROLES else CRITICAL_TIER
+
+
+def tier_encodings(tiers: Iterable[str] | None) -> dict[str, dict]:
+    """IMAGE_ENCODINGS restricted to the roles in `tiers`; all of them when tiers is None."""
+    if tiers is None:
+        return IMAGE_ENCODINGS
+
+    return {
+        role: params for role, params in IMAGE_ENCODINGS.items() if rendition_tier(role) in tiers
+    }
+
+
+def is_past_deadline(deadline: float | None) -> bool:
+    """Has a run's time budget run out? Never, when it has none."""
+    return deadline is not None and time.time() >= deadline
 
 
 def is_legacy_mosaic(value: str) -> bool:
@@ -29,117 +117,199 @@ def is_legacy_mosaic(value: str) -> bool:
     return value.startswith("#")
 
 
-def list_photos_without_mosaic(db: SqliteDatabase, force_recompute: bool = False) -> Generator[str]:
-    photos = db.photos_table()
-    encoded_photos_table = db.encoded_photos_table()
+def is_rendition_current(published: dict[str, str | None], role: str, params: dict) -> bool:
+    """True when the role is uploaded and was encoded with its current parameters."""
+    return role in published and published[role] == encoding_fingerprint(params)
 
-    for fpath in photos.list():
-        encodings = list(encoded_photos_table.list_for_file(fpath))
-        role_values = {enc.role: enc.url for enc in encodings}
 
-        stale = any(
-            role not in role_values or is_legacy_mosaic(role_values[role])
-            for role in THUMBHASH_ROLES
-        )
-        if stale or force_recompute:
-            yield fpath
+def published_renditions(encodings: Iterable[EncodedPhotoModel]) -> dict[str, str | None]:
+    """The parameter fingerprint of each role with an uploaded rendition."""
+    return {enc.role: enc.params_hash for enc in encodings if enc.url and enc.url.strip()}
 
 
-def list_photos_without_contrasting_grey(
-    db: SqliteDatabase, force_recompute: bool = False
-) -> Iterator[str]:
-    photos = db.photos_table()
-    icons = db.photo_icon_table()
+def is_silent(fpath: str) -> bool:
+    """is a video silent?"""
+    return "+silent" not in fpath
 
-    for fpath in photos.list():
-        if not icons.get_by_fpath(fpath) or force_recompute:
-            yield fpath
 
+def resumable_encoding(db: SqliteDatabase, name: str) -> str | None:
+    """The encoded file of an interrupted upload, if it is still on disk unchanged."""
+    upload = db.multipart_uploads_table().get(name)
+    if not upload or not os.path.exists(upload.fpath):
+        return None
 
-def list_photos_without_upload(db: SqliteDatabase, force_upload: bool = False) -> Iterator[str]:
-    photos = db.photos_table()
+    stat = os.stat(upload.fpath)
+    if not upload.resumes(stat.st_size, stat.st_mtime_ns, VIDEO_UPLOAD_PART_SIZE):
+        return None
 
-    if force_upload:
-        yield from photos.list()
-        return
+    return upload.fpath
 
-    encoded_photos_table = db.encoded_photos_table()
 
-    for fpath in photos.list():
-        encodings = list(encoded_photos_table.list_for_file(fpath))
-        published_roles = {enc.role for enc in encodings}
+def part_telemetry(report: PartReport) -> EEmit:
+    """Telemetry event for one uploaded part, with its throughput."""
+    return EEmit(
+        tagged_point(
+            VIDEO_UPLOAD_PART_TAG,
+            {
+                "key": [report.key],
+                "part": [str(report.part_number)],
+                "bytes": [str(report.size)],
+                "mbps": [f"{report.megabits_per_second():.2f}"],
+            },
+        )
+    )
 
-        needs_upload = False
-        for role, _params in IMAGE_ENCODINGS.items():
-            if role in published_roles:
-                continue
 
-            if is_role_skipped(role, fpath):
-                continue
+def encode_video(db: SqliteDatabase, fpath: str, name: str, params: dict) -> str:
+    """Encode a video role, or reuse the encoded file of an interrupted upload."""
+    encoded_path = resumable_encoding(db, name) or VideoEncoder.encode(
+        probe=VideoProber(db.video_probe_table()).probe(fpath),
+        upload_file_name=name,
+        params=params,
+        share_audio=is_silent(fpath),
+    )
 
-            needs_upload = True
+    if not encoded_path:
+        raise Exception("Failed to encode video")
 
-        if needs_upload:
-            yield fpath
+    return encoded_path
 
 
-def list_videos_without_upload(db: SqliteDatabase, force_upload: bool = False) -> Iterator[str]:
-    videos = db.videos_table().list()
-    encoded_videos_table = db.encoded_videos_table()
+def videos_to_encode(
+    cdn: CDN, db: SqliteDatabase, fpath: str, renditions: Iterable[tuple[str, dict]]
+) -> list[tuple[str, dict]]:
+    """Upload names and parameters of the renditions that are neither on the CDN nor left
+    encoded on disk by an interrupted upload."""
+    inventory = CdnInventory(cdn, db.cdn_objects_table())
+    pending = []
 
-    for fpath in videos:
-        encodings = list(encoded_videos_table.list_for_file(fpath))
-        published_roles = {enc.role for enc in encodings if enc.url and enc.url.strip()}
-        needs_upload = False
+    for _role, params in renditions:
+        name = CDN.video_name(fpath, params, "mp4")
+        if not inventory.has(name) and not resumable_encoding(db, name):
+            pending.append((name, params))
 
-        for role, _params in VIDEO_ENCODINGS:
-            if role in published_roles:
-                continue
+    return pending
 
-            needs_upload = True
 
-        if needs_upload:
-            yield fpath
+def ladder_encoding(input: VideoJobInput) -> str | None:
+    """The file encode_video_ladder wrote for this role, if it is still on disk."""
+    encoded_path = input.get("encoded_path")
+    return encoded_path if encoded_path and os.path.exists(encoded_path) else None
 
 
-def is_silent(fpath: str) -> bool:
-    """is a video silent?"""
-    return "+silent" not in fpath
+def upload_video_file(cdn, db, input: VideoJobInput, name: str) -> Generator[Any, Any, Any]:
+    """Upload an encoded file of the role, encoding it here unless the ladder encode already
+    did. Returns the file and its size."""
+    encoded_path = ladder_encoding(input) or encode_video(db, input["fpath"], name, input["params"])
+    parts = cdn.upload_file_public(
+        name=name,
+        encoded_path=encoded_path,
+        uploads=db.multipart_uploads_table(),
+    )
+    yield from (part_telemetry(report) for report in parts)
+
+    return encoded_path, os.path.getsize(encoded_path)
+
+
+def stream_video(cdn, db, input: VideoJobInput, name: str) -> Generator[Any, Any, Any]:
+    """Encode the role as fragmented MP4 straight into the upload, with no video file on
+    disk. Returns the poster frame the encode teed off, which the thumbnail is then taken
+    from, and the size sent."""
+    fpath = input["fpath"]
+    probe = VideoProber(db.video_probe_table()).probe(fpath)
+    poster_fpath = video_output_fpath(f"{name}.poster.png")
+    stream = VideoEncoder.encode_stream(
+        probe, input["params"], poster_fpath, share_audio=is_silent(fpath)
+    )
+    size = 0
+
+    try:
+        for report in cdn.upload_stream_public(name, stream):
+            size += report.size
+            yield part_telemetry(report)
+    finally:
+        stream.terminate()
+
+    return poster_fpath, size
 
 
-def publish_video_encoding(cdn, db, fpath, encoding: tuple[str, dict]):
-    role, params = encoding
+def publish_video_encoding(cdn, db, input: VideoJobInput) -> Generator[Any, Any, Any]:
+    """Upload one video role, emitting telemetry per uploaded part. An upload interrupted
+    in an earlier attempt resumes from its encoded file, skipping the encode.
+
+    Returns the file to take the video's thumbnail frame from: the encoded file, or the
+    first frame teed off the encode when streaming."""
+    fpath, role, params = input["fpath"], input["role"], input["params"]
     uploaded_video_name = CDN.video_name(fpath, params, "mp4")
+    inventory = CdnInventory(cdn, db.cdn_objects_table())
 
-    if cdn.has_object(uploaded_video_name):
+    if inventory.has(uploaded_video_name):
         # CDN already has the encoded asset; avoid re-encoding and just update the DB
         uploaded_video_url = cdn.url(uploaded_video_name)
         db.encoded_videos_table().add(fpath, uploaded_video_url, role, "mp4")
         return None
 
-    encoded_path = VideoEncoder.encode(
-        fpath=fpath,
-        upload_file_name=uploaded_video_name,
-        params=params,
-        share_audio=is_silent(fpath),
+    upload = stream_video if VIDEO_STREAM_UPLOAD else upload_video_file
+    frame_fpath, size = yield from upload(cdn, db, input, uploaded_video_name)
+    inventory.add(CdnObject(key=uploaded_video_name, size=size))
+
+    db.encoded_videos_table().add(fpath, cdn.url(uploaded_video_name), role, "mp4")
+
+    return frame_fpath
+
+
+def hls_variants() -> list[dict]:
+    """Parameters of each adaptive-streaming variant, highest first."""
+    encodings = dict(VIDEO_ENCODINGS)
+    return [encodings[role] for role in VIDEO_HLS_VARIANTS]
+
+
+def hls_playlist_key(fpath: str) -> str:
+    """Bucket key of the video's master playlist."""
+    return f"{CDN.hls_prefix(fpath, hls_variants())}/{VIDEO_HLS_PLAYLIST}"
+
+
+def hls_encoding(db: SqliteDatabase, fpath: str) -> str | None:
+    """Encode the video's adaptive-streaming variants, unless the bucket already has them.
+    Returns the directory of segments and playlists."""
+    if CdnInventory(CDN(), db.cdn_objects_table()).has(hls_playlist_key(fpath)):
+        return None
+
+    probe = VideoProber(db.video_probe_table()).probe(fpath)
+    if not probe:
+        return None
+
+    variants = hls_variants()
+    return VideoEncoder.encode_hls(
+        probe, CDN.hls_prefix(fpath, variants), variants, share_audio=is_silent(fpath)
     )
 
-    if not encoded_path:
-        raise Exception("Failed to encode video")
 
-    uploaded_video_url = cdn.upload_file_public(name=uploaded_video_name, encoded_path=encoded_path)
+def publish_video_hls(cdn, db, fpath: str, dpath: str | None) -> None:
+    """Upload the video's segments and playlists under one prefix, then record its master
+    playlist. Nothing is recorded when there is no encode, e.g. when the source is smaller
+    than every variant."""
+    key = hls_playlist_key(fpath)
+    inventory = CdnInventory(cdn, db.cdn_objects_table())
 
-    db.encoded_videos_table().add(fpath, uploaded_video_url, role, "mp4")
-    db.encoded_videos_table().get_by_fpath_and_role(fpath, role)
+    if not inventory.has(key):
+        if not dpath or not os.path.isdir(dpath):
+            return
 
-    return encoded_path
+        prefix = CDN.hls_prefix(fpath, hls_variants())
+        for uploaded in cdn.upload_directory_public(prefix, dpath):
+            size = os.path.getsize(os.path.join(dpath, uploaded.removeprefix(f"{prefix}/")))
+            inventory.add(CdnObject(key=uploaded, size=size))
+        shutil.rmtree(dpath)
+
+    db.encoded_videos_table().add_playlist(fpath, cdn.url(key), VIDEO_HLS_ROLE)
 
 
-def publish_video_thumbnail(cdn, db, fpath, encoded_path):
+def publish_video_thumbnail(cdn, db, fpath, frame_fpath):
     thumbnail_format = "webp"
     thumbnail_role = "video_thumbnail_webp"
     encoded_thumbnail = VideoEncoder.encode_thumbnail(
-        encoded_path, {"format": thumbnail_format, "quality": 85, "method": 6}
+        frame_fpath, {"format": thumbnail_format, "quality": 85, "method": 6}
     )
 
     thumbnail_url = cdn.upload_photo(
@@ -151,12 +321,12 @@ def publish_video_thumbnail(cdn, db, fpath, encoded_path):
 
 
 def roles_needing_upload(
-    fpath: str, published_roles: set[str], force: bool, force_roles: set[str]
+    fpath: str, published: dict[str, str | None], force: bool, force_roles: set[str]
 ) -> Iterator[tuple[str, dict]]:
-    """Image roles still to upload for this file."""
+    """Image roles still to upload for this file: missing, stale, or forced."""
     for role, params in IMAGE_ENCODINGS.items():
         role_forced = force or role in force_roles
-        if role in published_roles and not role_forced:
+        if is_rendition_current(published, role, params) and not role_forced:
             continue
 
         if is_role_skipped(role, fpath):
@@ -165,24 +335,288 @@ def roles_needing_upload(
         yield role, params
 
 
-def list_upload_work(input: UploadOpts) -> tuple[list, list, list, list]:
-    """fpaths needing grey, mosaic, photo-upload, and video-upload work."""
-    photo_force = input.get("force_upload_images", False) or bool(input.get("force_roles"))
+def spool_renditions(fpath: str, encoded: dict[str, PhotoContent]) -> dict[str, str]:
+    """Write each encoded rendition to the spool; return the spooled path per role."""
+    spool_dpath = Path(RENDITION_SPOOL_DIRECTORY) / deterministic_hash_str(fpath)
+    spool_dpath.mkdir(parents=True, exist_ok=True)
+
+    spooled = {}
+    for role, content in encoded.items():
+        spool_fpath = spool_dpath / role
+        spool_fpath.write_bytes(content.content)
+        spooled[role] = str(spool_fpath)
+
+    return spooled
+
+
+def queued_renditions(
+    db: SqliteDatabase, fpath: str, renditions: list[tuple[str, dict]]
+) -> list[str]:
+    """Roles among `renditions` already encoded and waiting in the outbox, from the photo
+    as it is now and with the role's current parameters, so they need only be uploaded."""
+    fingerprints = {role: encoding_fingerprint(params) for role, params in renditions}
+    tasks = [
+        task
+        for task in db.upload_outbox_table().list_for_file(fpath)
+        if fingerprints.get(task.role) == encoding_fingerprint(task.params)
+        and task.is_deliverable()
+    ]
+    if not tasks:
+        return []
+
+    digest = source_digest(fpath)
+    return [task.role for task in tasks if task.source_hash == digest]
+
+
+def encoder_params(role: str, params: dict) -> dict:
+    """The role's parameters as the encoder takes them: with the role's similarity target
+    when quality-targeted encoding is on. The target is never recorded with a rendition,
+    so its fingerprint does not depend on it."""
+    if QUALITY_TARGETED_ENCODING and role in QUALITY_TARGETS:
+        return {**params, "target_ssim": QUALITY_TARGETS[role]}
+
+    return params
+
+
+def known_qualities(
+    db: SqliteDatabase, fpath: str, digest: str, renditions: list[tuple[str, dict]]
+) -> dict[str, int]:
+    """Qualities already chosen for this photo's quality-targeted roles, from the source as
+    it is now and with the role's current parameters."""
+    fingerprints = {role: encoding_fingerprint(params) for role, params in renditions}
+    return {
+        item.role: item.quality
+        for item in db.rendition_qualities_table().list_for_file(fpath)
+        if item.source_hash == digest and fingerprints.get(item.role) == item.params_hash
+    }
+
+
+def chosen_qualities(
+    fpath: str, digest: str, renditions: list[tuple[str, dict]], encoded: dict[str, PhotoContent]
+) -> list[RenditionQuality]:
+    """The quality each quality-targeted role was encoded at, to record for later encodes.
+    Renditions read from the cache carry no quality, and were recorded when encoded."""
+    return [
+        RenditionQuality(fpath, role, digest, encoding_fingerprint(params), encoded[role].quality)
+        for role, params in renditions
+        if "target_ssim" in params and role in encoded and encoded[role].quality is not None
+    ]
+
+
+def rendition_cache() -> RenditionCache:
+    """The local cache of encoded renditions."""
+    return RenditionCache(RENDITION_CACHE_DIRECTORY, RENDITION_CACHE_MAX_BYTES)
+
+
+def encode_into_outbox(fpath: str, renditions: list[tuple[str, dict]]) -> list[OutboxTask]:
+    """Encode the photo's renditions from a single decode, spool them, and queue each in
+    the upload outbox. Rungs the photo is too small to fill are not encoded, and recorded
+    so they are not planned again. Returns the queued tasks."""
+    role_params, digest = dict(renditions), source_digest(fpath)
+    targeted = [(role, encoder_params(role, params)) for role, params in renditions]
+    with SqliteDatabase(DATABASE_PATH) as db:
+        qualities = known_qualities(db, fpath, digest, targeted)
 
+    encoded = PhotoEncoder.encode_many(fpath, targeted, rendition_cache(), qualities, digest=digest)
+    tasks = [
+        OutboxTask(fpath, role, digest, spool_fpath, role_params[role])
+        for role, spool_fpath in spool_renditions(fpath, encoded).items()
+    ]
     with SqliteDatabase(DATABASE_PATH) as db:
-        grey_fpaths = list(
-            list_photos_without_contrasting_grey(db, input.get("force_recompute_grey", False))
-        )
-        mosaic_fpaths = list(
-            list_photos_without_mosaic(db, input.get("force_recompute_mosaic", False))
+        db.upload_outbox_table().enqueue_many(tasks)
+        db.rendition_qualities_table().add_many(chosen_qualities(fpath, digest, targeted, encoded))
+        db.unfilled_renditions_table().add_many(
+            fpath, [role for role in role_params if role not in encoded]
         )
-        photo_fpaths = (
-            list(list_photos_without_upload(db, photo_force)) if input.get("upload_images") else []
+
+    return tasks
+
+
+def pending_renditions(
+    db: SqliteDatabase, input: PhotoJobInput
+) -> tuple[list[str], list[tuple[str, dict]]]:
+    """A photo's roles still to upload in the run's tiers: those already queued in the
+    outbox, and the (role, params) of those still to encode. Rungs the photo is too small
+    to fill are never encoded, even when forced."""
+    fpath = input["fpath"]
+    force_roles = set(input.get("force_roles") or [])
+    roles = tier_encodings(input.get("tiers"))
+    unfilled = db.unfilled_renditions_table().roles_for(fpath)
+
+    published = published_renditions(db.encoded_photos_table().list_for_file(fpath))
+    renditions = [
+        (role, params)
+        for role, params in roles_needing_upload(
+            fpath, published, input.get("force", False), force_roles
         )
-        video_fpaths = (
-            list(list_videos_without_upload(db, input.get("force_upload_videos", False)))
-            if input.get("upload_videos")
-            else []
+        if role in roles and role not in unfilled
+    ]
+    queued = queued_renditions(db, fpath, renditions)
+
+    return queued, [(role, params) for role, params in renditions if role not in queued]
+
+
+def backoff_seconds(attempts: int) -> float:
+    """How long to wait after an upload's `attempts`-th failure: UPLOAD_BACKOFF_BASE,
+    doubling per failure up to UPLOAD_BACKOFF_MAX. Jittered, so uploads that failed
+    together do not all retry together."""
+    delay = min(UPLOAD_BACKOFF_MAX, UPLOAD_BACKOFF_BASE * 2 ** max(attempts - 1, 0))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def photo_upload_semaphore(fpath: str, role: str) -> str:
+    """Semaphore the uploader signals once it is done with a rendition for this run."""
+    return f"{PHOTO_UPLOAD_SEMAPHORE}_{deterministic_hash_str(fpath)}_{role}"
+
+
+def start_upload_run(photos: int) -> str:
+    """Record a run's planned photo count for the uploader; return the run's id."""
+    run_id = uuid.uuid4().hex
+    with SqliteDatabase(DATABASE_PATH) as db:
+        db.upload_runs_table().start(run_id, photos)
+
+    return run_id
+
+
+def is_eligible(task: OutboxTask, tries: Counter) -> bool:
+    """May the uploader still try this rendition in this run?"""
+    return task.is_deliverable() and tries[task.key()] < UPLOAD_ATTEMPTS_PER_RUN
+
+
+def queued_uploads(db: SqliteDatabase, tiers: Iterable[str] | None) -> list[OutboxTask]:
+    """Renditions queued in the outbox for roles in `tiers`, soonest due first."""
+    roles = tier_encodings(tiers)
+    return [task for task in db.upload_outbox_table().list() if task.role in roles]
+
+
+def due_uploads(
+    queued: list[OutboxTask], uploader: PhotoUploader, tries: Counter
+) -> list[OutboxTask]:
+    """Queued renditions to start uploading now: due for a try, not already uploading, and
+    no more than the uploader has room for."""
+    now = time.time()
+    due = (
+        task
+        for task in queued
+        if task.next_attempt_at <= now
+        and is_eligible(task, tries)
+        and not uploader.is_uploading(task)
+    )
+    return list(itertools.islice(due, uploader.room()))
+
+
+def release_undeliverable(
+    queued: list[OutboxTask], uploader: PhotoUploader, tries: Counter
+) -> Iterator[Any]:
+    """Signal the semaphores of queued renditions whose artifact is gone from the spool.
+    They cannot be uploaded this run, and the next run encodes them again; until then no
+    proxy job should wait on them."""
+    for task in queued:
+        if task.is_deliverable() or uploader.is_uploading(task):
+            continue
+        if tries[task.key()] >= UPLOAD_ATTEMPTS_PER_RUN:
+            continue
+
+        tries[task.key()] = UPLOAD_ATTEMPTS_PER_RUN
+        semaphore = photo_upload_semaphore(task.fpath, task.role)
+        yield ESetState(name=semaphore, value=DependencyState.SATISFIED)
+
+
+def start_uploads(
+    queued: list[OutboxTask], uploader: PhotoUploader, tries: Counter
+) -> Iterator[Any]:
+    """Start uploading the queued renditions due now, and release those that can no longer
+    be uploaded this run."""
+    yield from release_undeliverable(queued, uploader, tries)
+    for task in due_uploads(queued, uploader, tries):
+        uploader.submit(task)
+
+
+def is_outbox_drained(
+    is_encoded: bool, queued: list[OutboxTask], uploader: PhotoUploader, tries: Counter
+) -> bool:
+    """Is the uploader done: nothing in flight, every planned photo encoded, and nothing
+    queued that it may still try?"""
+    if uploader.in_flight or not is_encoded:
+        return False
+
+    return not any(is_eligible(task, tries) for task in queued)
+
+
+def upload_telemetry(report: UploadReport) -> EEmit:
+    """Telemetry event for one rendition upload, with its latency and throughput."""
+    return EEmit(
+        tagged_point(
+            PHOTO_UPLOAD_TAG,
+            {
+                "role": [report.task.role],
+                "bytes": [str(report.size)],
+                "seconds": [f"{report.seconds:.3f}"],
+                "mbps": [f"{report.megabits_per_second():.2f}"],
+                "outcome": ["uploaded" if report.url else "failed"],
+            },
         )
+    )
+
+
+def record_upload(db: SqliteDatabase, inventory: CdnInventory, report: UploadReport) -> None:
+    """Record an uploaded rendition and its bucket object, and clear it from the outbox."""
+    task = report.task
+    db.encoded_photos_table().add_rendition(task.fpath, report.url, task.role, task.params)
+    inventory.add(CdnObject(key=report.url.removeprefix(CDN.url("")), size=report.size))
+    db.upload_outbox_table().delete(task.fpath, task.role)
+    os.remove(task.artifact_path)
+
+
+def settle_upload(
+    db: SqliteDatabase, inventory: CdnInventory, report: UploadReport, tries: Counter
+) -> Iterator[Any]:
+    """Record an upload's outcome, and report it to the event log.
+
+    An uploaded rendition is recorded, added to the CDN inventory, and cleared from the
+    outbox and spool. A failed one is retried after a backoff, or once the CDN circuit
+    closes, whichever is later; after UPLOAD_ATTEMPTS_PER_RUN tries, or a failure no retry
+    can get past, it stays queued for the next run. Either way, once the uploader is done
+    with the rendition its semaphore is signalled."""
+    task, outbox = report.task, db.upload_outbox_table()
+    tries[task.key()] += 1
+    yield upload_telemetry(report)
+
+    if report.url:
+        record_upload(db, inventory, report)
+    else:
+        if not report.transient:
+            tries[task.key()] = UPLOAD_ATTEMPTS_PER_RUN
+        delay = max(backoff_seconds(task.attempts + 1), upload_circuit().retry_after())
+        outbox.record_failure(task, report.error or "", time.time() + delay)
+        if is_eligible(task, tries):
+            return
+
+    semaphore = photo_upload_semaphore(task.fpath, task.role)
+    yield ESetState(name=semaphore, value=DependencyState.SATISFIED)
+
+
+def describe_cdn_reconciliation(report: CdnReconciliation) -> str:
+    """One-line summary of how the CDN bucket and the encoded media rows differ."""
+    return (
+        f"cdn inventory: {len(report.orphaned_keys)} objects unreferenced, "
+        f"{len(report.missing_objects)} renditions missing from the bucket"
+    )
+
+
+def reconcile_cdn(db: SqliteDatabase) -> CdnReconciliation:
+    """List the bucket once, if the stored listing expired, and compare it with the DB."""
+    return CdnInventory(CDN(), db.cdn_objects_table()).reconcile(db)
+
+
+def video_cost(probe: VideoProbe | None) -> tuple[float, int]:
+    """Estimated (encode, upload) cost of a video: pixels to decode, and bytes to send.
+    Videos that cannot be probed cost nothing, so they are scheduled last."""
+    return (probe.encode_cost(), probe.size) if probe else (0.0, 0)
+
 
-    return grey_fpaths, mosaic_fpaths, photo_fpaths, video_fpaths
+def longest_first(db: SqliteDatabase, fpaths: Iterable[str]) -> list[str]:
+    """Videos ordered longest job first. Starting the costliest encodes first keeps the
+    encode pool busy to the end of a batch, rather than one long clip finishing alone."""
+    probes = VideoProber(db.video_probe_table()).probe_many(fpaths)
+    return sorted(probes, key=lambda fpath: video_cost(probes[fpath]), reverse=True)
@@ -5,13 +5,14 @@ from typing import Any
 from zahir import JobContext, check_file_dependency
 
 from mirror.commons.config import OUTPUT_DIRECTORY
+from mirror.commons.constants import CRITICAL_TIER, DEFERRED_TIER
 from mirror.workflows.output import workflow_output
 from mirror.workflows.scan.utils import DEFAULT_ALBUMS_MARKDOWN_PATH, DEFAULT_PHOTOS_MARKDOWN_PATH
 from mirror.workflows.workflow_types import MirrorWorkflowInput
 
 
-def upload_media_input(input: MirrorWorkflowInput) -> dict:
-    """Forward the upload flags from the workflow input."""
+def upload_media_input(input: MirrorWorkflowInput, tiers: list[str]) -> dict:
+    """Forward the upload flags from the workflow input, for the renditions in `tiers`."""
     return {
         "force_recompute_grey": input.get("force_recompute_grey", False),
         "force_recompute_mosaic": input.get("force_recompute_mosaic", False),
@@ -20,15 +21,24 @@ def upload_media_input(input: MirrorWorkflowInput) -> dict:
         "force_roles": input.get("force_roles"),
         "upload_images": input.get("upload_images"),
         "upload_videos": input.get("upload_videos"),
+        "reencode_limit": input.get("reencode_limit"),
+        "tiers": tiers,
     }
 
 
-def run_scan(ctx: JobContext, paths: dict) -> Generator[Any, Any, bool]:
+def backfill_input(input: MirrorWorkflowInput) -> dict:
+    """Upload flags for the deferred renditions, uploaded once the site is published.
+    Videos were all uploaded before publishing."""
+    return {**upload_media_input(input, [DEFERRED_TIER]), "upload_videos": False}
+
+
+def run_scan(ctx: JobContext, paths: dict, force_rescan: bool = False) -> Generator[Any, Any, bool]:
     """Run scan_media; report whether it succeeded."""
     try:
         yield ctx.scope.scan_media({
             "albums_markdown_path": paths["albums_markdown_path"],
             "photos_markdown_path": paths["photos_markdown_path"],
+            "force_rescan": force_rescan,
         })
     except Exception as err:  # noqa: BLE001
         yield workflow_output(f"scan_media failed: {err}")
@@ -81,9 +91,10 @@ def mirror_workflow(ctx: JobContext, input: MirrorWorkflowInput) -> Generator[An
         "photos_markdown_path": input.get("photos_markdown_path", DEFAULT_PHOTOS_MARKDOWN_PATH),
     }
 
-    scan_ok = yield from run_scan(ctx, artifact_paths)
+    scan_ok = yield from run_scan(ctx, artifact_paths, input.get("force_rescan", False))
 
-    yield ctx.scope.upload_media(upload_media_input(input))
+    # Only the critical renditions hold up publishing; deferred ones are uploaded after it
+    yield ctx.scope.upload_media(upload_media_input(input, [CRITICAL_TIER]))
 
     if not scan_ok:
         # scan loads albums.md/photos.md into the DB via read_albums/read_photos. If it failed the
@@ -107,4 +118,9 @@ def mirror_workflow(ctx: JobContext, input: MirrorWorkflowInput) -> Generator[An
     yield ctx.scope.audit_media({})
 
     summary = yield from publish_phase(ctx, input, artifact_paths)
+
+    if input.get("backfill", True):
+        yield workflow_output("published; uploading deferred renditions")
+        yield ctx.scope.upload_media(backfill_input(input))
+
     return summary
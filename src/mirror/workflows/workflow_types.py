@@ -13,6 +13,10 @@ class MirrorWorkflowInput(TypedDict, total=False):
     force_upload_images: bool
     force_upload_videos: bool
     force_roles: list[str] | None
+    # Re-list every album and re-check every photo, ignoring the stored file state
+    force_rescan: bool
+    # Photos per run re-encoded because their role parameters changed
+    reencode_limit: int | None
     albums_markdown_path: str
     photos_markdown_path: str
     # Overrides config `OUTPUT_DIRECTORY` when set
@@ -20,3 +24,5 @@ class MirrorWorkflowInput(TypedDict, total=False):
     publish_d1: bool
     # Skip the GitHub publish step; used to test the pipeline without autopublishing
     no_github: bool
+    # Upload the deferred renditions after publishing; otherwise leave them to `mirror backfill`
+    backfill: bool
@@ -0,0 +1,81 @@
+"""Tests for the cached CDN bucket inventory."""
+
+from conftest import make_media_db
+
+from mirror.models.upload import CdnObject
+from mirror.services.cdn import CDN
+from mirror.services.cdn_inventory import CdnInventory
+
+
+class FakeBucket:
+    """Serves list_objects_v2 pages, counting how often the bucket is listed."""
+
+    def __init__(self, pages: list[list[str]]) -> None:
+        self.pages = pages
+        self.listings = 0
+
+    def get_paginator(self, operation: str) -> "FakeBucket":
+        assert operation == "list_objects_v2"
+        return self
+
+    def paginate(self, **kwargs):
+        self.listings += 1
+        for keys in self.pages:
+            yield {"Contents": [{"Key": key, "Size": 1, "ETag": f'"{key}"'} for key in keys]}
+
+
+def make_inventory(pages: list[list[str]], ttl: int = 3600):
+    bucket = FakeBucket(pages)
+    db = make_media_db()
+    return (
+        bucket,
+        db,
+        CdnInventory(CDN(session=object(), client=bucket), db.cdn_objects_table(), ttl),
+    )
+
+
+def test_existence_checks_share_one_listing():
+    """Proves every page of the listing is stored, existence checks reuse it until the TTL
+    expires, and our own uploads are visible without listing again."""
+    bucket, _, inventory = make_inventory([["a.mp4", "b.mp4"], ["c.webp"]])
+
+    assert [inventory.has(key) for key in ("a.mp4", "c.webp", "d.mp4")] == [True, True, False]
+    inventory.add(CdnObject(key="d.mp4", size=10))
+
+    assert inventory.has("d.mp4")
+    assert bucket.listings == 1
+
+
+def test_expired_listing_is_refreshed():
+    """Proves a listing older than the TTL is replaced on the next check."""
+    bucket, _, inventory = make_inventory([["a.mp4"]], ttl=-1)
+
+    inventory.has("a.mp4")
+    inventory.has("a.mp4")
+
+    assert bucket.listings == 2
+
+
+def test_reconciliation_reports_orphans_and_missing_objects():
+    """Proves bucket keys with no linking row and rows linking to absent keys are both
+    reported, while thumbhash placeholders and linked keys are not."""
+    _, db, inventory = make_inventory([["linked.webp", "orphan.webp"]])
+    db.encoded_photos_table().add("/a.jpg", CDN.url("linked.webp"), "thumbnail_lossy", "webp")
+    db.encoded_photos_table().add("/a.jpg", "placeholder", "thumbnail_mosaic", "thumbhash")
+    db.encoded_photos_table().add("/b.jpg", CDN.url("gone.webp"), "thumbnail_lossy", "webp")
+
+    report = inventory.reconcile(db)
+
+    assert report.orphaned_keys == ["orphan.webp"]
+    assert report.missing_objects == [("/b.jpg", "thumbnail_lossy")]
+
+
+def test_playlist_segments_are_not_orphans():
+    """Proves segments stored beside a linked HLS playlist count as linked, while files under
+    an unlinked prefix are still reported."""
+    keys = ["abc/master.m3u8", "abc/0/init.mp4", "abc/0/segment_000.m4s", "old/master.m3u8"]
+    _, db, inventory = make_inventory([keys])
+    db.videos_table().add("/a.mp4")
+    db.encoded_videos_table().add_playlist("/a.mp4", CDN.url("abc/master.m3u8"), "video_hls")
+
+    assert inventory.reconcile(db).orphaned_keys == ["old/master.m3u8"]
@@ -5,6 +5,9 @@ import os
 import ffmpeg
 
 from mirror.data.semantic_triples import first_seen
+from mirror.models.video import VideoProbe
+from mirror.services.database import SqliteDatabase
+from mirror.services.video_probe import VideoProber
 
 
 def test_exif_created_at_to_unix_ms():
@@ -12,53 +15,74 @@ def test_exif_created_at_to_unix_ms():
     assert first_seen._exif_created_at_to_unix_ms("1970:01:01 00:00:01") == 1000
 
 
-def test_probe_reads_creation_time(monkeypatch):
+def tagged_probe(fpath: str, creation_time: str | None) -> VideoProbe:
+    """A recorded probe of a video whose container carries this creation_time tag."""
+    tags = {"creation_time": creation_time} if creation_time else {}
+    stat = os.stat_result((0, 0, 0, 0, 0, 0, 1, 0, 0, 0))
+    return VideoProbe.from_probe(fpath, stat, {"format": {"tags": tags}, "streams": []})
+
+
+def test_probe_reads_creation_time():
     """A video's container creation_time is used as its capture time."""
-    monkeypatch.setattr(
-        ffmpeg,
-        "probe",
-        lambda fpath: {"format": {"tags": {"creation_time": "1970-01-01T00:00:01+00:00"}}},
-    )
-    assert first_seen._probe_creation_time_ms("/x.mp4") == 1000
+    probe = tagged_probe("/x.mp4", "1970-01-01T00:00:01+00:00")
+    assert first_seen._video_capture_unix_ms("/x.mp4", probe) == 1000
 
 
-def test_probe_handles_zulu_suffix(monkeypatch):
+def test_probe_handles_zulu_suffix():
     """The `Z` UTC suffix (as ffprobe emits) parses correctly."""
-    monkeypatch.setattr(
-        ffmpeg,
-        "probe",
-        lambda fpath: {"format": {"tags": {"creation_time": "1970-01-01T00:00:02.000000Z"}}},
-    )
-    assert first_seen._probe_creation_time_ms("/x.mp4") == 2000
+    assert tagged_probe("/x.mp4", "1970-01-01T00:00:02.000000Z").creation_time_ms() == 2000
 
 
-def test_video_capture_prefers_creation_time_over_mtime(monkeypatch, tmp_path):
+def test_video_capture_prefers_creation_time_over_mtime(tmp_path):
     """creation_time wins over mtime — bulk re-imports leave mtime years wrong,
     so a filmed species must not be dated by its copy date."""
     video = tmp_path / "clip.mp4"
     video.write_bytes(b"x")
     os.utime(video, (9_999_999, 9_999_999))  # mtime far in the future vs the tag
-    monkeypatch.setattr(
-        ffmpeg,
-        "probe",
-        lambda fpath: {"format": {"tags": {"creation_time": "1970-01-01T00:00:01+00:00"}}},
-    )
-    assert first_seen._video_capture_unix_ms(str(video)) == 1000
+    probe = tagged_probe(str(video), "1970-01-01T00:00:01+00:00")
+    assert first_seen._video_capture_unix_ms(str(video), probe) == 1000
 
 
-def test_video_capture_falls_back_to_mtime(monkeypatch, tmp_path):
+def test_video_capture_falls_back_to_mtime(tmp_path):
     """With no creation_time tag, fall back to the file mtime."""
-    monkeypatch.setattr(ffmpeg, "probe", lambda fpath: {"format": {"tags": {}}})
     video = tmp_path / "clip.mp4"
     video.write_bytes(b"x")
     os.utime(video, (1000, 1000))
-    assert first_seen._video_capture_unix_ms(str(video)) == 1000 * 1000
+    probe = tagged_probe(str(video), None)
+    assert first_seen._video_capture_unix_ms(str(video), probe) == 1000 * 1000
 
 
-def test_video_capture_missing_file_returns_none(monkeypatch):
+def test_video_capture_missing_file_returns_none():
     """A subject whose video is absent and untagged yields no timestamp."""
-    monkeypatch.setattr(ffmpeg, "probe", lambda fpath: {"format": {"tags": {}}})
-    assert first_seen._video_capture_unix_ms("/does/not/exist.mp4") is None
+    assert first_seen._video_capture_unix_ms("/does/not/exist.mp4", None) is None
+
+
+def fake_probe(fpath: str, probed: list[str]) -> dict:
+    """ffmpeg.probe stand-in that records each call; files named broken are unreadable."""
+    probed.append(fpath)
+    if fpath.endswith("broken.mp4"):
+        raise ffmpeg.Error("ffprobe", b"", b"invalid data")
+    return {"format": {"tags": {"creation_time": "1970-01-01T00:00:01Z"}}, "streams": []}
+
+
+def test_unchanged_videos_are_probed_once(monkeypatch, tmp_path):
+    """Proves probes are stored and reused while a video's size and mtime are unchanged,
+    and that a changed or unreadable video is probed again."""
+    probed = []
+    monkeypatch.setattr(ffmpeg, "probe", lambda fpath: fake_probe(fpath, probed))
+    clip, broken = tmp_path / "clip.mp4", tmp_path / "broken.mp4"
+    clip.write_bytes(b"x")
+    broken.write_bytes(b"x")
+    prober = VideoProber(SqliteDatabase(":memory:").video_probe_table())
+
+    prober.probe_many([str(clip), str(broken)])
+    probes = prober.probe_many([str(clip), str(broken)])
+    clip.write_bytes(b"changed")
+    prober.probe_many([str(clip)])
+
+    assert probes[str(clip)].creation_time_ms() == 1000
+    assert probes[str(broken)] is None
+    assert sorted(probed) == sorted([str(clip), str(broken), str(broken), str(clip)])
 
 
 def test_merge_earliest_keeps_minimum_and_collapses_qs():
@@ -0,0 +1,144 @@
+"""Tests for resumable multipart video uploads."""
+
+import io
+import os
+import subprocess
+from types import SimpleNamespace
+
+import pytest
+from botocore.exceptions import ClientError
+
+from mirror.commons.config import VIDEO_UPLOAD_PART_SIZE
+from mirror.commons.constants import VIDEO_ENCODINGS
+from mirror.commons.exceptions import VideoEncodeError
+from mirror.models.upload import MultipartUpload
+from mirror.models.video import VideoProbe
+from mirror.services.cdn import CDN
+from mirror.services.database import SqliteDatabase
+from mirror.services.encoder import FFmpegStream, stream_graph
+
+
+class FakeStorageClient:
+    """Records multipart calls; every upload is live."""
+
+    exceptions = SimpleNamespace(ClientError=ClientError)
+
+    def __init__(self) -> None:
+        self.sent_parts: list[int] = []
+        self.completed: list[dict] = []
+        self.aborted: list[str] = []
+
+    @staticmethod
+    def list_parts(**kwargs) -> dict:
+        return {"Parts": []}
+
+    def create_multipart_upload(self, **kwargs) -> dict:
+        self.sent_parts.clear()
+        return {"UploadId": "fresh-upload"}
+
+    def upload_part(self, **kwargs) -> dict:
+        self.sent_parts.append(kwargs["PartNumber"])
+        return {"ETag": f"etag-{kwargs['PartNumber']}"}
+
+    def complete_multipart_upload(self, **kwargs) -> None:
+        self.completed.append(kwargs["MultipartUpload"])
+
+    def abort_multipart_upload(self, **kwargs) -> None:
+        self.aborted.append(kwargs["UploadId"])
+
+
+def recorded_upload(fpath: str, upload_id: str = "earlier-upload") -> MultipartUpload:
+    stat = os.stat(fpath)
+    return MultipartUpload(
+        key="video.mp4",
+        upload_id=upload_id,
+        fpath=fpath,
+        size=stat.st_size,
+        mtime_ns=stat.st_mtime_ns,
+        part_size=VIDEO_UPLOAD_PART_SIZE,
+    )
+
+
+def test_upload_matches_only_an_unchanged_file():
+    """Proves an upload resumes only for the same size, mtime, and part size, and that the
+    part count rounds up."""
+    upload = MultipartUpload("k", "u", "/tmp/v.mp4", size=25, mtime_ns=7, part_size=10)
+
+    assert upload.part_count() == 3
+    assert upload.resumes(25, 7, 10)
+    assert not upload.resumes(25, 8, 10)
+    assert not upload.resumes(25, 7, 5)
+
+
+def test_interrupted_upload_sends_only_missing_parts(tmp_path):
+    """Proves a recorded upload resumes with its upload id, sends only the parts without an
+    ETag, completes with every part in order, and then forgets the upload."""
+    encoded = tmp_path / "video.mp4"
+    encoded.write_bytes(b"v" * (VIDEO_UPLOAD_PART_SIZE * 2 + 1))
+
+    db = SqliteDatabase(":memory:")
+    uploads = db.multipart_uploads_table()
+    uploads.start(recorded_upload(str(encoded)))
+    uploads.add_part("video.mp4", 2, "etag-2")
+
+    client = FakeStorageClient()
+    reports = CDN(session=object(), client=client).upload_file_public(
+        "video.mp4", str(encoded), uploads
+    )
+
+    assert sorted(report.part_number for report in reports) == [1, 3]
+    assert sorted(client.sent_parts) == [1, 3]
+    assert client.completed == [
+        {"Parts": [{"PartNumber": num, "ETag": f"etag-{num}"} for num in (1, 2, 3)]}
+    ]
+    assert (uploads.get("video.mp4"), uploads.list_parts("video.mp4")) == (None, {})
+
+
+def test_stream_is_uploaded_in_parts_as_they_fill(monkeypatch):
+    """Proves a stream of unknown length is split into full parts plus a short last part,
+    and completed with every part in order."""
+    monkeypatch.setattr("mirror.services.cdn.VIDEO_UPLOAD_PART_SIZE", 4)
+    client = FakeStorageClient()
+
+    reports = list(
+        CDN(session=object(), client=client).upload_stream_public("v.mp4", io.BytesIO(b"x" * 10))
+    )
+
+    assert sorted((report.part_number, report.size) for report in reports) == [
+        (1, 4),
+        (2, 4),
+        (3, 2),
+    ]
+    assert client.completed == [
+        {"Parts": [{"PartNumber": num, "ETag": f"etag-{num}"} for num in (1, 2, 3)]}
+    ]
+
+
+def test_failed_encode_aborts_the_streamed_upload(monkeypatch):
+    """Proves an ffmpeg that exits with an error aborts the upload instead of completing
+    it with the truncated output."""
+    monkeypatch.setattr("mirror.services.cdn.VIDEO_UPLOAD_PART_SIZE", 4)
+    process = subprocess.Popen(["sh", "-c", "printf truncated; exit 3"], stdout=subprocess.PIPE)
+    client = FakeStorageClient()
+
+    with pytest.raises(VideoEncodeError):
+        list(
+            CDN(session=object(), client=client).upload_stream_public(
+                "v.mp4", FFmpegStream(process, "/media/clip.mp4")
+            )
+        )
+
+    assert (client.completed, client.aborted) == ([], ["fresh-upload"])
+
+
+def test_streamed_encode_tees_its_poster_frame():
+    """Proves a streamed encode writes its first frame beside the pipe from the one read of
+    the source, so the thumbnail never reopens it."""
+    _, params = VIDEO_ENCODINGS[0]
+    probe = VideoProbe("/media/clip.mp4", size=1, mtime_ns=1, width=3840, height=2160)
+
+    args = stream_graph(probe, params, "/tmp/mirror/poster.png", share_audio=False).compile()
+
+    assert args.count("-i") == 1
+    assert "pipe:" in args
+    assert args[-5:] == ["-loglevel", "error", "-vframes", "1", "/tmp/mirror/poster.png"]
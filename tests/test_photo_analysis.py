@@ -0,0 +1,41 @@
+"""Tests for the fused per-photo analysis."""
+
+from conftest import make_media_db
+from PIL import Image
+
+from mirror.commons.constants import THUMBHASH_ROLES
+from mirror.services.encoder import PhotoEncoder, corner_lightness
+
+
+def test_corner_lightness_reads_only_the_top_right():
+    """Proves the lightness sample covers the top-right 1/64th, not the whole frame."""
+    img = Image.new("RGB", (800, 800), (0, 0, 0))
+    img.paste((255, 255, 255), (700, 0, 800, 100))
+
+    assert corner_lightness(img) == 255
+
+
+def test_analysis_matches_the_separate_computations(tmp_path):
+    """Proves one decode yields the same grey and an equivalent thumbhash as computing each
+    on its own."""
+    fpath = str(tmp_path / "photo.png")
+    Image.new("RGB", (1200, 800), (30, 60, 90)).save(fpath)
+
+    analysis = PhotoEncoder.analyse(fpath)
+
+    assert analysis.grey_value == PhotoEncoder.compute_contrasting_grey(fpath)
+    assert analysis.thumbhash == PhotoEncoder.encode_thumbhash(fpath)
+
+
+def test_analysis_is_stored_in_one_write(tmp_path):
+    """Proves the grey and every thumbhash role are stored together."""
+    fpath = str(tmp_path / "photo.png")
+    Image.new("RGB", (400, 300), (200, 200, 200)).save(fpath)
+    db = make_media_db()
+    db.photos_table().add(fpath)
+
+    db.photo_analysis_table().add(PhotoEncoder.analyse(fpath))
+
+    assert db.photo_icon_table().get_by_fpath(fpath)
+    roles = {enc.role for enc in db.encoded_photos_table().list_for_file(fpath)}
+    assert roles == set(THUMBHASH_ROLES)
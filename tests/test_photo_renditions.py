@@ -0,0 +1,128 @@
+"""Tests for encoding several photo roles from one decode."""
+
+import io
+
+from conftest import make_media_db
+from PIL import Image, ImageOps
+
+from mirror.commons.constants import IMAGE_ENCODINGS, QUALITY_SEARCH_FLOOR, QUALITY_TARGETS
+from mirror.services import encoder
+from mirror.services.encoder import PhotoEncoder
+from mirror.workflows.upload import utils as upload_utils
+
+RENDITIONS = [
+    ("mid_image_lossy", {"format": "webp", "quality": 85, "width": 400, "height": 300}),
+    ("mid_image_png", {"format": "png", "width": 400, "height": 300}),
+    ("preview_jpeg", {"format": "jpeg", "quality": 80, "width": 200, "height": 150}),
+    ("social_card", {"format": "webp", "quality": 85, "width": 240, "height": 126}),
+    ("full_image_lossless", {"format": "webp", "lossless": True}),
+]
+
+
+def write_photo(tmp_path) -> str:
+    """Write a test photo larger than every rendition."""
+    fpath = str(tmp_path / "photo.jpg")
+    Image.linear_gradient("L").resize((1200, 900)).convert("RGB").save(fpath)
+    return fpath
+
+
+def test_each_role_gets_its_geometry_and_format(tmp_path):
+    """Proves every requested role is encoded at its own size and format."""
+    encoded = PhotoEncoder.encode_many(write_photo(tmp_path), RENDITIONS)
+
+    sizes = {}
+    for role, content in encoded.items():
+        with Image.open(io.BytesIO(content.content)) as img:
+            sizes[role] = (img.format, img.size)
+
+    assert sizes == {
+        "mid_image_lossy": ("WEBP", (400, 300)),
+        "mid_image_png": ("PNG", (400, 300)),
+        "preview_jpeg": ("JPEG", (200, 150)),
+        "social_card": ("WEBP", (240, 126)),
+        "full_image_lossless": ("WEBP", (1200, 900)),
+    }
+
+
+def test_shared_geometries_are_fitted_once(tmp_path, monkeypatch):
+    """Proves roles sharing a geometry share one resize, and a same-aspect geometry is
+    derived from a larger rendition instead of the full source."""
+    fits = []
+    fit = ImageOps.fit
+
+    def counting_fit(img, size):
+        fits.append((img.size, size))
+        return fit(img, size)
+
+    monkeypatch.setattr(encoder.ImageOps, "fit", counting_fit)
+
+    PhotoEncoder.encode_many(write_photo(tmp_path), RENDITIONS)
+
+    assert fits == [
+        ((1200, 900), (400, 300)),
+        ((1200, 900), (240, 126)),
+        ((400, 300), (200, 150)),
+    ]
+
+
+def test_spooled_renditions_round_trip(tmp_path, monkeypatch):
+    """Proves each encoded rendition is spooled to its own file, byte for byte."""
+    monkeypatch.setattr(upload_utils, "RENDITION_SPOOL_DIRECTORY", str(tmp_path / "spool"))
+    encoded = PhotoEncoder.encode_many(write_photo(tmp_path), RENDITIONS[:2])
+
+    spooled = upload_utils.spool_renditions("/vault/photo.jpg", encoded)
+
+    assert set(spooled) == {"mid_image_lossy", "mid_image_png"}
+    for role, spool_fpath in spooled.items():
+        with open(spool_fpath, "rb") as spool_file:
+            assert spool_file.read() == encoded[role].content
+
+
+TARGETED = ("mid_image_lossy", {**RENDITIONS[0][1], "target_ssim": 0.98})
+
+
+def test_targeted_role_is_encoded_at_the_lowest_quality_reaching_its_target(tmp_path):
+    """Proves a quality-targeted role keeps its similarity target within its quality
+    ceiling, and an easy image is encoded below the ceiling in fewer bytes."""
+    fpath = write_photo(tmp_path)
+
+    targeted = PhotoEncoder.encode_many(fpath, [TARGETED])["mid_image_lossy"]
+    fixed = PhotoEncoder.encode_many(fpath, RENDITIONS[:1])["mid_image_lossy"]
+
+    with Image.open(fpath) as img:
+        fitted = ImageOps.fit(img, (400, 300))
+    assert QUALITY_SEARCH_FLOOR <= targeted.quality < fixed.quality
+    assert encoder.structural_similarity(fitted, targeted) >= 0.98
+    assert len(targeted.content) < len(fixed.content)
+
+
+def test_known_quality_skips_the_search(tmp_path, monkeypatch):
+    """Proves a targeted role whose quality was chosen before is encoded at it directly,
+    while the quality is recorded only for the source and parameters it was chosen for."""
+    monkeypatch.setattr(encoder, "search_quality", lambda img, params: 1 / 0)
+    fpath, db = write_photo(tmp_path), make_media_db()
+    encoded = PhotoEncoder.encode_many(fpath, [TARGETED], qualities={"mid_image_lossy": 55})
+
+    chosen = upload_utils.chosen_qualities(fpath, "digest", [TARGETED], encoded)
+    db.rendition_qualities_table().add_many(chosen)
+
+    assert upload_utils.known_qualities(db, fpath, "digest", [TARGETED]) == {"mid_image_lossy": 55}
+    assert upload_utils.known_qualities(db, fpath, "edited", [TARGETED]) == {}
+    assert upload_utils.known_qualities(db, fpath, "digest", RENDITIONS[:1]) == {}
+
+
+def test_quality_targets_are_opt_in_and_not_fingerprinted(monkeypatch):
+    """Proves roles are encoded at their fixed quality unless quality targeting is turned
+    on, and turning it on leaves the recorded parameters, and so fingerprints, as they were."""
+    params = IMAGE_ENCODINGS["mid_image_lossy"]
+    assert upload_utils.encoder_params("mid_image_lossy", params) == params
+
+    monkeypatch.setattr(upload_utils, "QUALITY_TARGETED_ENCODING", True)
+    targeted = upload_utils.encoder_params("mid_image_lossy", params)
+
+    assert targeted == {**params, "target_ssim": QUALITY_TARGETS["mid_image_lossy"]}
+    assert "target_ssim" not in IMAGE_ENCODINGS["mid_image_lossy"]
+    assert (
+        upload_utils.encoder_params("mid_image_png", IMAGE_ENCODINGS["mid_image_png"])
+        == (IMAGE_ENCODINGS["mid_image_png"])
+    )
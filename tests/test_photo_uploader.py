@@ -0,0 +1,118 @@
+"""Tests for the photo uploader and its adaptive concurrency."""
+
+import os
+
+import botocore.exceptions
+
+from mirror.commons.constants import IMAGE_ENCODINGS
+from mirror.models.upload import OutboxTask
+from mirror.services import uploader as uploader_module
+from mirror.services.cdn import CDN
+from mirror.services.circuit_breaker import CircuitBreaker
+from mirror.services.uploader import AimdController, PhotoUploader, upload_rendition
+
+ROLE = "thumbnail_lossy"
+
+
+class FailingBucket:
+    """Fails every upload with the given error"""
+
+    def __init__(self, error: Exception) -> None:
+        self.error = error
+
+    def put_object(self, **kwargs):
+        raise self.error
+
+
+def make_cdn(error: Exception) -> CDN:
+    circuit = CircuitBreaker(100, 60, lambda err: True)
+    return CDN(session=object(), client=FailingBucket(error), circuit=circuit)
+
+
+def make_task(tmp_path, name: str, content: bytes) -> OutboxTask:
+    artifact = tmp_path / name
+    artifact.write_bytes(content)
+    return OutboxTask(f"/media/{name}.jpg", ROLE, "digest", str(artifact), IMAGE_ENCODINGS[ROLE])
+
+
+def run_windows(monkeypatch, controller: AimdController, rates: list[float]) -> list[int]:
+    """Complete one window of uploads per rate, each upload taking a second; return the
+    limit after each window."""
+    now = [0.0]
+    monkeypatch.setattr(uploader_module.time, "monotonic", lambda: now[0])
+    controller.start_window()
+
+    limits = []
+    for rate in rates:
+        count = controller.limit
+        for _ in range(count):
+            now[0] += 1.0 / count
+            controller.record(int(rate / count), failed=False)
+        limits.append(controller.limit)
+
+    return limits
+
+
+def test_limit_grows_while_throughput_holds(monkeypatch):
+    """Proves the limit rises by one per clean window while throughput holds up, up to the
+    maximum."""
+    controller = AimdController((1, 4, 6))
+
+    assert run_windows(monkeypatch, controller, [100.0, 120.0, 130.0, 130.0]) == [5, 6, 6, 6]
+
+
+def test_limit_falls_on_congestion_and_errors(monkeypatch):
+    """Proves the limit is halved when throughput drops, and again when an upload fails,
+    never falling below the minimum."""
+    controller = AimdController((2, 8, 16))
+
+    assert run_windows(monkeypatch, controller, [100.0, 50.0]) == [9, 4]
+
+    controller.record(0, failed=True)
+    assert controller.limit == 2
+    controller.record(0, failed=True)
+    assert controller.limit == 2
+
+
+def test_failures_are_reported_not_raised(tmp_path):
+    """Proves a network failure is reported as transient, while an error the CDN answers
+    with, such as access denied, or an artifact gone from the spool, is reported as final."""
+    offline = botocore.exceptions.EndpointConnectionError(endpoint_url="https://cdn")
+    denied = botocore.exceptions.ClientError(
+        {"Error": {"Code": "AccessDenied"}, "ResponseMetadata": {"HTTPStatusCode": 403}}, "Put"
+    )
+    task = make_task(tmp_path, "a", b"fail")
+
+    report = upload_rendition(make_cdn(offline), task)
+    assert (report.url, report.size, report.transient) == (None, 4, True)
+    assert "Could not connect" in report.error
+
+    report = upload_rendition(make_cdn(denied), task)
+    assert (report.url, report.transient) == (None, False)
+    assert "AccessDenied" in report.error
+
+    os.remove(task.artifact_path)
+    report = upload_rendition(make_cdn(offline), task)
+    assert (report.url, report.size, report.transient) == (None, 0, False)
+
+
+def test_uploader_keeps_to_the_controller_limit(tmp_path):
+    """Proves the uploader has room for only as many uploads as the limit allows, and feeds
+    each completed upload back to the controller."""
+    controller = AimdController((1, 2, 4))
+    offline = botocore.exceptions.EndpointConnectionError(endpoint_url="https://cdn")
+    uploader = PhotoUploader(controller, make_cdn(offline))
+
+    tasks = [make_task(tmp_path, "a", b"fail"), make_task(tmp_path, "b", b"fail")]
+    for task in tasks:
+        uploader.submit(task)
+    assert (uploader.room(), uploader.is_uploading(tasks[0])) == (0, True)
+
+    reports = []
+    while uploader.in_flight:
+        reports += uploader.completed(timeout=1.0)
+    uploader.close()
+
+    assert sorted(report.task.fpath for report in reports) == ["/media/a.jpg", "/media/b.jpg"]
+    assert all(report.error for report in reports)
+    assert (controller.limit, uploader.room()) == (1, 1)
@@ -0,0 +1,60 @@
+"""Tests for the reduced-resolution decode used by the analysis paths."""
+
+import imagehash
+import pytest
+from PIL import Image, JpegImagePlugin
+
+from mirror.commons.images import open_preview
+from mirror.models.phash import PHashReader
+
+
+def write_image(tmp_path, name: str, size: tuple[int, int]) -> str:
+    """Write a gradient test image, so scaled decodes have content to preserve."""
+    img = Image.linear_gradient("L").resize(size).convert("RGB")
+    fpath = str(tmp_path / name)
+    img.save(fpath)
+    return fpath
+
+
+def test_jpeg_decodes_at_reduced_scale(tmp_path):
+    """Proves a large JPEG decodes smaller, never below the requested shorter side."""
+    fpath = write_image(tmp_path, "large.jpg", (2400, 1600))
+
+    img, original_size = open_preview(fpath, 256)
+
+    assert original_size == (2400, 1600)
+    # 1/8 scale would give a 200px shorter side, so libjpeg decodes at 1/4
+    assert img.size == (600, 400)
+
+
+def test_png_is_box_reduced(tmp_path):
+    """Proves formats without a scaled decoder are reduced after decoding."""
+    fpath = write_image(tmp_path, "large.png", (1200, 900))
+
+    img, original_size = open_preview(fpath, 256)
+
+    assert original_size == (1200, 900)
+    assert img.size == (400, 300)
+
+
+def test_small_images_are_untouched(tmp_path):
+    """Proves images already below the requested size decode at full size."""
+    fpath = write_image(tmp_path, "small.jpg", (200, 150))
+
+    img, _ = open_preview(fpath, 256)
+
+    assert img.size == (200, 150)
+
+
+def test_phash_is_taken_from_the_full_decode(tmp_path, monkeypatch):
+    """Proves the phash never goes through the reduced decode, so it matches the hashes
+    already stored for the library."""
+    fpath = write_image(tmp_path, "hash.jpg", (2400, 1600))
+    monkeypatch.setattr(
+        JpegImagePlugin.JpegImageFile, "draft", lambda *args: pytest.fail("phash was drafted")
+    )
+
+    with Image.open(fpath) as img:
+        full = str(imagehash.phash(img))
+
+    assert PHashReader.phash(fpath)["phash"] == full
@@ -0,0 +1,79 @@
+"""Tests for the local cache of encoded photo renditions."""
+
+import os
+
+from PIL import Image
+
+from mirror.models.photo import PhotoContent
+from mirror.services import encoder
+from mirror.services.encoder import PhotoEncoder
+from mirror.services.rendition_cache import RenditionCache
+
+RENDITIONS = [
+    ("mid_image_lossy", {"format": "webp", "quality": 85, "width": 400, "height": 300}),
+    ("full_image_png", {"format": "png"}),
+]
+
+
+def write_photo(tmp_path, colour: int = 128) -> str:
+    """Write a small test photo."""
+    fpath = str(tmp_path / "photo.png")
+    Image.new("RGB", (800, 600), (colour, colour, colour)).save(fpath)
+    return fpath
+
+
+def test_cached_renditions_skip_the_decode(tmp_path, monkeypatch):
+    """Proves a second encode of unchanged source and parameters reads the cache only."""
+    fpath = write_photo(tmp_path)
+    cache = RenditionCache(str(tmp_path / "cache"), max_bytes=10**9)
+    first = PhotoEncoder.encode_many(fpath, RENDITIONS, cache)
+
+    def fail_encode(fpath, renditions):
+        raise AssertionError("cache hit should not decode the source")
+
+    monkeypatch.setattr(encoder, "encode_renditions", fail_encode)
+    second = PhotoEncoder.encode_many(fpath, RENDITIONS, cache)
+
+    assert {role: content.content for role, content in second.items()} == {
+        role: content.content for role, content in first.items()
+    }
+
+
+def test_known_digest_is_reused_and_nothing_is_evicted(tmp_path, monkeypatch):
+    """Proves a caller's digest keys the cache without hashing the source again, and that
+    encoding leaves eviction to the end of the run."""
+    fpath = write_photo(tmp_path)
+    cache = RenditionCache(str(tmp_path / "cache"), max_bytes=0)
+
+    def fail_digest(fpath):
+        raise AssertionError("known digest should not be recomputed")
+
+    monkeypatch.setattr(encoder, "source_digest", fail_digest)
+    PhotoEncoder.encode_many(fpath, RENDITIONS, cache, digest="abc")
+
+    assert all(cache.get(RenditionCache.key("abc", role, params)) for role, params in RENDITIONS)
+
+
+def test_changed_source_or_params_miss(tmp_path):
+    """Proves the key changes with the source bytes and with any encoder parameter."""
+    params = {"format": "webp", "quality": 85}
+
+    assert RenditionCache.key("abc", "mid_image_lossy", params) != RenditionCache.key(
+        "abd", "mid_image_lossy", params
+    )
+    assert RenditionCache.key("abc", "mid_image_lossy", params) != RenditionCache.key(
+        "abc", "mid_image_lossy", {**params, "quality": 90}
+    )
+
+
+def test_least_recently_used_renditions_are_evicted(tmp_path):
+    """Proves eviction drops the oldest-read renditions until the cache fits its budget."""
+    cache = RenditionCache(str(tmp_path / "cache"), max_bytes=20)
+    for idx, key in enumerate(("old", "mid", "new")):
+        cache.put(key, PhotoContent(b"0123456789"))
+        os.utime(cache.dpath / key, ns=(idx * 10**9, idx * 10**9))
+
+    assert cache.evict() == 1
+    assert cache.get("old") is None
+    assert cache.get("mid") is not None
+    assert cache.get("new") is not None
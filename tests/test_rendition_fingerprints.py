@@ -0,0 +1,75 @@
+"""Tests for re-encoding renditions whose encoding parameters changed."""
+
+import sqlite3
+
+from conftest import make_media_db
+
+from mirror.commons.constants import IMAGE_ENCODINGS
+from mirror.commons.utils import encoding_fingerprint
+from mirror.services.database.photos import EncodedPhotosTable
+from mirror.workflows.upload import planner
+from mirror.workflows.upload.planner import plan_photo_work
+
+SELECTIVE_ROLES = {"social_card", "banner"}
+
+
+def publish_all_roles(db, fpath: str, stale_role: str | None = None) -> None:
+    """Record every non-selective role as uploaded, optionally one with old parameters."""
+    table = db.encoded_photos_table()
+    db.photos_table().add(fpath)
+
+    for role, params in IMAGE_ENCODINGS.items():
+        if role in SELECTIVE_ROLES:
+            continue
+        recorded = {**params, "quality": 1} if role == stale_role else params
+        table.add_rendition(fpath, f"https://cdn/{role}", role, recorded)
+
+
+def test_migration_backfills_current_fingerprints():
+    """Proves rows stored before the column existed are treated as current, not stale."""
+    conn = sqlite3.connect(":memory:")
+    conn.execute(
+        "create table encoded_photos (fpath text not null, mimetype text not null,"
+        " role text not null, url text not null, primary key (fpath, role))"
+    )
+    conn.execute(
+        "insert into encoded_photos values ('/a.jpg', 'image/avif', 'thumbnail_lossy', 'u')"
+    )
+
+    (encoding,) = EncodedPhotosTable(conn).list_for_file("/a.jpg")
+
+    assert encoding.params_hash == encoding_fingerprint(IMAGE_ENCODINGS["thumbnail_lossy"])
+
+
+def test_only_missing_or_stale_photos_are_scheduled(monkeypatch):
+    """Proves current photos are skipped, missing roles always run, and stale photos are
+    throttled to the per-run limit."""
+    monkeypatch.setattr(planner, "selected_fpaths", lambda fpaths: {})
+
+    db = make_media_db()
+    publish_all_roles(db, "/album/current.jpg")
+    publish_all_roles(db, "/album/stale-1.jpg", stale_role="thumbnail_lossy")
+    publish_all_roles(db, "/album/stale-2.jpg", stale_role="mid_image_lossy")
+    db.photos_table().add("/album/new.jpg")
+
+    _, _, scheduled = plan_photo_work(db, {"upload_images": True}, stale_limit=1)
+
+    assert scheduled[0] == "/album/new.jpg"
+    assert len(scheduled) == 2
+    assert scheduled[1] in {"/album/stale-1.jpg", "/album/stale-2.jpg"}
+
+
+def test_rewritten_source_renditions_are_stale(monkeypatch):
+    """Proves marking a rewritten photo stale schedules it for re-encoding."""
+    monkeypatch.setattr(planner, "selected_fpaths", lambda fpaths: {})
+    db = make_media_db()
+    publish_all_roles(db, "/album/edited.jpg")
+
+    db.encoded_photos_table().mark_stale(["/album/edited.jpg"])
+
+    _, _, scheduled = plan_photo_work(db, {"upload_images": True})
+    assert scheduled == ["/album/edited.jpg"]
+    assert all(
+        enc.params_hash is None
+        for enc in db.encoded_photos_table().list_for_file("/album/edited.jpg")
+    )
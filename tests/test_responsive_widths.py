@@ -0,0 +1,78 @@
+"""Tests for the responsive width ladder and its srcset triple."""
+
+import io
+
+from conftest import make_media_db
+from PIL import Image, ImageOps
+
+from mirror.commons.config import PHOTOS_URL
+from mirror.commons.constants import IMAGE_ENCODINGS, RESPONSIVE_ROLES
+from mirror.data.semantic_triples.photos import responsive_srcsets
+from mirror.services import encoder
+from mirror.services.encoder import PhotoEncoder
+
+
+def test_ladder_is_encoded_at_each_width(tmp_path):
+    """Proves every rung is encoded at its own width, in the mid image's format."""
+    fpath = str(tmp_path / "photo.jpg")
+    Image.linear_gradient("L").resize((2400, 1800)).convert("RGB").save(fpath)
+    renditions = [(role, IMAGE_ENCODINGS[role]) for role in RESPONSIVE_ROLES.values()]
+
+    encoded = PhotoEncoder.encode_many(fpath, renditions)
+
+    widths = {}
+    for role, content in encoded.items():
+        with Image.open(io.BytesIO(content.content)) as img:
+            widths[role] = img.width
+    assert widths == {role: width for width, role in RESPONSIVE_ROLES.items()}
+    assert all(IMAGE_ENCODINGS[role]["format"] == "webp" for role in RESPONSIVE_ROLES.values())
+
+
+def test_rungs_wider_than_the_source_are_skipped(tmp_path):
+    """Proves a source smaller than a rung is not upscaled to fill it, while the rungs it
+    covers and mid_image_lossy are still encoded."""
+    fpath = str(tmp_path / "photo.jpg")
+    Image.linear_gradient("L").resize((1000, 750)).convert("RGB").save(fpath)
+    renditions = [(role, IMAGE_ENCODINGS[role]) for role in RESPONSIVE_ROLES.values()]
+
+    encoded = PhotoEncoder.encode_many(fpath, renditions)
+
+    assert set(encoded) == {RESPONSIVE_ROLES[width] for width in (320, 480, 640, 960, 1444)}
+    assert PhotoEncoder.encode_many(fpath, renditions[-1:]) == {}
+
+
+def test_ladder_shares_the_mid_image_framing(tmp_path, monkeypatch):
+    """Proves every rung, mid_image_lossy included, is framed alike to the nearest pixel,
+    so only the widest is cropped from the source and each other is resized from the rung
+    above it."""
+    fpath = str(tmp_path / "photo.jpg")
+    Image.linear_gradient("L").resize((2400, 1800)).convert("RGB").save(fpath)
+    sources = []
+    fit = ImageOps.fit
+
+    def recording_fit(img, size):
+        sources.append(img.size)
+        return fit(img, size)
+
+    monkeypatch.setattr(encoder.ImageOps, "fit", recording_fit)
+    geometries = [
+        (IMAGE_ENCODINGS[role]["width"], IMAGE_ENCODINGS[role]["height"])
+        for role in RESPONSIVE_ROLES.values()
+    ]
+    encoder.fit_geometries(Image.open(fpath), geometries)
+
+    assert all(encoder.has_framing(geometries[-1], geometry) for geometry in geometries)
+    assert sources == [(2400, 1800), *geometries[:0:-1]]
+
+
+def test_srcset_lists_uploaded_widths_narrowest_first():
+    """Proves the srcset holds each uploaded rung as a short URL and width, in width order,
+    and photos with no rungs get none."""
+    db = make_media_db()
+    for width in (2048, 320, 1444):
+        role = RESPONSIVE_ROLES[width]
+        db.encoded_photos_table().add_rendition(
+            "/a.jpg", f"{PHOTOS_URL}/{width}.webp", role, IMAGE_ENCODINGS[role]
+        )
+
+    assert responsive_srcsets(db) == {"/a.jpg": "/320.webp 320w,/1444.webp 1444w,/2048.webp 2048w"}
@@ -0,0 +1,37 @@
+"""Tests for splitting EXIF and phash extraction into parallel chunks, and bulk indexing."""
+
+from conftest import make_media_db
+
+from mirror.models.exif import PhotoExifData
+from mirror.workflows.scan.utils import chunk_feature_work
+
+
+def test_chunks_cover_every_pending_photo_once():
+    """Proves each photo lands in exactly one chunk, with only the reads it still needs."""
+    exif_fpaths = ["/a/1.jpg", "/a/2.jpg", "/a/3.jpg"]
+    phash_fpaths = ["/a/2.jpg", "/a/4.jpg"]
+
+    chunks = chunk_feature_work(exif_fpaths, phash_fpaths, size=2)
+
+    assert chunks == [
+        {"exif_fpaths": ["/a/1.jpg", "/a/2.jpg"], "phash_fpaths": ["/a/2.jpg"]},
+        {"exif_fpaths": ["/a/3.jpg"], "phash_fpaths": ["/a/4.jpg"]},
+    ]
+
+
+def test_no_pending_photos_means_no_chunks():
+    """Proves a scan with nothing new fans out no extraction jobs."""
+    assert chunk_feature_work([], []) == []
+
+
+def test_reindexing_photos_keeps_their_exif():
+    """Proves bulk re-indexing leaves existing photo rows alone, so their EXIF is not
+    cascade-deleted."""
+    db = make_media_db()
+    db.photos_table().add_many(["/a/1.jpg", "/a/2.jpg"])
+    db.exif_table().add_many([PhotoExifData(fpath="/a/1.jpg", created_at="2021:10:16 13:42:55")])
+
+    db.photos_table().add_many(["/a/1.jpg", "/a/2.jpg", "/a/3.jpg"])
+
+    assert sorted(db.photos_table().list()) == ["/a/1.jpg", "/a/2.jpg", "/a/3.jpg"]
+    assert [exif.created_at for exif in db.exif_table().list()] == ["2021:10:16 13:42:55"]
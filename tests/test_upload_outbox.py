@@ -0,0 +1,216 @@
+"""Tests for the durable photo upload outbox, its backoff, and the CDN circuit breaker."""
+
+import os
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+import botocore.exceptions
+import pytest
+from conftest import make_media_db
+from zahir.core.effects import ESetState
+
+from mirror.commons.constants import (
+    DEFERRED_ROLES,
+    DEFERRED_TIER,
+    IMAGE_ENCODINGS,
+    RESPONSIVE_RUNG_ROLES,
+)
+from mirror.commons.exceptions import CdnUnavailableError
+from mirror.models.upload import CdnObject, OutboxTask, UploadReport
+from mirror.services import circuit_breaker
+from mirror.services.cdn import CDN, is_transient_error
+from mirror.services.cdn_inventory import CdnInventory
+from mirror.services.circuit_breaker import CircuitBreaker
+from mirror.services.rendition_cache import source_digest
+from mirror.workflows.upload import utils as upload_utils
+
+ROLE = "thumbnail_lossy"
+PARAMS = IMAGE_ENCODINGS[ROLE]
+OFFLINE = botocore.exceptions.EndpointConnectionError(endpoint_url="https://cdn")
+
+
+def offline():
+    raise OFFLINE
+
+
+def queue_rendition(tmp_path, db) -> OutboxTask:
+    source = tmp_path / "photo.jpg"
+    source.write_bytes(b"source")
+    artifact = tmp_path / ROLE
+    artifact.write_bytes(b"encoded")
+    db.photos_table().add(str(source))
+
+    task = OutboxTask(str(source), ROLE, source_digest(str(source)), str(artifact), PARAMS)
+    db.upload_outbox_table().enqueue_many([task])
+    return task
+
+
+def settle(monkeypatch, db, report: UploadReport, tries: Counter) -> list:
+    monkeypatch.setattr(upload_utils, "UPLOAD_ATTEMPTS_PER_RUN", 2)
+    inventory = CdnInventory(CDN(session=object(), client=object()), db.cdn_objects_table())
+    return list(upload_utils.settle_upload(db, inventory, report, tries))
+
+
+def signalled(effects: list) -> list[str]:
+    return [effect.name for effect in effects if isinstance(effect, ESetState)]
+
+
+def test_circuit_opens_then_lets_one_trial_through(monkeypatch):
+    """Proves consecutive network failures open the circuit, calls then fail fast without
+    being made, and after the reset period a successful trial closes it."""
+    now = [0.0]
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", lambda: now[0])
+    circuit = CircuitBreaker(2, 60, is_transient_error)
+
+    for _ in range(2):
+        with pytest.raises(botocore.exceptions.EndpointConnectionError):
+            circuit.call(offline)
+    with pytest.raises(CdnUnavailableError):
+        circuit.call(lambda: pytest.fail("called while the circuit is open"))
+    assert circuit.retry_after() == 60
+
+    now[0] = 61.0
+    assert circuit.call(lambda: "sent") == "sent"
+    assert circuit.retry_after() == 0
+
+
+def test_server_answers_do_not_open_the_circuit():
+    """Proves errors the CDN answers with, such as access denied, are not network failures."""
+    denied = botocore.exceptions.ClientError(
+        {"Error": {"Code": "AccessDenied"}, "ResponseMetadata": {"HTTPStatusCode": 403}}, "Put"
+    )
+    circuit = CircuitBreaker(1, 60, is_transient_error)
+
+    def deny():
+        raise denied
+
+    with pytest.raises(botocore.exceptions.ClientError):
+        circuit.call(deny)
+    assert circuit.call(lambda: "sent") == "sent"
+
+
+def test_backoff_doubles_up_to_its_cap(monkeypatch):
+    """Proves retry delays double with each failure, and stop growing at the cap."""
+    monkeypatch.setattr(upload_utils.random, "uniform", lambda low, high: high)
+    monkeypatch.setattr(upload_utils, "UPLOAD_BACKOFF_BASE", 2.0)
+    monkeypatch.setattr(upload_utils, "UPLOAD_BACKOFF_MAX", 10.0)
+
+    assert [upload_utils.backoff_seconds(attempts) for attempts in range(1, 6)] == [
+        2.0,
+        4.0,
+        8.0,
+        10.0,
+        10.0,
+    ]
+
+
+def test_failed_upload_is_retried_then_left_queued(tmp_path, monkeypatch):
+    """Proves a failed upload is queued for a retry after a backoff, and once out of tries
+    for the run it stays queued, with its attempts, last error and artifact, while its
+    proxy job is released."""
+    db, tries = make_media_db(), Counter()
+    task = queue_rendition(tmp_path, db)
+    failed = UploadReport(task, size=7, seconds=1.0, error="Could not connect")
+
+    assert signalled(settle(monkeypatch, db, failed, tries)) == []
+    queued = db.upload_outbox_table().get(task.fpath, ROLE)
+    assert queued.attempts == 1
+    assert queued.next_attempt_at > time.time()
+
+    semaphore = upload_utils.photo_upload_semaphore(task.fpath, ROLE)
+    assert signalled(settle(monkeypatch, db, failed, tries)) == [semaphore]
+    queued = db.upload_outbox_table().get(task.fpath, ROLE)
+    assert (queued.attempts, queued.last_error) == (2, "Could not connect")
+    assert queued.is_deliverable()
+
+
+def test_final_failure_is_not_retried_this_run(tmp_path, monkeypatch):
+    """Proves an upload failing in a way no retry can get past records its error and
+    releases its proxy job at once, leaving the rendition queued for the next run."""
+    db, tries = make_media_db(), Counter()
+    task = queue_rendition(tmp_path, db)
+    denied = UploadReport(task, size=7, seconds=1.0, error="AccessDenied", transient=False)
+
+    effects = settle(monkeypatch, db, denied, tries)
+
+    assert signalled(effects) == [upload_utils.photo_upload_semaphore(task.fpath, ROLE)]
+    queued = db.upload_outbox_table().get(task.fpath, ROLE)
+    assert (queued.attempts, queued.last_error) == (1, "AccessDenied")
+    assert not upload_utils.is_eligible(queued, tries)
+
+
+def test_lost_artifacts_release_their_proxy_jobs_once(tmp_path):
+    """Proves a queued rendition whose spooled artifact is gone is released at once rather
+    than left for a proxy job to wait on, and released only once."""
+    db, tries = make_media_db(), Counter()
+    task = queue_rendition(tmp_path, db)
+    os.remove(task.artifact_path)
+    uploader = SimpleNamespace(is_uploading=lambda task: False)
+
+    released = list(upload_utils.release_undeliverable([task], uploader, tries))
+
+    assert signalled(released) == [upload_utils.photo_upload_semaphore(task.fpath, ROLE)]
+    assert list(upload_utils.release_undeliverable([task], uploader, tries)) == []
+    assert not upload_utils.is_eligible(task, tries)
+
+
+def test_uploaded_rendition_is_recorded_and_dequeued(tmp_path, monkeypatch):
+    """Proves an uploaded rendition is recorded, added to the CDN inventory, cleared from
+    the outbox and the spool, and its proxy job released."""
+    db, tries = make_media_db(), Counter()
+    task = queue_rendition(tmp_path, db)
+    url = CDN.url("abc.webp")
+
+    effects = settle(monkeypatch, db, UploadReport(task, size=7, seconds=0.1, url=url), tries)
+
+    assert signalled(effects) == [upload_utils.photo_upload_semaphore(task.fpath, ROLE)]
+    assert db.upload_outbox_table().get(task.fpath, ROLE) is None
+    assert [enc.url for enc in db.encoded_photos_table().list_for_file(task.fpath)] == [url]
+    assert list(db.cdn_objects_table().list()) == [CdnObject(key="abc.webp", size=7)]
+    assert not task.is_deliverable()
+
+
+def test_queued_renditions_skip_encoding_only_while_current(tmp_path):
+    """Proves a queued rendition is reused only while the source and role parameters are
+    those it was encoded from."""
+    db = make_media_db()
+    task = queue_rendition(tmp_path, db)
+    changed_params = {**PARAMS, "quality": -1}
+
+    assert upload_utils.queued_renditions(db, task.fpath, [(ROLE, PARAMS)]) == [ROLE]
+    assert upload_utils.queued_renditions(db, task.fpath, [(ROLE, changed_params)]) == []
+
+    (tmp_path / "photo.jpg").write_bytes(b"edited")
+    assert upload_utils.queued_renditions(db, task.fpath, [(ROLE, PARAMS)]) == []
+
+
+def test_pending_renditions_keep_to_the_run_tiers(tmp_path, monkeypatch):
+    """Proves a run over the deferred tier encodes only the deferred roles, and uploads only
+    their queued renditions."""
+    monkeypatch.setattr(upload_utils, "is_role_skipped", lambda role, fpath: False)
+    db = make_media_db()
+    task = queue_rendition(tmp_path, db)
+    job = {"fpath": task.fpath, "tiers": [DEFERRED_TIER]}
+
+    queued, to_encode = upload_utils.pending_renditions(db, job)
+
+    assert queued == []
+    assert sorted(role for role, _ in to_encode) == sorted(DEFERRED_ROLES)
+    assert upload_utils.queued_uploads(db, [DEFERRED_TIER]) == []
+    assert upload_utils.queued_uploads(db, None) == [task]
+
+
+def test_unfilled_rungs_are_never_encoded(tmp_path, monkeypatch):
+    """Proves rungs recorded as too wide for the photo are left out of its encode, even when
+    forced."""
+    monkeypatch.setattr(upload_utils, "is_role_skipped", lambda role, fpath: False)
+    db = make_media_db()
+    task = queue_rendition(tmp_path, db)
+    widest = RESPONSIVE_RUNG_ROLES[-1]
+    db.unfilled_renditions_table().add_many(task.fpath, [widest])
+    job = {"fpath": task.fpath, "tiers": [DEFERRED_TIER], "force_roles": [widest]}
+
+    _, to_encode = upload_utils.pending_renditions(db, job)
+
+    assert sorted(role for role, _ in to_encode) == sorted(set(DEFERRED_ROLES) - {widest})
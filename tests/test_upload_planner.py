@@ -0,0 +1,109 @@
+"""Tests for planning upload work from grouped queries."""
+
+from conftest import make_media_db
+
+from mirror.commons.constants import (
+    CRITICAL_TIER,
+    DEFERRED_ROLES,
+    DEFERRED_TIER,
+    IMAGE_ENCODINGS,
+    RESPONSIVE_RUNG_ROLES,
+    THUMBHASH_ROLES,
+    VIDEO_ENCODINGS,
+    VIDEO_HLS_ROLE,
+)
+from mirror.workflows.upload import planner
+from mirror.workflows.upload.planner import plan_photo_work, plan_video_work
+
+
+def test_grey_and_mosaic_work():
+    """Proves photos without a grey, or with a missing or hex-colour mosaic, are planned."""
+    db = make_media_db()
+    for fpath in ("/a.jpg", "/b.jpg", "/c.jpg"):
+        db.photos_table().add(fpath)
+    db.photo_icon_table().add("/a.jpg", "#777")
+    for role in THUMBHASH_ROLES:
+        db.encoded_photos_table().add("/a.jpg", "thumbhash", role, "thumbhash")
+        db.encoded_photos_table().add("/b.jpg", "#123456", role, "thumbhash")
+
+    grey, mosaic, photos = plan_photo_work(db, {})
+
+    assert grey == ["/b.jpg", "/c.jpg"]
+    assert mosaic == ["/b.jpg", "/c.jpg"]
+    assert photos == []
+
+
+def test_selective_roles_are_only_wanted_where_selected(monkeypatch):
+    """Proves a selective role is only wanted for the photos it is generated for."""
+    db = make_media_db()
+    db.photos_table().add("/cover.jpg")
+    monkeypatch.setattr(planner, "selected_fpaths", lambda fpaths: {"social_card": ["/cover.jpg"]})
+
+    (row,) = planner.photo_work_rows(db, upload_images=True)
+    (unselected,) = planner.photo_work_rows(db, upload_images=False)
+
+    assert row[3] == unselected[3] + 1
+
+
+def test_deferred_roles_are_planned_apart(monkeypatch):
+    """Proves a photo missing only its deferred roles is not uploaded before publishing,
+    but is planned for the deferred tier."""
+    monkeypatch.setattr(planner, "selected_fpaths", lambda fpaths: {})
+    db = make_media_db()
+    db.photos_table().add("/a.jpg")
+    for role, params in IMAGE_ENCODINGS.items():
+        if role not in DEFERRED_ROLES:
+            db.encoded_photos_table().add_rendition("/a.jpg", f"https://cdn/{role}", role, params)
+
+    opts = {"upload_images": True}
+    _, _, critical = plan_photo_work(db, {**opts, "tiers": [CRITICAL_TIER]})
+    _, _, deferred = plan_photo_work(db, {**opts, "tiers": [DEFERRED_TIER]})
+
+    assert (critical, deferred) == ([], ["/a.jpg"])
+
+
+def test_rungs_the_photo_cannot_fill_are_not_wanted(monkeypatch):
+    """Proves a photo missing only rungs too wide for it is not planned again once they
+    are recorded as unfilled."""
+    monkeypatch.setattr(planner, "selected_fpaths", lambda fpaths: {})
+    db = make_media_db()
+    db.photos_table().add("/small.jpg")
+    widest = RESPONSIVE_RUNG_ROLES[-1]
+    for role, params in IMAGE_ENCODINGS.items():
+        if role != widest:
+            db.encoded_photos_table().add_rendition(
+                "/small.jpg", f"https://cdn/{role}", role, params
+            )
+
+    opts = {"upload_images": True, "tiers": [DEFERRED_TIER]}
+    _, _, before = plan_photo_work(db, opts)
+    db.unfilled_renditions_table().add_many("/small.jpg", [widest])
+    _, _, after = plan_photo_work(db, opts)
+
+    assert (before, after) == (["/small.jpg"], [])
+
+
+def test_videos_missing_a_role_are_planned():
+    """Proves videos with every role uploaded, including the HLS playlist, are skipped."""
+    db = make_media_db()
+    for fpath in ("/done.mp4", "/partial.mp4"):
+        db.videos_table().add(fpath)
+        for role, _ in VIDEO_ENCODINGS:
+            db.encoded_videos_table().add(fpath, f"https://cdn/{role}", role, "mp4")
+    db.encoded_videos_table().add_playlist("/done.mp4", "https://cdn/master.m3u8", VIDEO_HLS_ROLE)
+
+    assert plan_video_work(db) == ["/partial.mp4"]
+
+
+def test_reencode_limit_of_zero_is_kept(tmp_path, monkeypatch):
+    """Proves --reencode-limit 0 re-encodes no stale photos, rather than the default."""
+    limits = []
+    monkeypatch.setattr(planner, "DATABASE_PATH", str(tmp_path / "media.db"))
+    monkeypatch.setattr(
+        planner, "plan_photo_work", lambda db, input, limit: limits.append(limit) or ([], [], [])
+    )
+
+    planner.plan_upload_work({"reencode_limit": 0})
+    planner.plan_upload_work({})
+
+    assert limits == [0, planner.STALE_RENDITION_LIMIT]
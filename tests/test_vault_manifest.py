@@ -0,0 +1,132 @@
+"""Tests for the single-pass vault manifest shared by the scan stages."""
+
+import os
+
+from mirror.models import manifest as manifest_module
+from mirror.models.photo import Photo
+from mirror.models.video import Video
+from mirror.services.database import SqliteDatabase
+from mirror.services.vault import MediaVault
+
+
+def make_album(root, name: str, fnames: list[str]) -> str:
+    """Create an album folder with the given files under its Published directory."""
+    published = root / name / "Published"
+    published.mkdir(parents=True)
+    for fname in fnames:
+        (published / fname).write_bytes(b"media")
+    return str(published)
+
+
+def test_manifest_lists_media_with_stat_fields(tmp_path):
+    """Proves the manifest records each media file's kind and stat tuple, skipping other files."""
+    published = make_album(tmp_path, "Lisbon", ["a+cover.jpg", "b.MP4", "notes.txt"])
+
+    manifest = MediaVault(str(tmp_path)).manifest()
+    entries = {entry.name: entry for entry in manifest.entries()}
+
+    assert set(entries) == {"a+cover.jpg", "b.MP4"}
+    assert entries["a+cover.jpg"].kind == "photo"
+    assert entries["b.MP4"].kind == "video"
+
+    stat = os.stat(os.path.join(published, "b.MP4"))
+    assert entries["b.MP4"].size == stat.st_size
+    assert entries["b.MP4"].mtime_ns == stat.st_mtime_ns
+    assert entries["b.MP4"].inode == stat.st_ino
+
+
+def test_album_consumers_share_one_listing(tmp_path, monkeypatch):
+    """Proves covers, media and the fpath set all read the listing taken by the manifest."""
+    make_album(tmp_path, "Lisbon", ["a+cover.jpg", "b.jpg", "c.mp4"])
+    make_album(tmp_path, "Porto", ["d+cover.png"])
+
+    listed = []
+
+    def counting_scan(dpath: str):
+        listed.append(dpath)
+        return manifest_module.scan_published(dpath)
+
+    monkeypatch.setattr("mirror.models.album.scan_published", counting_scan)
+
+    manifest = MediaVault(str(tmp_path)).manifest()
+    for album in manifest.albums:
+        list(album.covers())
+        list(album.media())
+    fpaths = manifest.fpaths()
+
+    assert len(listed) == 2
+    assert len(fpaths) == 4
+
+
+def test_album_media_types_come_from_the_listing(tmp_path):
+    """Proves media are classified by the listing, not by a stat per file."""
+    make_album(tmp_path, "Lisbon", ["a+cover.jpg", "c.mp4"])
+
+    (album,) = MediaVault(str(tmp_path)).manifest().albums
+    media = list(album.media())
+
+    assert sorted(type(item).__name__ for item in media) == ["Photo", "Video"]
+    assert all(isinstance(item, (Photo, Video)) for item in media)
+
+
+def test_unchanged_album_reuses_the_stored_listing(tmp_path, monkeypatch):
+    """Proves an album whose Published directory is unchanged is not listed again."""
+    make_album(tmp_path, "Lisbon", ["a+cover.jpg", "b.jpg"])
+    previous = {entry.fpath: entry for entry in MediaVault(str(tmp_path)).manifest().snapshot()}
+
+    listed = []
+
+    def counting_scan(dpath: str):
+        listed.append(dpath)
+        return manifest_module.scan_published(dpath)
+
+    monkeypatch.setattr("mirror.models.album.scan_published", counting_scan)
+
+    manifest = MediaVault(str(tmp_path)).manifest(previous)
+
+    assert listed == []
+    assert manifest.changed_fpaths(previous) == set()
+    assert {entry.fpath: entry for entry in manifest.snapshot()} == previous
+
+
+def test_changed_fpaths_reports_new_and_rewritten_media(tmp_path):
+    """Proves new files and files whose stat fields changed are reported, and only those."""
+    published = make_album(tmp_path, "Lisbon", ["a+cover.jpg", "b.jpg"])
+    previous = {entry.fpath: entry for entry in MediaVault(str(tmp_path)).manifest().snapshot()}
+
+    (tmp_path / "Lisbon" / "Published" / "c.jpg").write_bytes(b"media")
+    (tmp_path / "Lisbon" / "Published" / "b.jpg").write_bytes(b"rewritten media")
+
+    manifest = MediaVault(str(tmp_path)).manifest()
+
+    assert manifest.changed_fpaths(previous) == {
+        os.path.join(published, "b.jpg"),
+        os.path.join(published, "c.jpg"),
+    }
+    assert manifest.modified_fpaths(previous) == {os.path.join(published, "b.jpg")}
+
+
+def test_file_state_round_trips_the_manifest(tmp_path):
+    """Proves the stored file state reads back equal to the listing that was written."""
+    make_album(tmp_path, "Lisbon", ["a+cover.jpg", "b.mp4", "notes.txt"])
+    manifest = MediaVault(str(tmp_path)).manifest()
+
+    file_state = SqliteDatabase(":memory:").file_state_table()
+    file_state.replace_all(manifest.snapshot())
+
+    assert file_state.snapshot() == {entry.fpath: entry for entry in manifest.snapshot()}
+
+
+def test_file_rewritten_in_place_is_detected(tmp_path):
+    """Proves a file rewritten in place is reported as modified, though its unchanged
+    directory listing is reused."""
+    published = make_album(tmp_path, "Lisbon", ["a+cover.jpg", "b.jpg"])
+    previous = {entry.fpath: entry for entry in MediaVault(str(tmp_path)).manifest().snapshot()}
+    directory = os.stat(published)
+
+    (tmp_path / "Lisbon" / "Published" / "b.jpg").write_bytes(b"rewritten media")
+    os.utime(published, ns=(directory.st_atime_ns, directory.st_mtime_ns))
+
+    manifest = MediaVault(str(tmp_path)).manifest(previous)
+
+    assert manifest.modified_fpaths(previous) == {os.path.join(published, "b.jpg")}
@@ -0,0 +1,91 @@
+"""Tests for pruning index rows of media deleted from the vault."""
+
+from pathlib import Path
+
+from conftest import make_media_db
+
+from mirror.commons.constants import IMAGE_ENCODINGS
+from mirror.models.photo import RenditionQuality
+from mirror.models.upload import OutboxTask
+from mirror.services.vault import MediaVault
+from mirror.services.vault_sync import VaultIndexSync
+
+ROLE = "thumbnail_lossy"
+PARAMS = IMAGE_ENCODINGS[ROLE]
+
+
+def index_media(db, kept: str, gone_photo: str, gone_video: str) -> None:
+    """Index a kept photo plus a photo and a video that are no longer on disk."""
+    db.photos_table().add_many([kept, gone_photo])
+    db.videos_table().add_many([gone_video])
+    for fpath in (kept, gone_photo):
+        db.conn.execute("insert into phashes values (?, ?)", (fpath, f"hash-{fpath}"))
+        db.conn.execute("insert into exif (fpath) values (?)", (fpath,))
+    db.encoded_videos_table().add(gone_video, "https://cdn/c.mp4", "video_libx264_720p", "mp4")
+    db.rendition_qualities_table().add_many([
+        RenditionQuality(gone_photo, "mid_image_lossy", "digest", "params", 80)
+    ])
+    db.conn.commit()
+
+
+def test_deleted_media_rows_are_removed_and_counted(tmp_path):
+    """Proves rows for media missing from the manifest are removed from every media table,
+    rows for present media are kept, and each table's removals are reported."""
+    published = tmp_path / "Lisbon" / "Published"
+    published.mkdir(parents=True)
+    (published / "a+cover.jpg").write_bytes(b"media")
+    kept = str(published / "a+cover.jpg")
+
+    db = make_media_db()
+    index_media(db, kept, str(published / "b.jpg"), str(published / "c.mp4"))
+
+    removed = VaultIndexSync(db).remove_deleted_media(MediaVault(str(tmp_path)).manifest())
+
+    assert removed == {
+        "upload_outbox": 0,
+        "rendition_qualities": 1,
+        "unfilled_renditions": 0,
+        "exif": 1,
+        "phashes": 1,
+        "photo_icons": 0,
+        "encoded_photos": 0,
+        "photos": 1,
+        "encoded_videos": 1,
+        "video_probe": 0,
+        "videos": 1,
+    }
+    assert list(db.photos_table().list()) == [kept]
+    assert list(db.videos_table().list()) == []
+    assert db.phashes_table().has(kept)
+    assert db.exif_table().has(kept)
+
+
+def queue_spooled(db, published: Path, spool: Path) -> list[OutboxTask]:
+    """Queue a spooled rendition of each of two photos for upload."""
+    tasks = [
+        OutboxTask(str(published / fname), ROLE, "digest", str(spool / fname), PARAMS)
+        for fname in ("a.jpg", "b.jpg")
+    ]
+    for task in tasks:
+        Path(task.artifact_path).write_bytes(b"encoded")
+    db.upload_outbox_table().enqueue_many(tasks)
+    return tasks
+
+
+def test_queued_uploads_of_deleted_photos_are_dropped(tmp_path):
+    """Proves a deleted photo's queued uploads are pruned with their spooled artifacts,
+    while a present photo's stay queued."""
+    published, spool = tmp_path / "vault" / "Lisbon" / "Published", tmp_path / "spool"
+    published.mkdir(parents=True)
+    spool.mkdir()
+    (published / "a.jpg").write_bytes(b"media")
+    db = make_media_db()
+    db.photos_table().add_many([str(published / "a.jpg"), str(published / "b.jpg")])
+    tasks = queue_spooled(db, published, spool)
+
+    manifest = MediaVault(str(tmp_path / "vault")).manifest()
+    removed = VaultIndexSync(db).remove_deleted_media(manifest)
+
+    assert removed["upload_outbox"] == 1
+    assert list(db.upload_outbox_table().list()) == [tasks[0]]
+    assert [task.is_deliverable() for task in tasks] == [True, False]
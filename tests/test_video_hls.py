@@ -0,0 +1,60 @@
+"""Tests for adaptive-streaming (HLS/CMAF) video output."""
+
+from mirror.commons.constants import VIDEO_HLS_PLAYLIST
+from mirror.services.cdn import CDN
+from mirror.services.encoder import hls_graph
+from mirror.workflows.upload.utils import hls_variants
+
+
+def test_hls_encodes_every_variant_from_one_decode():
+    """Proves the variants are split from one decode of the source and written as CMAF
+    segments, each at its own bitrate, with a master playlist listing them."""
+    variants = hls_variants()
+    args = hls_graph("/media/clip.mp4", variants, "/tmp/mirror/abc", audio=True).compile()
+
+    assert args.count("-i") == 1
+    assert "split=3" in args[args.index("-filter_complex") + 1]
+    assert args[args.index("-hls_segment_type") + 1] == "fmp4"
+    assert args[args.index("-master_pl_name") + 1] == VIDEO_HLS_PLAYLIST
+    assert args[args.index("-var_stream_map") + 1] == "v:0,a:0 v:1,a:1 v:2,a:2"
+    assert [args[args.index(f"-b:v:{idx}") + 1] for idx in range(3)] == [
+        params["bitrate"] for params in variants
+    ]
+    assert args[-1] == "/tmp/mirror/abc/%v/playlist.m3u8"
+
+
+def test_hls_without_audio_maps_video_only():
+    """Proves a silent encode neither reads nor maps audio."""
+    args = hls_graph("/media/clip.mp4", hls_variants()[:2], "/tmp/mirror/abc", False).compile()
+
+    assert "-an" in args
+    assert args[args.index("-var_stream_map") + 1] == "v:0 v:1"
+
+
+class FakeBucket:
+    """Records the key and content type of each uploaded object."""
+
+    def __init__(self) -> None:
+        self.uploaded: list[tuple[str, str]] = []
+
+    def put_object(self, **kwargs) -> None:
+        self.uploaded.append((kwargs["Key"], kwargs["ContentType"]))
+
+
+def test_master_playlist_is_uploaded_last(tmp_path):
+    """Proves every segment and variant playlist is uploaded under the prefix, typed by
+    extension, before the master playlist that marks the upload complete."""
+    for fname in (VIDEO_HLS_PLAYLIST, "0/playlist.m3u8", "0/init.mp4", "0/segment_000.m4s"):
+        (tmp_path / fname).parent.mkdir(exist_ok=True)
+        (tmp_path / fname).write_bytes(b"x")
+    bucket = FakeBucket()
+
+    keys = list(CDN(session=object(), client=bucket).upload_directory_public("abc", str(tmp_path)))
+
+    assert keys[-1] == f"abc/{VIDEO_HLS_PLAYLIST}"
+    assert sorted(bucket.uploaded) == [
+        ("abc/0/init.mp4", "video/mp4"),
+        ("abc/0/playlist.m3u8", "application/vnd.apple.mpegurl"),
+        ("abc/0/segment_000.m4s", "video/iso.segment"),
+        ("abc/master.m3u8", "application/vnd.apple.mpegurl"),
+    ]
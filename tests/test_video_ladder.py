@@ -0,0 +1,50 @@
+"""Tests for encoding a video's rendition ladder in one ffmpeg run."""
+
+from mirror.commons.constants import VIDEO_ENCODINGS
+from mirror.models.video import VideoProbe
+from mirror.services.encoder import VideoEncoder, ladder_graph
+
+
+def test_ladder_decodes_the_source_once():
+    """Proves the ladder reads the source once and splits its video into one scaled stream
+    per rendition, each written to its own output with its own bitrate."""
+    outputs = {f"/tmp/mirror/{role}.mp4": params for role, params in VIDEO_ENCODINGS}
+
+    args = ladder_graph("/media/clip.mp4", outputs, share_audio=True).compile()
+    filters = args[args.index("-filter_complex") + 1]
+
+    assert args.count("-i") == 1
+    assert "split=4" in filters
+    assert [scale in filters for scale in ("1920:1080", "1280:720", "854:480")] == [True] * 3
+    assert [arg for arg in args if arg.startswith("/tmp/mirror/")] == list(outputs)
+    assert [args[idx + 1] for idx, arg in enumerate(args) if arg == "-b:v"] == [
+        params["bitrate"] for _, params in VIDEO_ENCODINGS
+    ]
+
+
+def test_ladder_skips_renditions_larger_than_the_source(monkeypatch):
+    """Proves renditions bigger than the source are left out of the ladder rather than
+    failing the whole encode."""
+    encoded_outputs = []
+
+    class FakeGraph:
+        def __init__(self, outputs):
+            self.outputs = outputs
+
+        def run(self):
+            encoded_outputs.extend(self.outputs)
+
+    monkeypatch.setattr(
+        "mirror.services.encoder.ladder_graph", lambda fpath, outputs, audio: FakeGraph(outputs)
+    )
+
+    renditions = [(f"{role}.mp4", params) for role, params in VIDEO_ENCODINGS]
+    probe = VideoProbe("/media/clip.mp4", size=1, mtime_ns=1, width=1280, height=720)
+    encoded = VideoEncoder.encode_ladder(probe, renditions)
+
+    assert list(encoded) == [
+        "video_libx264_unscaled.mp4",
+        "video_libx264_720p.mp4",
+        "video_libx264_480p.mp4",
+    ]
+    assert encoded_outputs == list(encoded.values())
@@ -0,0 +1,66 @@
+"""Tests for publishing an encoded video role to the CDN."""
+
+from conftest import make_media_db
+
+from mirror.commons.constants import VIDEO_ENCODINGS
+from mirror.models.upload import CdnObject, PartReport
+from mirror.services.cdn import CDN
+from mirror.workflows.upload.utils import publish_video_encoding
+
+ROLE, PARAMS = VIDEO_ENCODINGS[0]
+
+
+class FakeVideoCdn:
+    """Lists a fixed bucket and records the files uploaded to it."""
+
+    url = staticmethod(CDN.url)
+
+    def __init__(self, keys: list[str]) -> None:
+        self.keys = keys
+        self.uploaded: list[str] = []
+
+    def list_objects(self):
+        return [CdnObject(key=key, size=1) for key in self.keys]
+
+    def upload_file_public(self, name: str, encoded_path: str, uploads):
+        self.uploaded.append(encoded_path)
+        yield PartReport(key=name, part_number=1, size=4, seconds=1.0)
+
+
+def drain(job):
+    """Run a job generator to its return value."""
+    try:
+        while True:
+            next(job)
+    except StopIteration as stop:
+        return stop.value
+
+
+def test_uploaded_video_is_recorded_with_its_url(tmp_path):
+    """Proves publishing uploads the ladder's encoded file and records the role's CDN URL,
+    returning the file to take the thumbnail frame from."""
+    encoded_path = tmp_path / "encoded.mp4"
+    encoded_path.write_bytes(b"mp4!")
+    db, cdn = make_media_db(), FakeVideoCdn([])
+    db.videos_table().add("/a.mp4")
+    input = {"fpath": "/a.mp4", "role": ROLE, "params": PARAMS, "encoded_path": str(encoded_path)}
+
+    frame_fpath = drain(publish_video_encoding(cdn, db, input))
+
+    name = CDN.video_name("/a.mp4", PARAMS, "mp4")
+    assert frame_fpath == str(encoded_path)
+    assert cdn.uploaded == [str(encoded_path)]
+    assert db.encoded_videos_table().get_by_fpath_and_role("/a.mp4", ROLE).url == CDN.url(name)
+
+
+def test_video_in_the_bucket_is_recorded_without_uploading():
+    """Proves a role whose object the bucket already lists is recorded from its key alone,
+    without an encoded_videos row to look up and without uploading again."""
+    name = CDN.video_name("/a.mp4", PARAMS, "mp4")
+    db, cdn = make_media_db(), FakeVideoCdn([name])
+    db.videos_table().add("/a.mp4")
+    input = {"fpath": "/a.mp4", "role": ROLE, "params": PARAMS}
+
+    assert drain(publish_video_encoding(cdn, db, input)) is None
+    assert cdn.uploaded == []
+    assert db.encoded_videos_table().get_by_fpath_and_role("/a.mp4", ROLE).url == CDN.url(name)
@@ -0,0 +1,87 @@
+"""Tests for remuxing videos that already meet a rendition's spec."""
+
+import dataclasses
+
+import ffmpeg
+
+from mirror.commons.constants import VIDEO_ENCODINGS
+from mirror.models.video import VideoProbe
+from mirror.services.encoder import VideoEncoder, can_remux, parse_bitrate, video_args
+
+RENDITIONS = dict(VIDEO_ENCODINGS)
+
+PHONE_CLIP = VideoProbe(
+    "/media/clip.mp4",
+    size=1,
+    mtime_ns=1,
+    width=1920,
+    height=1080,
+    video_codec="h264",
+    audio_codec="aac",
+    bitrate=4_000_000,
+    pixel_format="yuv420p",
+)
+
+
+def test_parse_bitrate():
+    """Proves ffmpeg bitrate strings are read as bits per second."""
+    assert [parse_bitrate(rate) for rate in ("30M", "5000k", "800")] == [30_000_000, 5_000_000, 800]
+
+
+def test_remux_only_when_the_source_fits():
+    """Proves a video is remuxed only for renditions whose codec, pixel format, size and
+    bitrate it already meets."""
+    hevc = dataclasses.replace(PHONE_CLIP, video_codec="hevc")
+    ten_bit = dataclasses.replace(PHONE_CLIP, pixel_format="yuv420p10le")
+    opus = dataclasses.replace(PHONE_CLIP, audio_codec="opus")
+
+    assert can_remux(PHONE_CLIP, RENDITIONS["video_libx264_unscaled"], share_audio=True)
+    assert can_remux(PHONE_CLIP, RENDITIONS["video_libx264_1080p"], share_audio=True)
+    assert not can_remux(PHONE_CLIP, RENDITIONS["video_libx264_720p"], share_audio=True)
+    assert not can_remux(hevc, RENDITIONS["video_libx264_1080p"], share_audio=True)
+    assert not can_remux(ten_bit, RENDITIONS["video_libx264_1080p"], share_audio=True)
+    assert not can_remux(opus, RENDITIONS["video_libx264_1080p"], share_audio=True)
+    assert can_remux(opus, RENDITIONS["video_libx264_1080p"], share_audio=False)
+
+
+def test_remux_copies_streams():
+    """Proves a remux copies the streams rather than encoding them, and drops the audio
+    when it is not shared."""
+    input_args, kwargs = video_args(PHONE_CLIP, RENDITIONS["video_libx264_1080p"], False)
+    args = ffmpeg.input(PHONE_CLIP.fpath, **input_args).output("out.mp4", **kwargs).compile()
+
+    assert args[args.index("-c") + 1] == "copy"
+    assert args[args.index("-movflags") + 1] == "+faststart"
+    assert "-an" in args
+    assert "libx264" not in args
+
+
+def test_ladder_remuxes_fitting_renditions(monkeypatch):
+    """Proves the ladder remuxes renditions the source fits and encodes only the rest."""
+    remuxed, laddered = [], []
+
+    class FakeGraph:
+        def __init__(self, outputs):
+            self.outputs = outputs
+
+        def run(self):
+            laddered.extend(self.outputs)
+
+    monkeypatch.setattr(
+        "mirror.services.encoder.ladder_graph", lambda fpath, outputs, audio: FakeGraph(outputs)
+    )
+    monkeypatch.setattr(
+        VideoEncoder,
+        "encode",
+        classmethod(lambda cls, probe, name, params, audio: remuxed.append(name) or name),
+    )
+
+    renditions = [(f"{role}.mp4", params) for role, params in VIDEO_ENCODINGS]
+    encoded = VideoEncoder.encode_ladder(PHONE_CLIP, renditions, share_audio=True)
+
+    assert remuxed == ["video_libx264_unscaled.mp4", "video_libx264_1080p.mp4"]
+    assert laddered == [
+        "/tmp/mirror/video_libx264_720p.mp4",
+        "/tmp/mirror/video_libx264_480p.mp4",
+    ]
+    assert set(encoded) == {name for name, _ in renditions}
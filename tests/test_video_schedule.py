@@ -0,0 +1,39 @@
+"""Tests for ordering video uploads longest job first."""
+
+import os
+
+import ffmpeg
+from conftest import make_media_db
+
+from mirror.models.video import VideoProbe
+from mirror.workflows.upload.utils import longest_first
+
+
+def unreadable(fpath: str) -> dict:
+    raise ffmpeg.Error("ffprobe", b"", b"invalid data")
+
+
+def test_videos_are_ordered_by_encode_then_upload_cost(tmp_path, monkeypatch):
+    """Proves videos are ordered by decoded pixels, then by file size, and that a video
+    ffprobe cannot read is scheduled last instead of failing the batch."""
+    durations = {"short": 1, "long": 50, "long_large": 50}
+    fpaths = {}
+    for name, size in (("short", 1), ("long", 1), ("long_large", 9), ("broken", 99)):
+        fpaths[name] = tmp_path / f"{name}.mp4"
+        fpaths[name].write_bytes(b"v" * size)
+
+    db = make_media_db()
+    stream = {"codec_type": "video", "width": 1920, "height": 1080}
+    db.video_probe_table().add_many(
+        VideoProbe.from_probe(
+            str(fpaths[name]),
+            os.stat(fpaths[name]),
+            {"format": {"duration": str(duration)}, "streams": [stream]},
+        )
+        for name, duration in durations.items()
+    )
+    monkeypatch.setattr(ffmpeg, "probe", unreadable)
+
+    ordered = longest_first(db, [str(fpath) for fpath in fpaths.values()])
+
+    assert ordered == [str(fpaths[name]) for name in ("long_large", "long", "short", "broken")]